@@ -0,0 +1,79 @@
+"""
+   Text embeddings used to find relevant history in developer sessions.
+   Uses a local Ollama embedding model when one is configured, otherwise a hashing vectorizer.
+"""
+import os
+import re
+import logging
+import zlib
+
+import numpy as np
+from django.conf import settings
+from langchain_ollama import OllamaEmbeddings
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_CAMEL_PATTERN = re.compile(r"[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])")
+
+# ------------- Helper 1: Split code/text into features for the hashing vectorizer
+def _features(text):
+    """
+    Lowercased words plus the parts of snake_case/camelCase identifiers.
+    """
+    features = []
+    for word in _WORD_PATTERN.findall(text):
+        features.append(word.lower())
+        parts = [part.lower() for chunk in word.split("_") for part in _CAMEL_PATTERN.findall(chunk)]
+        if len(parts) > 1:
+            features.extend(parts)
+    return features
+
+
+# ------------- Helper 2: Scale every row to unit length so a dot product is the cosine similarity
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+# ------------- Function 1: Hashing vectorizer (no model needed)
+def hashing_embed(texts, dimensions):
+    """
+    Signed feature hashing of the words of each text into a `dimensions`-long float32 vector.
+    """
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            matrix[row, digest % dimensions] += sign
+    return _normalize(matrix)
+
+
+# ------------- Function 2: Name of the embedder the settings ask for
+def default_embedder():
+    """
+    Returns "ollama:<model>" when DEV_EMBEDDING_MODEL is set, otherwise "hashing:<dimensions>".
+    Vectors of different embedders can't be compared, so the name is stored with the vectors.
+    """
+    if settings.DEV_EMBEDDING_MODEL:
+        return f"ollama:{settings.DEV_EMBEDDING_MODEL}"
+    return f"hashing:{settings.DEV_EMBEDDING_DIMENSIONS}"
+
+
+# ------------- Function 3: Embed texts with a given embedder
+def embed_texts(texts, embedder):
+    """
+    Returns a (len(texts), dimensions) float32 matrix of unit vectors.
+    Raises if the Ollama embedding model can't be reached.
+    """
+    kind, _, name = embedder.partition(":")
+    if kind == "hashing":
+        return hashing_embed(texts, int(name))
+
+    model = OllamaEmbeddings(
+        model=name,
+        base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
+    )
+    return _normalize(np.asarray(model.embed_documents(texts), dtype=np.float32))
@@ -0,0 +1,195 @@
+"""
+   Deadlines and circuit breakers for the Ollama calls, so a dead or overloaded
+   backend fails fast instead of tying up workers until the HTTP client gives up.
+"""
+import time
+import queue
+import threading
+
+import httpx
+from django.conf import settings
+
+# Phases of a streamed call that have their own deadline
+PHASE_CONNECT = "connect"
+PHASE_FIRST_TOKEN = "first_token"
+PHASE_INTER_TOKEN = "inter_token"
+PHASE_TOTAL = "total"
+
+# Marks the end of a stream in the producer queue
+_DONE = object()
+
+# How often a stream waiting for its next token checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.2
+
+
+class LLMDeadlineExceeded(Exception):
+    """
+    Raised when a stream misses one of its deadlines.
+    """
+    def __init__(self, phase):
+        self.phase = phase
+        super().__init__(f"Ollama call exceeded the {phase} deadline")
+
+
+class LLMStreamCancelled(Exception):
+    """
+    Raised when the caller cancels a stream (its `cancel` event is set).
+    """
+
+
+# ------------- Helper 1: HTTP timeouts for the Ollama client
+def ollama_http_timeout():
+    """
+    Connect fails fast, a read may wait as long as the slowest token deadline.
+    The producer thread of `stream_with_deadlines` is stopped by this read timeout.
+    """
+    read = max(settings.OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS, settings.OLLAMA_INTER_TOKEN_TIMEOUT_SECONDS)
+    connect = settings.OLLAMA_CONNECT_TIMEOUT_SECONDS
+    return httpx.Timeout(read, connect=connect)
+
+
+# ------------- Function 1: Iterate a LLM stream with per-phase deadlines
+def stream_with_deadlines(stream_factory, cancel=None):
+    """
+    Yields the chunks of stream_factory() and raises LLMDeadlineExceeded when the first
+    token, the gap between two tokens or the whole stream takes too long, and
+    LLMStreamCancelled soon after the `cancel` event (threading.Event) is set.
+
+    The stream is consumed in a daemon thread so the caller can stop waiting
+    at the deadline (or on cancel) even if the HTTP read is still blocked.
+    """
+    chunks = queue.Queue()
+    stop = threading.Event()
+
+    def _produce():
+        stream = None
+        try:
+            stream = stream_factory()
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                chunks.put(chunk)
+            chunks.put(_DONE)
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+    threading.Thread(target=_produce, daemon=True).start()
+
+    started = time.monotonic()
+    total_deadline = started + settings.OLLAMA_TOTAL_TIMEOUT_SECONDS
+    phase = PHASE_FIRST_TOKEN
+    try:
+        while True:
+            step = (
+                settings.OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS if phase == PHASE_FIRST_TOKEN
+                else settings.OLLAMA_INTER_TOKEN_TIMEOUT_SECONDS
+            )
+            remaining = total_deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(PHASE_TOTAL)
+
+            expired_phase = phase if step <= remaining else PHASE_TOTAL
+            deadline = time.monotonic() + min(step, remaining)
+            while True:
+                if cancel is not None and cancel.is_set():
+                    raise LLMStreamCancelled()
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise LLMDeadlineExceeded(expired_phase)
+                try:
+                    item = chunks.get(timeout=min(wait, CANCEL_POLL_SECONDS) if cancel is not None else wait)
+                    break
+                except queue.Empty:
+                    continue
+
+            if item is _DONE:
+                return
+            if isinstance(item, httpx.ConnectTimeout):
+                raise LLMDeadlineExceeded(PHASE_CONNECT)
+            if isinstance(item, httpx.ReadTimeout):
+                raise LLMDeadlineExceeded(phase)
+            if isinstance(item, Exception):
+                raise item
+
+            phase = PHASE_INTER_TOKEN
+            yield item
+    finally:
+        stop.set()
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+    closed: calls go through. open: calls fail fast until `reset_timeout` passes.
+    half_open: a single probe call is let through, its result closes or re-opens the circuit.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    # ---- Function 1: Can a call go through now?
+    def allow(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self.probe_started_at = now
+                return True
+
+            # Half open: only one probe, unless the previous probe never reported back
+            if now - self.probe_started_at >= self.reset_timeout:
+                self.probe_started_at = now
+                return True
+            return False
+
+    # ---- Function 2: Seconds until the next call is allowed (for the error message)
+    def retry_after(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0
+            since = self.opened_at if self.state == self.OPEN else self.probe_started_at
+            return max(0, int(self.reset_timeout - (time.monotonic() - since)) + 1)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# ------------- Function 2: The circuit breaker of a model (one per model per process)
+def get_breaker(model_name):
+    name = str(model_name).strip()
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(
+                failure_threshold=settings.OLLAMA_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.OLLAMA_BREAKER_RESET_SECONDS,
+            )
+        return _breakers[name]
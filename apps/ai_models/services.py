@@ -2,14 +2,125 @@
    This file will be the main service for Ollama LLMs 
 """
 import os
+import re
+import difflib
 from dotenv import load_dotenv
+from django.conf import settings
 from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 # from langchain.memory import ConversationBufferWindowMemory # Reacts as a short-term memory for AI so we can show the last messages
 from langchain_classic.memory import ConversationBufferWindowMemory
 
+from apps.ai_models.resilience import ollama_http_timeout
+from apps.ai_models.warmup import warmup_scheduler
+
 load_dotenv()
 
+# Rough word-piece split, close enough to a BPE tokenizer to compare prompt sizes
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# ------------- Helper 1: Estimate the token count of a text
+def estimate_tokens(text):
+    """
+    Cheap token estimate used when Ollama doesn't report usage for a stream.
+    """
+    if not text:
+        return 0
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+# ------------- Helper 2: Build a compact diff between two coder outputs
+def build_code_diff(previous_code, current_code, context_lines=2):
+    """
+    Returns a unified diff between the previous and the current coder output,
+    followed by a short summary of the regions that did not change.
+    """
+    previous_lines = previous_code.splitlines()
+    current_lines = current_code.splitlines()
+
+    diff = "\n".join(difflib.unified_diff(
+        previous_lines,
+        current_lines,
+        fromfile="previous",
+        tofile="current",
+        n=context_lines,
+        lineterm="",
+    ))
+
+    # Only mention unchanged blocks that are too big to show up as diff context
+    matcher = difflib.SequenceMatcher(None, previous_lines, current_lines, autojunk=False)
+    unchanged = [
+        f"- lines {j1 + 1}-{j2} ({j2 - j1} lines) are unchanged"
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag == "equal" and (j2 - j1) > 2 * context_lines
+    ]
+
+    if unchanged:
+        diff += "\nUnchanged regions of the current code:\n" + "\n".join(unchanged)
+    return diff
+
+
+# ------------- Helper 3: Fold new conversation turns into a rolling summary
+def summarize_history(model_name, previous_summary, turns):
+    """
+    Asks a (small) Ollama model to merge `turns` into `previous_summary`.
+    turns: list of (user_prompt, model_output) tuples, oldest first
+    """
+    llm = ChatOllama(
+        model=model_name,
+        temperature=0,
+        base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
+        num_ctx=4096
+    )
+
+    max_chars = settings.DEV_SUMMARY_TURN_MAX_CHARS
+    turns_text = "\n\n".join(
+        f"Developer: {prompt[:max_chars]}\nAssistant: {output[:max_chars]}"
+        for prompt, output in turns
+    )
+
+    messages = [
+        SystemMessage(content=(
+            "You keep a running summary of a coding conversation. "
+            "Keep decisions, requirements, names and the current state of the code. "
+            f"Answer with the updated summary only, in less than {settings.DEV_SUMMARY_MAX_WORDS} words."
+        )),
+        HumanMessage(content=(
+            f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+            f"New turns to add:\n{turns_text}"
+        )),
+    ]
+    return llm.invoke(messages).content.strip()
+
+
+# ------------- Helper 4: Targeted feedback for a frequent wrong answer to an exercise
+def generate_exercise_feedback(model_name, exercise, wrong_code, grader_message, llm=None):
+    """
+    Asks a model for a short hint on a wrong answer, without giving the solution away.
+    llm: a LangChain chat model to use instead of Ollama (e.g. a fake model)
+    """
+    llm = llm or ChatOllama(
+        model=model_name,
+        temperature=0,
+        base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
+        num_ctx=4096
+    )
+
+    messages = [
+        SystemMessage(content=(
+            "You are a programming tutor. A learner's answer to an exercise is wrong. "
+            "Explain in at most 3 short sentences what is wrong and how to fix it. "
+            "Don't write the full solution."
+        )),
+        HumanMessage(content=(
+            f"Exercise: {exercise.get('title', '')}\n{exercise.get('prompt', '')}\n\n"
+            f"Learner's answer:\n{wrong_code}\n\n"
+            f"Grader result: {grader_message}"
+        )),
+    ]
+    return llm.invoke(messages).content.strip()
+
+
 class OllamaOrchestrator:
     """
     This class will hold the initilization of two distinct LLM instances.
@@ -19,6 +130,9 @@ class OllamaOrchestrator:
         """
         Initilization for ollama LLMs.
         """
+        # Keep the configs so a long-lived orchestrator (WebSocket) can be reused for many runs
+        self.coder_config = coder_config
+        self.explainer_config = explainer_config
         
         # ---- 1.Setup for Coder Model using the passed configurations (Our model)
         # 1. Coder initilization
@@ -29,9 +143,12 @@ class OllamaOrchestrator:
                 model=c_name, 
                 temperature=float(coder_config.temperature),
                 base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
-                num_ctx=2048
+                num_ctx=2048,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                client_kwargs={"timeout": ollama_http_timeout()}
             )
             self.coder_system_prompt = coder_config.system_prompt
+            warmup_scheduler.mark_used(c_name)
         else:
             print("--- CODER CONFIG MISSING OR INVALID ---")
             self.coder_llm = None
@@ -43,19 +160,27 @@ class OllamaOrchestrator:
                 model=e_name,
                 temperature=float(explainer_config.temperature),
                 base_url=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"),
-                num_ctx=2048
+                num_ctx=2048,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                client_kwargs={"timeout": ollama_http_timeout()}
             )
             self.explainer_system_prompt = explainer_config.system_prompt
+            warmup_scheduler.mark_used(e_name)
         else:
             self.explainer_llm = None
 
+        # Send the explainer a diff instead of the full code on follow-up runs (opt-in)
+        self.diff_prompts = settings.EXPLAINER_DIFF_PROMPTS
+        self.diff_max_ratio = settings.EXPLAINER_DIFF_MAX_RATIO
+
         self.memory = ConversationBufferWindowMemory(k=5, return_messages=True)
         
         # ---- Function 1:
-    def get_coder_stream(self, user_prompt, history_messages):
+    def get_coder_stream(self, user_prompt, history_messages, context_code=""):
         """
         Creates a stream for the Coder.
         history_messages: list of previous Human/AI messages
+        context_code: code the developer attached to the run (assembled from the chunk store)
         """
         
         # Send the system message first in every request
@@ -63,6 +188,8 @@ class OllamaOrchestrator:
         # pastes in the previous back-and-forth so the AI knows what was discussed earlier
         messages.extend(history_messages)
         # adds the new current task
+        if context_code:
+            user_prompt = f"{user_prompt}\n\nHere is the code I am working on:\n{context_code}"
         messages.append(HumanMessage(content=user_prompt))
         
         # .stream() because we want to receive the LLM responds in the same time rather tan waiting for the whole message to finish
@@ -70,20 +197,35 @@ class OllamaOrchestrator:
         return self.coder_llm.stream(messages)
 
         
-    def get_explainer_stream(self, user_prompt, coder_output, history_messages):
+    def get_explainer_stream(self, user_prompt, coder_output, history_messages, previous_coder_output=""):
         """
         Creates a stream for the Explainer.
+        previous_coder_output: the coder output of the previous run, used to send a diff
+        (the diff and the full output are both measured with estimate_tokens)
         """
-            
-        combined_prompt = (
-            f"The developer asked about '{user_prompt}'\n"
-            f"The coder agent responded to developer with this code:\n {coder_output}\n"
-            f"You have to be the explainer and expalin the code to the user."
-        )
+        combined_prompt = None
+
+        # On iterative sessions most of the code is unchanged, so send only what changed
+        # when the diff is much smaller than the full output
+        if self.diff_prompts and previous_coder_output and coder_output:
+            diff = build_code_diff(previous_coder_output, coder_output)
+            if estimate_tokens(diff) <= estimate_tokens(coder_output) * self.diff_max_ratio:
+                combined_prompt = (
+                    f"The developer asked about '{user_prompt}'\n"
+                    f"The coder agent updated the code from the previous answer. This is the diff:\n {diff}\n"
+                    f"You have to be the explainer and expalin the changes to the user."
+                )
+
+        if combined_prompt is None:
+            combined_prompt = (
+                f"The developer asked about '{user_prompt}'\n"
+                f"The coder agent responded to developer with this code:\n {coder_output}\n"
+                f"You have to be the explainer and expalin the code to the user."
+            )
             
         messages = [SystemMessage(content=self.explainer_system_prompt)]
         messages.extend(history_messages)
         messages.append(HumanMessage(content=combined_prompt))
 
         return self.explainer_llm.stream(messages)
-        
\ No newline at end of file
+        
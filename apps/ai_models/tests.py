@@ -1,3 +1,111 @@
-from django.test import TestCase
+from types import SimpleNamespace
+
+from django.test import TestCase, override_settings
+
+from apps.ai_models.models import AiModel, AiProvider
+from apps.ai_models.services import OllamaOrchestrator
+from apps.ai_models.warmup import COLD, WARM, OllamaWarmupScheduler
+
+
+class _FakeOllama:
+    """
+    Records the generate calls, `failing` models raise like an unreachable backend.
+    """
+    def __init__(self, resident=None, sizes=None, failing=()):
+        self.resident = resident or {}
+        self.sizes = sizes or {}
+        self.failing = set(failing)
+        self.calls = []
+
+    def ps(self):
+        return SimpleNamespace(models=[SimpleNamespace(model=name, size=size) for name, size in self.resident.items()])
+
+    def list(self):
+        return SimpleNamespace(models=[SimpleNamespace(model=name, size=size) for name, size in self.sizes.items()])
+
+    def generate(self, *, model, prompt, keep_alive):
+        self.calls.append((model, keep_alive))
+        if model in self.failing:
+            raise ConnectionError("model failed to load")
+
+
+# ------ Warmup: only the models in demand are loaded, failures don't stop the round
+class OllamaWarmupSchedulerTests(TestCase):
+    def setUp(self):
+        for name in ("idle", "wanted", "other"):
+            AiModel.objects.create(provider=AiProvider.OLLAMA, model_name=name)
+
+    def scheduler(self, client, memory_budget=0):
+        scheduler = OllamaWarmupScheduler()
+        scheduler.client = client
+        scheduler.memory_budget = memory_budget
+        return scheduler
+
+    def test_models_without_demand_are_not_warmed(self):
+        client = _FakeOllama(resident={"idle:latest": 4})
+        scheduler = self.scheduler(client)
+        scheduler.request("wanted")
+
+        scheduler.tick()
+
+        self.assertEqual([model for model, _ in client.calls], ["wanted:latest"])
+        self.assertEqual(scheduler.state("wanted"), WARM)
+        # Still loaded until its keep_alive expires
+        self.assertEqual(scheduler.state("idle"), WARM)
+        self.assertEqual(scheduler.state("other"), COLD)
+
+    def test_a_failing_model_does_not_stop_the_round(self):
+        client = _FakeOllama(failing={"wanted:latest"})
+        scheduler = self.scheduler(client)
+        scheduler.request("wanted")
+        scheduler.request("other")
+
+        scheduler.tick()
+
+        self.assertEqual(sorted(model for model, _ in client.calls), ["other:latest", "wanted:latest"])
+        self.assertEqual(scheduler.state("wanted"), COLD)
+        self.assertEqual(scheduler.state("other"), WARM)
+
+    def test_idle_models_are_only_unloaded_when_they_do_not_fit(self):
+        client = _FakeOllama(resident={"idle:latest": 4}, sizes={"wanted:latest": 3, "other:latest": 4})
+        scheduler = self.scheduler(client, memory_budget=7)
+        scheduler.request("wanted")
+
+        scheduler.tick()
+        self.assertNotIn(("idle:latest", 0), client.calls)
+
+        scheduler.request("other")
+        scheduler.tick()
+        self.assertIn(("idle:latest", 0), client.calls)
+        self.assertEqual(scheduler.state("idle"), COLD)
+
+
+# ------ Explainer diff prompts: the diff and the full output are measured the same way
+class _RecordingLlm:
+    def __init__(self):
+        self.prompts = []
+
+    def stream(self, messages):
+        self.prompts.append(messages[-1].content)
+        return iter(())
+
+
+@override_settings(EXPLAINER_DIFF_PROMPTS=True, EXPLAINER_DIFF_MAX_RATIO=0.5)
+class ExplainerDiffPromptTests(TestCase):
+    previous = "\n".join(f"total_{i} = compute_value({i}, factor={i * 2})" for i in range(40))
+
+    def prompt(self, coder_output):
+        orchestrator = OllamaOrchestrator(None, None)
+        orchestrator.explainer_llm = _RecordingLlm()
+        orchestrator.explainer_system_prompt = "Explain"
+        orchestrator.get_explainer_stream("Tweak it", coder_output, [], previous_coder_output=self.previous)
+        return orchestrator.explainer_llm.prompts[0]
+
+    def test_a_small_change_sends_the_diff(self):
+        self.assertIn("This is the diff", self.prompt(self.previous.replace("factor=10", "factor=11")))
+
+    def test_a_rewrite_sends_the_full_output(self):
+        rewrite = "\n".join(f"print({i})" for i in range(40))
+
+        self.assertIn("responded to developer with this code", self.prompt(rewrite))
 
-# Create your tests here.
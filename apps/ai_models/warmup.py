@@ -0,0 +1,180 @@
+"""
+   Keeps the Ollama models that are likely to be used loaded in memory,
+   so the first run after idle doesn't pay the model load time.
+"""
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from ollama import Client
+
+from apps.ai_models.models import AiModel, AiProvider
+
+logger = logging.getLogger(__name__)
+
+# Model states exposed to the frontend
+WARM = "warm"
+LOADING = "loading"
+COLD = "cold"
+
+
+# ----- Helper: Ollama reports models with their tag ("llama3" is "llama3:latest")
+def _ollama_name(model_name):
+    name = str(model_name).strip()
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaWarmupScheduler:
+    """
+    Background thread that preloads the active Ollama models with a `keep_alive`,
+    ranked by recent usage, and unloads the least used ones when the loaded models
+    don't fit in the memory budget.
+    """
+
+    def __init__(self):
+        self.client = Client(host=os.getenv("OLLAMA_URL", "http://127.0.0.1:11434"))
+        self.interval = settings.OLLAMA_WARMUP_INTERVAL_SECONDS
+        self.keep_alive = settings.OLLAMA_KEEP_ALIVE
+        self.memory_budget = settings.OLLAMA_WARM_MEMORY_BUDGET_MB * 1024 * 1024
+        self.usage_window = timedelta(minutes=settings.OLLAMA_WARMUP_USAGE_WINDOW_MINUTES)
+
+        self._states = {}       # model_name -> WARM | LOADING | COLD
+        self._requested = set() # models asked for ahead of demand (e.g. a session was opened)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # ---- Function 1: Start the loop (once per process)
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="ollama-warmup", daemon=True)
+            self._thread.start()
+
+    # ---- Function 2: Ask for a model to be loaded soon (predicted demand)
+    def request(self, model_name):
+        model_name = _ollama_name(model_name)
+        with self._lock:
+            if self._states.get(model_name) == WARM:
+                return
+            self._requested.add(model_name)
+        self._wake.set()
+
+    # ---- Function 3: A run just used the model, so it is resident now
+    def mark_used(self, model_name):
+        model_name = _ollama_name(model_name)
+        with self._lock:
+            self._states[model_name] = WARM
+
+    # ---- Function 4: Warm/cold state of a model
+    def state(self, model_name):
+        model_name = _ollama_name(model_name)
+        with self._lock:
+            return self._states.get(model_name, COLD)
+
+    def _run(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.warning(f"Ollama Warmup Error: {e}")
+            finally:
+                connection.close()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _demand(self):
+        """
+        Scores every active Ollama model: requested models first, then by the
+        number of recent runs of the session configs that use them.
+        """
+        active = AiModel.objects.filter(is_active=True, provider=AiProvider.OLLAMA)
+        scores = {_ollama_name(name): 0 for name in active.values_list("model_name", flat=True)}
+
+        recent_usage = (
+            active
+            .filter(session_configs__is_enabled=True, session_configs__run_results__created_at__gte=timezone.now() - self.usage_window)
+            .values("model_name")
+            .annotate(runs=Count("session_configs__run_results"))
+        )
+        for row in recent_usage:
+            scores[_ollama_name(row["model_name"])] = row["runs"]
+
+        with self._lock:
+            requested, self._requested = self._requested, set()
+        for name in requested:
+            if name in scores:
+                scores[name] = float("inf")
+        return scores
+
+    def tick(self):
+        """
+        One scheduling round: preload the models in demand (recent runs or an explicit
+        request) that fit in the memory budget, and unload the resident models that
+        don't fit next to them. Models without demand aren't refreshed, their
+        keep_alive expires on its own.
+        """
+        scores = self._demand()
+        resident = {m.model: m.size for m in self.client.ps().models}
+        sizes = {m.model: m.size for m in self.client.list().models}
+
+        # Greedy fill of the memory budget, most wanted models first (0 means no budget)
+        warm, used = [], 0
+        for name in sorted(scores, key=scores.get, reverse=True):
+            if scores[name] <= 0:
+                break
+            size = resident.get(name) or sizes.get(name) or 0
+            if self.memory_budget and used + size > self.memory_budget:
+                continue
+            warm.append(name)
+            used += size
+
+        for name in warm:
+            if name not in resident:
+                with self._lock:
+                    self._states[name] = LOADING
+            # An empty prompt only loads the model, and it also refreshes keep_alive
+            loaded = self._generate(name, self.keep_alive)
+            with self._lock:
+                self._states[name] = WARM if loaded or name in resident else COLD
+
+        # The other resident models stay until they expire, unless they don't fit next to the warm ones
+        unloaded = set()
+        for name in sorted(set(resident) - set(warm), key=lambda name: scores.get(name, 0), reverse=True):
+            if self.memory_budget and used + resident[name] > self.memory_budget:
+                if self._generate(name, 0):
+                    unloaded.add(name)
+                    logger.info(f"Ollama Warmup: unloaded {name}")
+                    continue
+            used += resident[name]
+
+        with self._lock:
+            for name in scores:
+                if name not in warm:
+                    self._states[name] = WARM if name in resident and name not in unloaded else COLD
+
+    def _generate(self, name, keep_alive):
+        # One model failing to load (or unload) doesn't stop the round
+        try:
+            self.client.generate(model=name, prompt="", keep_alive=keep_alive)
+            return True
+        except Exception as e:
+            logger.warning(f"Ollama Warmup Error: {name}: {e}")
+            return False
+
+
+# One scheduler per process
+warmup_scheduler = OllamaWarmupScheduler()
+
+
+# ----- Start the scheduler when the app is served (called from wsgi/asgi)
+def start_warmup_scheduler():
+    if settings.OLLAMA_WARMUP_ENABLED:
+        warmup_scheduler.start()
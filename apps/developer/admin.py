@@ -4,7 +4,12 @@ from .models import (
     DevSession, 
     DevRunResult,
     DevRun,
-    DevSessionModelConfig
+    DevSessionModelConfig,
+    ContextChunk,
+    DevSessionSummary,
+    DevSessionEmbeddings,
+    DevUsageDaily,
+    DevUsageUserDaily
 )
 
 
@@ -12,3 +17,8 @@ admin.site.register(DevSession)
 admin.site.register(DevRunResult)
 admin.site.register(DevRun)
 admin.site.register(DevSessionModelConfig)
+admin.site.register(ContextChunk)
+admin.site.register(DevSessionSummary)
+admin.site.register(DevSessionEmbeddings)
+admin.site.register(DevUsageDaily)
+admin.site.register(DevUsageUserDaily)
@@ -0,0 +1,292 @@
+"""
+   WebSocket endpoint for a developer session. The client authenticates once, then sends
+   many prompts over the same connection. The session, its model configs, the orchestrator
+   and the history are resolved once and cached for the lifetime of the connection.
+
+   URL: ws://<host>/ws/developing/sessions/<session_id>/?token=<JWT access token>
+
+   Client -> Server:
+     {"type": "prompt", "prompt": "...", "initiator_role": "coder", "target": "pipeline", "context_hashes": [...]}
+     {"type": "cancel", "run_id": 12}
+   Server -> Client:
+     {"type": "run", "run_id": 12, "client_id": ...,
+      "quota_remaining_tokens": ..., ...}                  the run was created (null quota = unlimited)
+     {"run_id": 12, "sender": "coder", "text": "..."}      same frames as the HTTP stream, tagged with the run
+     {"type": "done", "run_id": 12, "status": "success"}
+     {"type": "error", "message": "..."}
+"""
+import re
+import json
+import asyncio
+import logging
+import threading
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from apps.ai_models.services import OllamaOrchestrator
+from apps.developer.models import DevRun, DevSession, RunResultStatus
+from apps.developer.selectors import context_chunks_missing, context_code_assemble, dev_usage_quota_remaining
+from apps.developer.serializers import ContextHashesInSerializer
+from apps.developer.services import SESSION_HISTORY_SIZE, context_code_store, dev_run_create
+from apps.developer.utils import (
+    generate_dev_mode_stream, generate_explainer_only_stream,
+    get_session_history
+)
+
+logger = logging.getLogger(__name__)
+
+SESSION_PATH = re.compile(r"^/ws/developing/sessions/(?P<session_id>\d+)/?$")
+
+# Close codes (4000-4999 are free for applications)
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORIZED = 4401
+
+
+# ------------- Helper: Keep the summary messages and only the last k raw turns
+def _trim_history(messages, k=SESSION_HISTORY_SIZE):
+    head = [message for message in messages if isinstance(message, SystemMessage)]
+    turns = [message for message in messages if not isinstance(message, SystemMessage)]
+    return head + turns[-2 * k:]
+
+
+class DevSessionSocket:
+    """
+    Handles one WebSocket connection to one DevSession.
+    Prompts are processed one after the other, cancel messages are handled right away.
+    """
+
+    def __init__(self, scope, receive, send, session_id):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.session_id = session_id
+
+        self.user = None
+        self.session = None
+        self.orchestrator = None
+        self.history = None
+
+        self.cancel_events = {} # run_id -> threading.Event
+        # Runs created by this connection, and whether the client is gone (no new runs then)
+        self.run_ids = set()
+        self.closed = False
+        self.run_lock = asyncio.Lock()
+        self.send_lock = asyncio.Lock()
+
+    # ---- Function 1: Connection lifecycle
+    async def handle(self):
+        message = await self.receive()
+        if message["type"] != "websocket.connect":
+            return
+
+        try:
+            await sync_to_async(self._setup)()
+        except Exception as e:
+            logger.warning(f"WebSocket Auth Error: {e}")
+            await self.send({"type": "websocket.close", "code": CLOSE_UNAUTHORIZED})
+            return
+
+        await self.send({"type": "websocket.accept"})
+
+        tasks = set()
+        try:
+            while True:
+                message = await self.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message["type"] != "websocket.receive":
+                    continue
+
+                try:
+                    data = json.loads(message.get("text") or message.get("bytes") or "")
+                except ValueError:
+                    await self._send_json({"type": "error", "message": "Messages must be JSON."})
+                    continue
+
+                if data.get("type") == "prompt":
+                    task = asyncio.create_task(self._handle_prompt(data))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                elif data.get("type") == "cancel":
+                    event = self.cancel_events.get(data.get("run_id"))
+                    if event:
+                        event.set()
+                else:
+                    await self._send_json({"type": "error", "message": "type must be prompt or cancel."})
+        finally:
+            # The client is gone: no new runs, stop generating for it and drop the queued prompts
+            self.closed = True
+            for event in list(self.cancel_events.values()):
+                event.set()
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            # Runs whose task was cancelled before streaming started are still pending
+            if self.run_ids:
+                await sync_to_async(self._cancel_pending_runs)()
+
+    # ---- Function 2: Authenticate and resolve the session once per connection
+    def _setup(self):
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        token = (query.get("token") or [""])[0]
+
+        auth = JWTAuthentication()
+        self.user = auth.get_user(auth.get_validated_token(token))
+        self.session = DevSession.objects.get(id=self.session_id, user=self.user)
+
+        configs = {
+            config.role: config
+            for config in self.session.model_configs.select_related("ai_model").filter(is_enabled=True)
+        }
+        self.orchestrator = OllamaOrchestrator(configs.get("coder"), configs.get("explainer"))
+
+    # ---- Function 3: One prompt -> one run streamed back with its run id
+    async def _handle_prompt(self, data):
+        async with self.run_lock:
+            if self.closed:
+                return
+            try:
+                run_instance, context_code, history, quota = await sync_to_async(self._create_run)(data)
+            except ValueError as e:
+                await self._send_json({"type": "error", "message": str(e), "client_id": data.get("client_id")})
+                return
+
+            cancel = threading.Event()
+            self.cancel_events[run_instance.id] = cancel
+            if self.closed:
+                # The client left while the run was created
+                cancel.set()
+            await self._send_json({
+                "type": "run",
+                "run_id": run_instance.id,
+                "client_id": data.get("client_id"),
+                "quota_remaining_tokens": quota["tokens"],
+                "quota_remaining_gpu_seconds": quota["gpu_seconds"],
+            })
+
+            # The LLM stream is blocking, it runs in a thread and hands frames to this loop
+            loop = asyncio.get_running_loop()
+            frames = asyncio.Queue()
+            threading.Thread(
+                target=self._stream_run,
+                args=(run_instance, data, context_code, history, cancel, loop, frames),
+                daemon=True,
+            ).start()
+
+            while True:
+                frame = await frames.get()
+                if frame is None:
+                    break
+                await self._send_json(frame)
+
+            self.cancel_events.pop(run_instance.id, None)
+            await self._send_json({"type": "done", "run_id": run_instance.id, "status": run_instance.status})
+
+    def _create_run(self, data):
+        user_prompt = data.get("prompt")
+        initiator_role = data.get("initiator_role")
+        if not user_prompt:
+            raise ValueError("Prompt is required")
+        if initiator_role not in ["coder", "explainer"]:
+            raise ValueError("initiator_role must be coder or explainer")
+
+        quota = dev_usage_quota_remaining(user=self.user)
+        if quota["exhausted"]:
+            raise ValueError("Daily usage quota reached. Try again tomorrow.")
+
+        hashes_serializer = ContextHashesInSerializer(data={"hashes": data.get("context_hashes") or []})
+        if not hashes_serializer.is_valid():
+            raise ValueError("Invalid context_hashes")
+
+        context_hashes = hashes_serializer.validated_data["hashes"]
+        if data.get("context_code"):
+            context_hashes += context_code_store(user=self.user, context_code=data["context_code"])
+        try:
+            context_code = context_code_assemble(user=self.user, hashes=context_hashes)
+        except ValueError:
+            missing = context_chunks_missing(user=self.user, hashes=context_hashes)
+            raise ValueError(f"Some context chunks are missing. Upload them first: {', '.join(missing)}")
+
+        if self.closed:
+            raise ValueError("The connection was closed.")
+        run_instance, _ = dev_run_create(
+            session=self.session,
+            user_prompt=user_prompt,
+            initiator_role=initiator_role,
+            context_hashes=context_hashes,
+        )
+        self.run_ids.add(run_instance.id)
+
+        # History is built once, then kept up to date from the runs of this connection
+        if self.history is None:
+            self.history = get_session_history(run_instance)
+        history = {
+            "coder": list(self.history["coder"]),
+            "explainer": list(self.history["explainer"]),
+            "previous_coder_output": self.history["previous_coder_output"],
+        }
+        return run_instance, context_code, history, quota
+
+    def _stream_run(self, run_instance, data, context_code, history, cancel, loop, frames):
+        try:
+            # The stream stops itself on cancel, even while the model is still thinking
+            if data.get("target") == "explainer":
+                stream = generate_explainer_only_stream(
+                    self.session, run_instance.user_prompt, history, run_instance, context_code, self.orchestrator, cancel
+                )
+            else:
+                stream = generate_dev_mode_stream(
+                    self.session, run_instance.user_prompt, history, run_instance, context_code, self.orchestrator, cancel
+                )
+
+            outputs = {"coder": "", "explainer": ""}
+            for line in stream:
+                frame = json.loads(line)
+                frame["run_id"] = run_instance.id
+                if "text" in frame:
+                    outputs[frame["sender"]] += frame["text"]
+                loop.call_soon_threadsafe(frames.put_nowait, frame)
+
+            if run_instance.status == RunResultStatus.SUCCESS:
+                self._remember_turn(run_instance.user_prompt, outputs)
+        except Exception as e:
+            logger.error(f"WebSocket Stream Error: {e}")
+            loop.call_soon_threadsafe(frames.put_nowait, {"type": "error", "run_id": run_instance.id, "message": "Stream failed."})
+        finally:
+            connection.close()
+            loop.call_soon_threadsafe(frames.put_nowait, None)
+
+    def _cancel_pending_runs(self):
+        DevRun.objects.filter(id__in=self.run_ids, status=RunResultStatus.PENDING).update(status=RunResultStatus.CANCELLED)
+
+    def _remember_turn(self, user_prompt, outputs):
+        user_msg = HumanMessage(content=user_prompt)
+        if outputs["coder"]:
+            self.history["coder"] = _trim_history(self.history["coder"] + [user_msg, AIMessage(content=outputs["coder"])])
+            self.history["previous_coder_output"] = outputs["coder"]
+        if outputs["explainer"]:
+            self.history["explainer"] = _trim_history(self.history["explainer"] + [user_msg, AIMessage(content=outputs["explainer"])])
+
+    async def _send_json(self, payload):
+        async with self.send_lock:
+            try:
+                await self.send({"type": "websocket.send", "text": json.dumps(payload)})
+            except Exception as e:
+                # The client disconnected while a run was still streaming
+                logger.info(f"WebSocket Send Error: {e}")
+
+
+# ------------- ASGI entry point for the "websocket" scope
+async def websocket_application(scope, receive, send):
+    match = SESSION_PATH.match(scope.get("path", ""))
+    if not match:
+        await receive() # websocket.connect
+        await send({"type": "websocket.close", "code": CLOSE_NOT_FOUND})
+        return
+
+    await DevSessionSocket(scope, receive, send, int(match.group("session_id"))).handle()
@@ -110,6 +110,12 @@ class DevRun(models.Model):
 
     user_prompt = models.TextField()
     context_code = models.TextField(blank=True, default="")
+    # Ordered list of ContextChunk digests, the context is assembled from the chunk store
+    context_hashes = models.JSONField(default=list, blank=True)
+    # Client-sent Idempotency-Key header, a retry with the same key replays this run
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    # Hash of the request body sent with the key (a reused key must come with the same body)
+    request_hash = models.CharField(max_length=64, blank=True, default="")
     initiator_role = models.CharField(max_length=20, choices=SessionRole.choices)
     status = models.CharField(
         max_length=20, 
@@ -124,6 +130,9 @@ class DevRun(models.Model):
         indexes = [
             models.Index(fields=["session", "created_at"]),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=["session", "idempotency_key"], name="uq_dev_run_session_idempotency_key"),
+        ]
         ordering = ["-created_at"]
 
     def __str__(self):
@@ -162,3 +171,121 @@ class DevRunResult(models.Model):
 
     def __str__(self):
         return f"{self.run_id}:{self.session_model_config_id}:{self.status}"
+
+
+# --------- Model 5: Content-addressed pieces of code context uploaded by a user
+class ContextChunk(models.Model):
+    """
+    Stores a chunk of code context once per user, keyed by the SHA-256 of its content.
+    Runs reference chunks by digest so the same files are never uploaded or stored twice.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="context_chunks")
+    digest = models.CharField(max_length=64)
+    content = models.TextField()
+    size = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "dev_context_chunk"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "digest"], name="uq_dev_context_chunk_user_digest"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.digest[:12]}"
+
+
+# --------- Model 6: Rolling summary of the runs that dropped out of the history window
+class DevSessionSummary(TimeStampedModel):
+    """
+    Keeps a compact summary of older runs per session and role (coder/explainer).
+    It is refreshed in the background after each run and sent to the model
+    instead of the raw turns that no longer fit in the history window.
+    """
+    session = models.ForeignKey(DevSession, on_delete=models.CASCADE, related_name="summaries")
+    role = models.CharField(max_length=20, choices=SessionRole.choices)
+    summary = models.TextField(blank=True, default="")
+
+    # created_at of the newest run already folded into the summary
+    summarized_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "dev_session_summary"
+        constraints = [
+            models.UniqueConstraint(fields=["session", "role"], name="uq_dev_session_summary_session_role"),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id}:{self.role}"
+
+
+# --------- Model 7: Embeddings of the finished runs of a session (for relevant history)
+class DevSessionEmbeddings(TimeStampedModel):
+    """
+    One row per session holding the embedding of every finished run as a
+    compact float32 matrix (row i belongs to run_ids[i], rows are unit vectors).
+    """
+    session = models.OneToOneField(DevSession, on_delete=models.CASCADE, related_name="embeddings")
+
+    # e.g. "ollama:nomic-embed-text" or "hashing:512", vectors of different embedders can't be mixed
+    embedder = models.CharField(max_length=120)
+    dimensions = models.PositiveIntegerField()
+    run_ids = models.JSONField(default=list, blank=True)
+    vectors = models.BinaryField(default=bytes)
+
+    class Meta:
+        db_table = "dev_session_embeddings"
+
+    def __str__(self):
+        return f"{self.session_id}:{self.embedder}:{len(self.run_ids)}"
+
+
+# --------- Model 8: Daily usage counters per user and model
+class DevUsageDaily(models.Model):
+    """
+    Rolled-up usage of one model by one user on one day.
+    The counters are incremented as each model result is saved, so reports never have
+    to SUM over dev_run_result.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="dev_usage")
+    ai_model = models.ForeignKey(AiModel, on_delete=models.PROTECT, related_name="usage")
+    day = models.DateField()
+
+    calls = models.PositiveIntegerField(default=0)
+    tokens_in = models.PositiveBigIntegerField(default=0)
+    tokens_out = models.PositiveBigIntegerField(default=0)
+    gpu_ms = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = "dev_usage_daily"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "ai_model", "day"], name="uq_dev_usage_daily_user_model_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.ai_model_id}:{self.day}"
+
+
+# --------- Model 9: Daily usage totals per user (what the quota is checked against)
+class DevUsageUserDaily(models.Model):
+    """
+    The same counters summed over all models, one row per user and day.
+    Checking a quota is a single lookup on (user, day).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="dev_usage_totals")
+    day = models.DateField()
+
+    calls = models.PositiveIntegerField(default=0)
+    tokens_in = models.PositiveBigIntegerField(default=0)
+    tokens_out = models.PositiveBigIntegerField(default=0)
+    gpu_ms = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = "dev_usage_user_daily"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day"], name="uq_dev_usage_user_daily_user_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.day}"
@@ -0,0 +1,168 @@
+# ----------- IMPORTS ----------
+from __future__ import annotations
+
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.ai_models.embeddings import default_embedder, embed_texts
+from apps.developer.models import ContextChunk, DevRun, DevSession, DevSessionEmbeddings, DevUsageUserDaily, RunResultStatus
+from core.idempotency import idempotency_cutoff
+
+
+# ----------- SELECTORS -----------------
+# ---- Selector 1: Find which chunk digests the server doesn't have yet ------
+def context_chunks_missing(*, user: User, hashes: list[str]) -> list[str]:
+    """
+    Returns the digests from `hashes` that are not stored for the user yet,
+    so the client only uploads those chunks.
+
+    Args:
+        user (User): The owner of the chunks.
+        hashes (list[str]): SHA-256 digests the client wants to reference.
+
+    Returns:
+        list[str]: The unknown digests, in the order they were given.
+    """
+    known = set(
+        ContextChunk.objects
+        .filter(user=user, digest__in=set(hashes))
+        .values_list("digest", flat=True)
+    )
+    return [digest for digest in dict.fromkeys(hashes) if digest not in known]
+
+
+# ---- Selector 2: Rebuild the context code of a run from the chunk store ------
+def context_code_assemble(*, user: User, hashes: list[str]) -> str:
+    """
+    Concatenates the stored chunks in the order of `hashes`.
+
+    Args:
+        user (User): The owner of the chunks.
+        hashes (list[str]): Ordered SHA-256 digests (a digest may repeat).
+
+    Raises:
+        ValueError: If one of the digests is not stored for the user.
+
+    Returns:
+        str: The full context code.
+    """
+    if not hashes:
+        return ""
+
+    contents = dict(
+        ContextChunk.objects
+        .filter(user=user, digest__in=set(hashes))
+        .values_list("digest", "content")
+    )
+    missing = [digest for digest in hashes if digest not in contents]
+    if missing:
+        raise ValueError(f"Unknown context chunks: {', '.join(missing)}")
+
+    return "".join(contents[digest] for digest in hashes)
+
+
+# ---- Selector 3: Find the older runs that are most relevant to a prompt ------
+def session_relevant_run_ids(
+    *,
+    session: DevSession,
+    query: str,
+    exclude_ids: set[int],
+    top_k: int,
+    min_similarity: float,
+) -> list[int]:
+    """
+    Ranks the embedded runs of a session by cosine similarity to `query`.
+
+    Args:
+        session (DevSession): The session to search.
+        query (str): The new user prompt.
+        exclude_ids (set[int]): Runs that are already part of the history.
+        top_k (int): Max number of runs to return.
+        min_similarity (float): Runs below this cosine similarity are ignored.
+
+    Returns:
+        list[int]: Run ids, most relevant first.
+    """
+    index = DevSessionEmbeddings.objects.filter(session=session).first()
+    if top_k <= 0 or not index or not index.run_ids or index.embedder != default_embedder():
+        return []
+
+    matrix = np.frombuffer(index.vectors, dtype=np.float32).reshape(len(index.run_ids), index.dimensions)
+    query_vector = embed_texts([query], index.embedder)[0]
+
+    # Rows are unit vectors, so one matrix-vector product gives every cosine similarity
+    scores = matrix @ query_vector
+    excluded = np.fromiter((run_id in exclude_ids for run_id in index.run_ids), dtype=bool, count=len(index.run_ids))
+    scores[excluded] = -np.inf
+
+    k = min(top_k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best])]
+    return [index.run_ids[row] for row in best if scores[row] >= min_similarity]
+
+
+# ---- Selector 4: The run a retried request refers to ------
+def dev_run_get_by_idempotency_key(*, session: DevSession, idempotency_key: str) -> DevRun | None:
+    """
+    Returns the run created with the same Idempotency-Key, if the key hasn't expired.
+    Abandoned runs are skipped (the client disconnected, or the run is still pending past
+    its deadline because its worker died), so the retry starts a new run.
+
+    Args:
+        session (DevSession): The session the run belongs to.
+        idempotency_key (str): The key sent by the client.
+
+    Returns:
+        DevRun | None: The previous run, otherwise None.
+    """
+    return (
+        DevRun.objects
+        .filter(session=session, idempotency_key=idempotency_key, created_at__gte=idempotency_cutoff())
+        .exclude(status=RunResultStatus.CANCELLED)
+        .exclude(status=RunResultStatus.PENDING, created_at__lt=dev_run_deadline_cutoff())
+        .first()
+    )
+
+
+# ---- Helper: Pending runs created before this datetime are past their deadline ------
+def dev_run_deadline_cutoff():
+    """
+    A run streams the coder and the explainer, each bounded by OLLAMA_TOTAL_TIMEOUT_SECONDS.
+    """
+    return timezone.now() - timedelta(seconds=settings.OLLAMA_TOTAL_TIMEOUT_SECONDS * 2)
+
+
+# ---- Selector 5: What is left of the daily quotas of a user ------
+def dev_usage_quota_remaining(*, user: User) -> dict:
+    """
+    Reads today's usage totals of the user (one row lookup) and compares them
+    to DEV_DAILY_TOKEN_QUOTA and DEV_DAILY_GPU_SECONDS_QUOTA.
+
+    Args:
+        user (User): The developer about to start a run.
+
+    Returns:
+        dict: {"tokens": int | None, "gpu_seconds": int | None, "exhausted": bool},
+        None means the quota is unlimited.
+    """
+    totals = (
+        DevUsageUserDaily.objects
+        .filter(user=user, day=timezone.localdate())
+        .values("tokens_in", "tokens_out", "gpu_ms")
+        .first()
+    ) or {"tokens_in": 0, "tokens_out": 0, "gpu_ms": 0}
+
+    remaining = {"tokens": None, "gpu_seconds": None}
+    if settings.DEV_DAILY_TOKEN_QUOTA:
+        used = totals["tokens_in"] + totals["tokens_out"]
+        remaining["tokens"] = max(settings.DEV_DAILY_TOKEN_QUOTA - used, 0)
+    if settings.DEV_DAILY_GPU_SECONDS_QUOTA:
+        used = totals["gpu_ms"] // 1000
+        remaining["gpu_seconds"] = max(settings.DEV_DAILY_GPU_SECONDS_QUOTA - used, 0)
+
+    remaining["exhausted"] = remaining["tokens"] == 0 or remaining["gpu_seconds"] == 0
+    return remaining
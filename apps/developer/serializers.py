@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from apps.ai_models.models import AiModel
+from apps.ai_models.warmup import warmup_scheduler
 from .models import (
     DevRunResult,
     DevSession, 
@@ -93,13 +94,18 @@ class AiModelOutSerializer(serializers.ModelSerializer):
     """
     # Combines provider and model name for a cleaner UI label
     display_name = serializers.SerializerMethodField()
+    # "warm" models answer right away, "cold" ones have to be loaded first
+    warm_state = serializers.SerializerMethodField()
 
     class Meta:
         model = AiModel
-        fields = ['id', 'display_name', 'provider', 'model_name']
+        fields = ['id', 'display_name', 'provider', 'model_name', 'warm_state']
 
     def get_display_name(self, obj):
         return f"{obj.get_provider_display()} - {obj.model_name}"
+
+    def get_warm_state(self, obj):
+        return warmup_scheduler.state(obj.model_name)
     
     
 # ---------- Serializer 7: Chat Result (Individual AI Responses)
@@ -118,7 +124,7 @@ class DevRunOutSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DevRun
-        fields = ['id', "initiator_role", 'user_prompt', 'context_code', 'status', 'created_at', 'results']
+        fields = ['id', "initiator_role", 'user_prompt', 'context_code', 'context_hashes', 'status', 'created_at', 'results']
         
 # ------- Serializer 9: Deatailed serializer for user session
 class DevSessionDetailOutSerializer(serializers.ModelSerializer):
@@ -152,4 +158,27 @@ class DevSessionDetailOutSerializer(serializers.ModelSerializer):
         
         # 3. Use your nested serializer
         return DevRunOutSerializer(ordered_runs, many=True).data
-    
\ No newline at end of file
+
+
+# ------- Serializer 10: Upload of code context chunks
+class ContextChunksUploadInSerializer(serializers.Serializer):
+    """
+    Raw chunk contents, the server computes the digests itself.
+    """
+    chunks = serializers.ListField(
+        child=serializers.CharField(trim_whitespace=False),
+        allow_empty=False,
+        max_length=500
+    )
+
+
+# ------- Serializer 11: Digests the client wants to reference in a run
+class ContextHashesInSerializer(serializers.Serializer):
+    """
+    A list of SHA-256 hex digests of context chunks.
+    """
+    hashes = serializers.ListField(
+        child=serializers.RegexField(r"^[0-9a-f]{64}$"),
+        allow_empty=True,
+        max_length=500
+    )
@@ -0,0 +1,326 @@
+# --------------- IMPORTS --------------
+from __future__ import annotations
+
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.accounts.models import User
+from apps.ai_models.models import AiModel
+from apps.ai_models.embeddings import default_embedder, embed_texts
+from apps.ai_models.services import summarize_history
+from apps.developer.selectors import dev_run_get_by_idempotency_key
+from apps.developer.models import (
+    ContextChunk,
+    DevRun,
+    DevRunResult,
+    DevSession,
+    DevSessionEmbeddings,
+    DevSessionSummary,
+    DevUsageDaily,
+    DevUsageUserDaily,
+    RunResultStatus,
+    SessionRole
+)
+
+# Chunks are cut on line boundaries around this size so small edits only change one chunk
+CONTEXT_CHUNK_SIZE = 4096
+
+# Number of previous runs sent to the models as raw messages
+SESSION_HISTORY_SIZE = 5
+
+# Max number of runs folded into a summary in one refresh
+SUMMARY_REFRESH_BATCH = 10
+
+# Max number of runs embedded in one update, and how much of each run is embedded
+EMBEDDING_BATCH = 20
+EMBEDDING_TEXT_MAX_CHARS = 4000
+
+# ------------------- HELPERS (Private functions) -------------------
+
+# --------- Helper 1: Content address of a chunk
+def _chunk_digest(content: str) -> str:
+    """
+    Returns the SHA-256 hex digest used as the address of a chunk.
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# --------- Helper 2: Split raw code into line-aligned chunks
+def _split_context_code(context_code: str, chunk_size: int = CONTEXT_CHUNK_SIZE) -> list[str]:
+    """
+    Splits code into chunks of about `chunk_size` characters without breaking lines,
+    so joining the chunks gives back the exact same text.
+    """
+    chunks = []
+    current = ""
+    for line in context_code.splitlines(keepends=True):
+        if current and len(current) + len(line) > chunk_size:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# --------- Helper 3: Text that represents a finished run in the embedding index
+def _run_embedding_text(run: DevRun) -> str:
+    """
+    The user prompt followed by the model outputs of the run, cut to a fixed size.
+    """
+    outputs = "\n".join(result.output for result in run.results.all())
+    return f"{run.user_prompt}\n{outputs}"[:EMBEDDING_TEXT_MAX_CHARS]
+
+
+# --------- Helper 4: Add to the counters of a usage row (created on first use)
+def _usage_increment(model, lookup: dict, counters: dict) -> None:
+    increments = {field: F(field) + value for field, value in counters.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **counters)
+    except IntegrityError:
+        # Another run created the row first
+        model.objects.filter(**lookup).update(**increments)
+
+
+# ---------------------- SERVICES ----------------------
+
+# ------- Service 1: Store chunks of code context for a user
+def context_chunks_store(*, user: User, chunks: list[str]) -> list[str]:
+    """
+    Stores each chunk once per user (content-addressed) and returns their digests.
+
+    Chunks that already exist are not written again, so re-uploading is cheap.
+
+    Args:
+        user (User): The owner of the chunks.
+        chunks (list[str]): The raw chunk contents.
+
+    Returns:
+        list[str]: The digest of every chunk, in the given order.
+    """
+    digests = [_chunk_digest(chunk) for chunk in chunks]
+    by_digest = dict(zip(digests, chunks))
+
+    existing = set(
+        ContextChunk.objects
+        .filter(user=user, digest__in=by_digest.keys())
+        .values_list("digest", flat=True)
+    )
+
+    # ignore_conflicts covers two requests uploading the same chunk at the same time
+    ContextChunk.objects.bulk_create(
+        [
+            ContextChunk(user=user, digest=digest, content=content, size=len(content))
+            for digest, content in by_digest.items()
+            if digest not in existing
+        ],
+        ignore_conflicts=True,
+    )
+    return digests
+
+
+# ------- Service 2: Store raw context code and return its chunk digests
+def context_code_store(*, user: User, context_code: str) -> list[str]:
+    """
+    Splits raw context code into chunks and stores them.
+
+    Args:
+        user (User): The owner of the context.
+        context_code (str): The code pasted by the user.
+
+    Returns:
+        list[str]: The ordered digests that rebuild `context_code`.
+    """
+    return context_chunks_store(user=user, chunks=_split_context_code(context_code))
+
+
+# ------- Service 3: Fold the runs that left the history window into the session summary
+def session_summary_refresh(*, session_id: int, history_size: int = SESSION_HISTORY_SIZE) -> None:
+    """
+    Updates the rolling summary of each role with the successful runs that are
+    older than the raw history window and not summarized yet.
+
+    This calls an LLM, so it must run in the background (never inside a live stream).
+
+    Args:
+        session_id (int): The session to summarize.
+        history_size (int): How many recent runs are still sent as raw messages.
+    """
+    session = DevSession.objects.get(id=session_id)
+
+    successful_runs = session.runs.filter(status=RunResultStatus.SUCCESS).order_by("-created_at")
+    recent_ids = list(successful_runs.values_list("id", flat=True)[:history_size])
+    older_runs = successful_runs.exclude(id__in=recent_ids)
+
+    for role in (SessionRole.CODER, SessionRole.EXPLAINER):
+        config = (
+            session.model_configs
+            .filter(role=role, is_enabled=True)
+            .select_related("ai_model")
+            .first()
+        )
+        if not config:
+            continue
+
+        summary, _ = DevSessionSummary.objects.get_or_create(session=session, role=role)
+
+        pending = (
+            DevRunResult.objects
+            .filter(run__in=older_runs, session_model_config__role=role)
+            .select_related("run")
+            .order_by("run__created_at")
+        )
+        if summary.summarized_until:
+            pending = pending.filter(run__created_at__gt=summary.summarized_until)
+
+        pending = list(pending[:SUMMARY_REFRESH_BATCH])
+        if not pending:
+            continue
+
+        model_name = settings.DEV_SUMMARY_MODEL or config.ai_model.model_name
+        summary.summary = summarize_history(
+            model_name,
+            summary.summary,
+            [(result.run.user_prompt, result.output) for result in pending],
+        )
+        summary.summarized_until = pending[-1].run.created_at
+        summary.save(update_fields=["summary", "summarized_until", "updated_at"])
+
+
+# ------- Service 4: Embed the finished runs of a session that are not indexed yet
+def session_embeddings_update(*, session_id: int) -> None:
+    """
+    Appends the embeddings of new successful runs to the session's float32 matrix.
+    Every run is embedded once. If the configured embedder changed, the index is rebuilt.
+
+    The embedding call happens outside of the row lock, only the append is locked.
+
+    Args:
+        session_id (int): The session to index.
+    """
+    embedder = default_embedder()
+    index = DevSessionEmbeddings.objects.filter(session_id=session_id).first()
+    known_ids = set(index.run_ids) if index and index.embedder == embedder else set()
+
+    pending = list(
+        DevRun.objects
+        .filter(session_id=session_id, status=RunResultStatus.SUCCESS)
+        .exclude(id__in=known_ids)
+        .prefetch_related("results")
+        .order_by("created_at")[:EMBEDDING_BATCH]
+    )
+    if not pending:
+        return
+
+    vectors = embed_texts([_run_embedding_text(run) for run in pending], embedder)
+
+    with transaction.atomic():
+        index, _ = (
+            DevSessionEmbeddings.objects
+            .select_for_update()
+            .get_or_create(
+                session_id=session_id,
+                defaults={"embedder": embedder, "dimensions": vectors.shape[1]},
+            )
+        )
+        if index.embedder != embedder or index.dimensions != vectors.shape[1]:
+            index.embedder = embedder
+            index.dimensions = vectors.shape[1]
+            index.run_ids = []
+            index.vectors = b""
+
+        # Another worker may have indexed some of these runs in the meantime
+        indexed = set(index.run_ids)
+        rows = [row for row, run in enumerate(pending) if run.id not in indexed]
+        if not rows:
+            return
+
+        index.run_ids = index.run_ids + [pending[row].id for row in rows]
+        index.vectors = bytes(index.vectors) + np.ascontiguousarray(vectors[rows], dtype=np.float32).tobytes()
+        index.save(update_fields=["embedder", "dimensions", "run_ids", "vectors", "updated_at"])
+
+
+# ------- Service 5: Create the record of a run (once per Idempotency-Key)
+def dev_run_create(
+    *,
+    session: DevSession,
+    user_prompt: str,
+    initiator_role: str,
+    context_hashes: list[str],
+    idempotency_key: str | None = None,
+    request_hash: str = "",
+) -> tuple[DevRun, bool]:
+    """
+    Creates a pending DevRun. When the client sends an Idempotency-Key that was already
+    used (and hasn't expired), the existing run is returned instead. An abandoned run
+    doesn't hold its key: the retry gets a new run.
+
+    Args:
+        session (DevSession): The session of the run.
+        user_prompt (str): The prompt of the developer.
+        initiator_role (str): "coder" or "explainer".
+        context_hashes (list[str]): Digests of the code context chunks.
+        idempotency_key (str | None): The Idempotency-Key header, if any.
+        request_hash (str): Hash of the request body, stored with the key.
+
+    Returns:
+        tuple[DevRun, bool]: The run and whether it was created by this call.
+    """
+    if idempotency_key:
+        existing = dev_run_get_by_idempotency_key(session=session, idempotency_key=idempotency_key)
+        if existing:
+            return existing, False
+
+        # The key may still be stored on an expired or abandoned run, free it so it can be reused
+        DevRun.objects.filter(session=session, idempotency_key=idempotency_key).update(idempotency_key=None)
+
+    try:
+        with transaction.atomic():
+            run = DevRun.objects.create(
+                session=session,
+                user_prompt=user_prompt,
+                initiator_role=initiator_role,
+                context_hashes=context_hashes,
+                idempotency_key=idempotency_key,
+                request_hash=request_hash,
+            )
+    except IntegrityError:
+        # Two retries raced, the other one created the run first
+        return DevRun.objects.get(session=session, idempotency_key=idempotency_key), False
+
+    return run, True
+
+
+# ------- Service 6: Count the usage of a finished model result
+def dev_usage_record(
+    *,
+    user: User,
+    ai_model: AiModel,
+    tokens_in: int,
+    tokens_out: int,
+    gpu_ms: int,
+) -> None:
+    """
+    Increments today's usage counters of the user for the model and the user's
+    daily totals (which the quota check reads) in one transaction.
+
+    Args:
+        user (User): The owner of the session.
+        ai_model (AiModel): The model that produced the result.
+        tokens_in (int): Prompt tokens.
+        tokens_out (int): Generated tokens.
+        gpu_ms (int): Time the model spent on the request, in milliseconds.
+    """
+    counters = {"calls": 1, "tokens_in": tokens_in, "tokens_out": tokens_out, "gpu_ms": gpu_ms}
+    day = timezone.localdate()
+    with transaction.atomic():
+        _usage_increment(DevUsageDaily, {"user": user, "ai_model": ai_model, "day": day}, counters)
+        _usage_increment(DevUsageUserDaily, {"user": user, "day": day}, counters)
@@ -1,3 +1,261 @@
-from django.test import TestCase
+import json
+import asyncio
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.accounts.models import User
+from apps.ai_models.models import AiModel
+from apps.developer import consumers, utils
+from apps.developer.models import DevRun, DevRunResult, DevSession, DevSessionModelConfig, DevUsageUserDaily, RunResultStatus
+from apps.developer.services import dev_run_create
+from core.idempotency import IDEMPOTENCY_REPLAYED_HEADER
+
+
+def _frames(*texts):
+    for text in texts:
+        yield json.dumps({"sender": "coder", "text": text}) + "\n"
+
+
+# ------ Idempotent runs: disconnects, abandoned runs and reused keys
+class DevRunIdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="dev@example.com", username="dev", password="password123")
+        self.session = DevSession.objects.create(user=self.user, title="Project")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/developing/sessions/{self.session.id}/run/"
+
+    def create_run(self, key="key-1", request_hash="hash"):
+        run, _ = dev_run_create(
+            session=self.session,
+            user_prompt="Write a loop",
+            initiator_role="coder",
+            context_hashes=[],
+            idempotency_key=key,
+            request_hash=request_hash,
+        )
+        return run
+
+    def post(self, prompt, key="key-1"):
+        with mock.patch.object(utils, "session_relevant_run_ids", return_value=[]), \
+                mock.patch("apps.developer.views.generate_dev_mode_stream", return_value=_frames("for")):
+            return self.client.post(
+                self.url, {"prompt": prompt, "initiator_role": "coder"}, format="json", HTTP_IDEMPOTENCY_KEY=key
+            )
+
+    def test_disconnect_cancels_the_run(self):
+        run = self.create_run()
+        stream = utils.broadcast_run_stream(run.id, _frames("a", "b"))
+
+        next(stream)
+        stream.close()
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, RunResultStatus.CANCELLED)
+        self.assertNotIn(run.id, utils._live_runs)
+
+    def test_stream_ending_without_a_status_marks_the_run_failed(self):
+        run = self.create_run()
+
+        list(utils.broadcast_run_stream(run.id, _frames("a")))
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, RunResultStatus.ERROR)
+
+    def test_retry_of_an_abandoned_run_starts_a_new_run(self):
+        run = self.create_run()
+        DevRun.objects.filter(id=run.id).update(status=RunResultStatus.CANCELLED)
+
+        retry = self.create_run()
+
+        self.assertNotEqual(retry.id, run.id)
+        run.refresh_from_db()
+        self.assertIsNone(run.idempotency_key)
+
+    def test_retry_of_a_stuck_pending_run_starts_a_new_run(self):
+        run = self.create_run()
+        DevRun.objects.filter(id=run.id).update(created_at=utils.dev_run_deadline_cutoff() - timedelta(seconds=1))
+
+        self.assertNotEqual(self.create_run().id, run.id)
+
+    def test_same_key_and_body_is_replayed(self):
+        first = self.post("Write a loop")
+        b"".join(first.streaming_content)
+
+        retry = self.post("Write a loop")
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry[IDEMPOTENCY_REPLAYED_HEADER], "true")
+        self.assertEqual(DevRun.objects.count(), 1)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        first = self.post("Write a loop")
+        b"".join(first.streaming_content)
+
+        retry = self.post("Delete the database")
+
+        self.assertEqual(retry.status_code, 422)
+        self.assertEqual(retry.data["error_code"], "idempotency_key_mismatch")
+        self.assertEqual(DevRun.objects.count(), 1)
+
+
+# ------ WebSocket sessions: cancel and disconnect stop the runs right away
+class _StalledOrchestrator:
+    """
+    A coder that doesn't send its first token until `release` is set.
+    """
+    release = threading.Event()
+
+    def __init__(self, coder_config, explainer_config):
+        self.coder_config = coder_config
+        self.explainer_config = explainer_config
+
+    def get_coder_stream(self, *args, **kwargs):
+        self.release.wait(10)
+        yield SimpleNamespace(content="late", usage_metadata=None)
+
+    def get_explainer_stream(self, *args, **kwargs):
+        yield SimpleNamespace(content="explained", usage_metadata=None)
+
+
+@override_settings(OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS=30, OLLAMA_TOTAL_TIMEOUT_SECONDS=60)
+class DevSessionSocketTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="dev@example.com", username="dev", password="password123")
+        self.session = DevSession.objects.create(user=self.user, title="Project")
+        ai_model = AiModel.objects.create(provider="ollama", model_name="stalled-coder")
+        for role in ("coder", "explainer"):
+            DevSessionModelConfig.objects.create(session=self.session, ai_model=ai_model, role=role)
+        _StalledOrchestrator.release.clear()
+        self.addCleanup(_StalledOrchestrator.release.set)
+        for patcher in (
+            mock.patch.object(consumers, "OllamaOrchestrator", _StalledOrchestrator),
+            mock.patch.object(utils, "session_relevant_run_ids", return_value=[]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_socket(self, script):
+        """
+        Runs a connection, `script(inbox, frames)` sends the client messages.
+        Returns the frames sent to the client and how long the connection took to end.
+        """
+        async def main():
+            inbox, frames = asyncio.Queue(), asyncio.Queue()
+            scope = {
+                "type": "websocket",
+                "path": f"/ws/developing/sessions/{self.session.id}/",
+                "query_string": f"token={AccessToken.for_user(self.user)}".encode(),
+            }
+
+            async def send(message):
+                if message["type"] == "websocket.send":
+                    await frames.put(json.loads(message["text"]))
+
+            await inbox.put({"type": "websocket.connect"})
+            client = asyncio.create_task(script(inbox, frames))
+            await asyncio.wait_for(consumers.websocket_application(scope, inbox.get, send), timeout=5)
+            await client
+            # Lets the threads of cancelled runs hand their last frames to this loop before it closes
+            await asyncio.sleep(0.5)
+            # The connection of the thread the consumer ran its queries in
+            await sync_to_async(connections.close_all)()
+            return [frames.get_nowait() for _ in range(frames.qsize())]
+
+        return asyncio.run(main())
+
+    @staticmethod
+    async def prompt(inbox, text):
+        await inbox.put({"type": "websocket.receive", "text": json.dumps({"type": "prompt", "prompt": text, "initiator_role": "coder"})})
+
+    @staticmethod
+    async def next_frame(frames, frame_type):
+        while True:
+            frame = await asyncio.wait_for(frames.get(), timeout=3)
+            if frame.get("type") == frame_type:
+                return frame
+
+    def test_cancel_stops_a_run_waiting_for_its_first_token(self):
+        async def script(inbox, frames):
+            await self.prompt(inbox, "Write a loop")
+            run = await self.next_frame(frames, "run")
+            await inbox.put({"type": "websocket.receive", "text": json.dumps({"type": "cancel", "run_id": run["run_id"]})})
+            done = await self.next_frame(frames, "done")
+            self.assertEqual(done["status"], RunResultStatus.CANCELLED)
+            await inbox.put({"type": "websocket.disconnect"})
+
+        self.run_socket(script)
+
+        self.assertEqual(DevRun.objects.get().status, RunResultStatus.CANCELLED)
+
+    def test_disconnect_cancels_the_run_and_drops_queued_prompts(self):
+        async def script(inbox, frames):
+            await self.prompt(inbox, "Write a loop")
+            await self.next_frame(frames, "run")
+            await self.prompt(inbox, "Write a test")
+            await self.prompt(inbox, "Write the docs")
+            await inbox.put({"type": "websocket.disconnect"})
+
+        self.run_socket(script)
+
+        self.assertEqual(list(DevRun.objects.values_list("user_prompt", "status")), [("Write a loop", RunResultStatus.CANCELLED)])
+
+
+# ------ Explainer-only runs: the result is stored and counted against the quota
+class _ExplainerOrchestrator:
+    def __init__(self, explainer_config):
+        self.coder_config = None
+        self.explainer_config = explainer_config
+
+    def get_explainer_stream(self, *args, **kwargs):
+        yield SimpleNamespace(content="It loops ", usage_metadata=None)
+        yield SimpleNamespace(content="twice.", usage_metadata={"input_tokens": 40, "output_tokens": 6})
+
+
+class ExplainerOnlyRunTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="dev@example.com", username="dev", password="password123")
+        self.session = DevSession.objects.create(user=self.user, title="Project")
+        ai_model = AiModel.objects.create(provider="ollama", model_name="explainer-model")
+        self.config = DevSessionModelConfig.objects.create(session=self.session, ai_model=ai_model, role="explainer")
+        patcher = mock.patch.object(utils, "schedule_post_run_tasks")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_result_and_usage_are_recorded(self):
+        run, _ = dev_run_create(session=self.session, user_prompt="Explain", initiator_role="explainer", context_hashes=[])
+
+        frames = list(utils.generate_explainer_only_stream(
+            self.session, "Explain", {"explainer": []}, run, "for i in range(2): pass", _ExplainerOrchestrator(self.config)
+        ))
+
+        self.assertEqual(len(frames), 2)
+        result = DevRunResult.objects.get(run=run)
+        self.assertEqual((result.output, result.status, result.tokens_out), ("It loops twice.", RunResultStatus.SUCCESS, 6))
+        usage = DevUsageUserDaily.objects.get(user=self.user)
+        self.assertEqual((usage.calls, usage.tokens_in, usage.tokens_out), (1, 40, 6))
+
+    def test_retry_replays_the_explainer_answer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f"/api/developing/sessions/{self.session.id}/run/?target=explainer"
+        body = {"prompt": "Explain", "initiator_role": "explainer", "context_code": "for i in range(2): pass"}
+
+        with mock.patch.object(utils, "OllamaOrchestrator", lambda coder, explainer: _ExplainerOrchestrator(explainer)), \
+                mock.patch.object(utils, "session_relevant_run_ids", return_value=[]):
+            b"".join(client.post(url, body, format="json", HTTP_IDEMPOTENCY_KEY="key-1").streaming_content)
+            retry = client.post(url, body, format="json", HTTP_IDEMPOTENCY_KEY="key-1")
+            frames = [json.loads(line) for line in b"".join(retry.streaming_content).decode().splitlines()]
+
+        self.assertEqual(retry[IDEMPOTENCY_REPLAYED_HEADER], "true")
+        self.assertEqual(frames, [{"sender": "explainer", "text": "It loops twice."}])
+        self.assertEqual(DevUsageUserDaily.objects.get(user=self.user).calls, 1)
 
-# Create your tests here.
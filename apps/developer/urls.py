@@ -2,7 +2,9 @@ from django.urls import path
 from .views import (
     DevSessionListCreateView, 
     DevSessionDetailView, 
-    DevRunStreamView
+    DevRunStreamView,
+    ContextChunkUploadView,
+    ContextChunkMissingView
 )
 
 app_name = 'developer'
@@ -19,4 +21,12 @@ urlpatterns = [
     # 3. Trigger the AI Coder/Explainer stream
     # URL: /developer/sessions/<session_id>/run/
     path('sessions/<int:session_id>/run/', DevRunStreamView.as_view(), name='session-run-stream'),
+
+    # 4. Upload code context chunks (content-addressed, deduplicated per user)
+    # URL: /developer/context/chunks/
+    path('context/chunks/', ContextChunkUploadView.as_view(), name='context-chunk-upload'),
+
+    # 5. Check which chunk digests still have to be uploaded
+    # URL: /developer/context/chunks/missing/
+    path('context/chunks/missing/', ContextChunkMissingView.as_view(), name='context-chunk-missing'),
 ]
\ No newline at end of file
@@ -1,72 +1,299 @@
 import json
+import time
 import logging
-from langchain_core.messages import HumanMessage, AIMessage
+import threading
+from django.conf import settings
+from django.db import connection
+from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
-from apps.ai_models.services import OllamaOrchestrator
-from apps.developer.models import DevRunResult, RunResultStatus
+from apps.ai_models.resilience import LLMDeadlineExceeded, LLMStreamCancelled, get_breaker, stream_with_deadlines
+from apps.ai_models.services import OllamaOrchestrator, estimate_tokens
+from apps.developer.models import DevRun, DevRunResult, RunResultStatus
+from apps.developer.selectors import dev_run_deadline_cutoff, session_relevant_run_ids
+from apps.developer.services import (
+    SESSION_HISTORY_SIZE,
+    dev_usage_record,
+    session_embeddings_update,
+    session_summary_refresh
+)
 
 logger = logging.getLogger(__name__)
 
+# Background tasks currently running in this process (key -> True), to avoid duplicates
+_background_tasks = set()
+_background_tasks_lock = threading.Lock()
+
+# Runs currently streaming in this process (run id -> _RunBroadcast), so retries can attach to them
+_live_runs = {}
+_live_runs_lock = threading.Lock()
+
+
+class _RunBroadcast:
+    """
+    Keeps the frames of a live run so a retried request (same Idempotency-Key)
+    can replay them and then follow the rest of the stream.
+    """
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def publish(self, frame):
+        with self.condition:
+            self.frames.append(frame)
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def follow(self):
+        sent = 0
+        while True:
+            with self.condition:
+                while sent >= len(self.frames) and not self.closed:
+                    self.condition.wait(timeout=1)
+                frames = self.frames[sent:]
+                closed = self.closed
+            sent += len(frames)
+            yield from frames
+            if closed and sent >= len(self.frames):
+                return
+
+# -------------- Helper 1: Keep the token usage Ollama reports on the last chunk of a stream
+def _collect_usage(chunk, usage):
+    """
+    Copies the usage metadata (input/output tokens, model time) of a streamed chunk into `usage`.
+    """
+    metadata = getattr(chunk, "usage_metadata", None)
+    if metadata:
+        usage["input_tokens"] = metadata.get("input_tokens")
+        usage["output_tokens"] = metadata.get("output_tokens")
+    # Time Ollama spent on the request (load + prompt + generation), reported in nanoseconds
+    total_duration = (getattr(chunk, "response_metadata", None) or {}).get("total_duration")
+    if total_duration:
+        usage["gpu_ms"] = total_duration // 1_000_000
+
+# -------------- Helper 2: Run slow side work (LLM calls) in a daemon thread
+def _start_background_task(key, target, **kwargs):
+    """
+    Runs target(**kwargs) in a daemon thread, unless a task with the same key is already running.
+    The live stream never waits for it.
+    """
+    with _background_tasks_lock:
+        if key in _background_tasks:
+            return
+        _background_tasks.add(key)
+
+    def _worker():
+        try:
+            target(**kwargs)
+        except Exception as e:
+            logger.error(f"Background Task Error ({key}): {e}")
+        finally:
+            with _background_tasks_lock:
+                _background_tasks.discard(key)
+            # Every thread gets its own DB connection, close it so it doesn't leak
+            connection.close()
+
+    threading.Thread(target=_worker, daemon=True).start()
+
+
+# -------------- Helper 3: Background work once a run is done
+def schedule_post_run_tasks(session_id):
+    """
+    Refreshes the rolling summary and embeds the new run of a session in the background.
+    If one of them is already running for the session it is skipped, the next run will catch up.
+    """
+    _start_background_task(("summary", session_id), session_summary_refresh, session_id=session_id)
+    _start_background_task(("embeddings", session_id), session_embeddings_update, session_id=session_id)
+
+
+# -------------- Helper 4: The human + AI messages of a previous run for each role
+def _append_run_turns(run, coder_history, explainer_history):
+    user_msg = HumanMessage(content=run.user_prompt)
+    results = {}
+    for result in run.results.all():
+        results.setdefault(result.session_model_config.role, result)
+
+    # --- Coder's View of the Past ---
+    if "coder" in results:
+        coder_history.append(user_msg)
+        coder_history.append(AIMessage(content=results["coder"].output))
+
+    # --- Explainer's View of the Past ---
+    if "explainer" in results:
+        # We also give the Explainer the user prompt for context
+        explainer_history.append(user_msg)
+        explainer_history.append(AIMessage(content=results["explainer"].output))
+
+
+# -------------- Helper 5: Stream one model with deadlines and its circuit breaker
+def _stream_model(sender, breaker, stream_factory, result, cancel=None):
+    """
+    Yields the JSON frames of one model and fills `result` with the output, usage and status.
+    A missed deadline ends the stream with status TIMEOUT, a cancel (the `cancel` event is set)
+    with CANCELLED, any other failure with ERROR.
+    """
+    started = time.monotonic()
+    try:
+        for chunk in stream_with_deadlines(stream_factory, cancel=cancel):
+            content = chunk.content
+            result["output"] += content # update the bucket
+            _collect_usage(chunk, result["usage"])
+            # Wrap in JSON so the frontend knows who is talking
+            # 'yield': sends a piece of data out immediately and then waits to send the next one
+            yield json.dumps({"sender": sender, "text": content}) + "\n"
+    except LLMDeadlineExceeded as e:
+        breaker.record_failure()
+        logger.error(f"{sender.capitalize()} Stream Timeout: {e}")
+        result["status"] = RunResultStatus.TIMEOUT
+        result["message"] = str(e)
+        return
+    except LLMStreamCancelled:
+        # The model is fine, the client stopped the run
+        result["status"] = RunResultStatus.CANCELLED
+        return
+    except Exception as e:
+        breaker.record_failure()
+        logger.error(f"{sender.capitalize()} Stream Error: {e}")
+        result["status"] = RunResultStatus.ERROR
+        result["message"] = str(e)
+        return
+    finally:
+        result["latency_ms"] = int((time.monotonic() - started) * 1000)
+
+    breaker.record_success()
+    result["status"] = RunResultStatus.SUCCESS
+
+
+# -------------- Helper 6: Save the result of one model (the token count is cached with the output)
+def _save_model_result(run_instance, config, result):
+    tokens_out = result["usage"].get("output_tokens") or estimate_tokens(result["output"])
+    DevRunResult.objects.create(
+        run=run_instance,
+        session_model_config=config,
+        output=result["output"],
+        status=result["status"],
+        response_message=result["message"],
+        latency_ms=result["latency_ms"],
+        tokens_in=result["usage"].get("input_tokens"),
+        tokens_out=tokens_out,
+    )
+
+    # Count it against the user's quota (failed calls too, they still used the model)
+    try:
+        dev_usage_record(
+            user=run_instance.session.user,
+            ai_model=config.ai_model,
+            tokens_in=result["usage"].get("input_tokens") or 0,
+            tokens_out=tokens_out,
+            gpu_ms=result["usage"].get("gpu_ms") or result["latency_ms"] or 0,
+        )
+    except Exception as e:
+        logger.error(f"Usage Accounting Error: {e}")
+
+
+# -------------- Helper 7: Error text for a failed model (timeouts say which deadline was missed)
+def _failure_text(sender, result, error_message):
+    if result["status"] == RunResultStatus.TIMEOUT:
+        return f"{sender.capitalize()} timed out, the model took too long to respond."
+    if result["status"] == RunResultStatus.CANCELLED:
+        return f"{sender.capitalize()} was cancelled."
+    return error_message
+
+
+# -------------- Helper 8: Fail fast while the circuit of a model is open
+def _circuit_open_frame(run_instance, role, breaker):
+    run_instance.status = RunResultStatus.ERROR
+    run_instance.save()
+    return json.dumps({
+        "sender": "system",
+        "error": f"The {role} model is unavailable right now. Try again in {breaker.retry_after()} seconds.",
+    }) + "\n"
+
+
+def _new_model_result():
+    return {"output": "", "usage": {}, "status": None, "message": "", "latency_ms": None}
+
+
 # -------------- Function 1: Handle the calling for the agents and send the data (in chuncks) to the FE
-def generate_dev_mode_stream(session, user_prompt, history_messages, run_instance):
+def generate_dev_mode_stream(session, user_prompt, history_messages, run_instance, context_code="", orchestrator=None, cancel=None):
     """
     Yields JSON chunks sequentially: Coder first, then Explainer.
+    orchestrator: an already built orchestrator to reuse (e.g. for a WebSocket connection)
+    cancel: a threading.Event that stops the run (even while waiting for a token)
     """
     try:
         # 1. Get configs from the session
-        coder_cfg = session.model_configs.get(role="coder", is_enabled=True)
-        explainer_cfg = session.model_configs.get(role="explainer", is_enabled=True)
-        
+        if orchestrator:
+            coder_cfg, explainer_cfg = orchestrator.coder_config, orchestrator.explainer_config
+        else:
+            coder_cfg = session.model_configs.select_related("ai_model").get(role="coder", is_enabled=True)
+            explainer_cfg = session.model_configs.select_related("ai_model").get(role="explainer", is_enabled=True)
+
+        # Don't even build the LLM clients while the coder backend is known to be down
+        coder_breaker = get_breaker(coder_cfg.ai_model.model_name)
+        if not coder_breaker.allow():
+            yield _circuit_open_frame(run_instance, "coder", coder_breaker)
+            return
+
         # Initilizee an instance of the LLMs and pass the session config for each model
-        orchestrator = OllamaOrchestrator(coder_cfg, explainer_cfg)
+        if orchestrator is None:
+            orchestrator = OllamaOrchestrator(coder_cfg, explainer_cfg)
         
-        full_code = "" # Catch what the coder responded with so this will be passed to the explainer
         # --- PHASE A: CODER ---
-        # Catch every word the coder writres
-        try:
-            for chunk in orchestrator.get_coder_stream(user_prompt, history_messages['coder']):
-                content = chunk.content
-                full_code += content # update the bucket
-                # Wrap in JSON so the frontend knows who is talking
-                # 'yield': sends a piece of data out immediately and then waits to send the next one
-                yield json.dumps({"sender": "coder", "text": content}) + "\n"
-
-            # --- SAVE CODER RESULT ---
-            DevRunResult.objects.create(
-                run=run_instance,
-                session_model_config=coder_cfg,
-                output=full_code,
-                status=RunResultStatus.SUCCESS
-            )
-        except Exception as e:
-            logger.error(f"Coder Stream Error: {e}")
-            yield json.dumps({"sender": "coder", "error": "Coder failed to respond. Check Ollama status."}) + "\n"
+        # Catch every word the coder writres, so this will be passed to the explainer
+        coder = _new_model_result()
+        yield from _stream_model(
+            "coder",
+            coder_breaker,
+            lambda: orchestrator.get_coder_stream(user_prompt, history_messages['coder'], context_code),
+            coder,
+            cancel,
+        )
+
+        # --- SAVE CODER RESULT ---
+        _save_model_result(run_instance, coder_cfg, coder)
+        if coder["status"] != RunResultStatus.SUCCESS:
+            run_instance.status = coder["status"]
+            run_instance.save()
+            yield json.dumps({"sender": "coder", "error": _failure_text("coder", coder, "Coder failed to respond. Check Ollama status.")}) + "\n"
             return # Stop if the primary coder fails
     
         # --- PHASE B: EXPLAINER ---
-        full_explanation = ""
-        try:
-            # Triggered automatically once Coder's loop finishes
-            for chunk in orchestrator.get_explainer_stream(user_prompt, full_code, history_messages['explainer']):
-                content = chunk.content
-                full_explanation += content
-                yield json.dumps({"sender": "explainer", "text": content}) + "\n"
-                
-            # --- SAVE EXPLAINER RESULT ---
-            DevRunResult.objects.create(
-                run=run_instance,
-                session_model_config=explainer_cfg,
-                output=full_explanation,
-                status=RunResultStatus.SUCCESS
-            )
-            
-            # Update the db field for each run
-            run_instance.status = RunResultStatus.SUCCESS
-            run_instance.save()
-            
-        except Exception as e:
-                logger.error(f"Explainer Stream Error: {e}")
-                yield json.dumps({"sender": "explainer", "error": "Code generated, but explanation failed."}) + "\n"
+        explainer_breaker = get_breaker(explainer_cfg.ai_model.model_name)
+        if not explainer_breaker.allow():
+            yield _circuit_open_frame(run_instance, "explainer", explainer_breaker)
+            return
+
+        # Triggered automatically once Coder's loop finishes
+        explainer = _new_model_result()
+        yield from _stream_model(
+            "explainer",
+            explainer_breaker,
+            lambda: orchestrator.get_explainer_stream(
+                user_prompt,
+                coder["output"],
+                history_messages['explainer'],
+                previous_coder_output=history_messages.get('previous_coder_output', ""),
+            ),
+            explainer,
+            cancel,
+        )
+
+        # --- SAVE EXPLAINER RESULT ---
+        _save_model_result(run_instance, explainer_cfg, explainer)
+
+        # Update the db field for each run
+        run_instance.status = explainer["status"]
+        run_instance.save()
+
+        if explainer["status"] == RunResultStatus.SUCCESS:
+            schedule_post_run_tasks(session.id)
+        else:
+            yield json.dumps({"sender": "explainer", "error": _failure_text("explainer", explainer, "Code generated, but explanation failed.")}) + "\n"
             
     except Exception as e:
         logger.critical(f"Orchestrator Setup Error: {e}")
@@ -76,52 +303,178 @@ def generate_dev_mode_stream(session, user_prompt, history_messages, run_instanc
     
 
 # ---------------- Function 2: Retrieve the last 5 successful messages from the DB to show them  in the chat
-def get_session_history(run_instance, k=5):
+def get_session_history(run_instance, k=SESSION_HISTORY_SIZE):
     """
     Fetches the last k successful runs from the same session 
     to provide conversational memory for Coder chat and Explainer Chat.
+    Older runs are represented by the rolling session summary (if there is one).
     """
     coder_history = []
     explainer_history = []
-    
+
+    # Compact summary of everything older than the last k runs, sent before the raw turns
+    summaries = dict(run_instance.session.summaries.values_list("role", "summary"))
+    if summaries.get("coder"):
+        coder_history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summaries['coder']}"))
+    if summaries.get("explainer"):
+        explainer_history.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summaries['explainer']}"))
+
     # Get previous successful runs in this session
-    previous_runs = run_instance.session.runs.filter(
-        status=RunResultStatus.SUCCESS
-    ).exclude(id=run_instance.id).order_by('-created_at')[:k]
+    previous_runs = list(
+        run_instance.session.runs.filter(status=RunResultStatus.SUCCESS)
+        .exclude(id=run_instance.id)
+        .prefetch_related("results__session_model_config")
+        .order_by('-created_at')[:k]
+    )
+
+    # Older runs that are relevant to the new prompt (embedding similarity), oldest first
+    try:
+        relevant_ids = session_relevant_run_ids(
+            session=run_instance.session,
+            query=run_instance.user_prompt,
+            exclude_ids={run.id for run in previous_runs} | {run_instance.id},
+            top_k=settings.DEV_HISTORY_RELEVANT_K,
+            min_similarity=settings.DEV_HISTORY_MIN_SIMILARITY,
+        )
+    except Exception as e:
+        logger.warning(f"Relevant History Error: {e}")
+        relevant_ids = []
+
+    relevant_runs = (
+        DevRun.objects.filter(id__in=relevant_ids)
+        .prefetch_related("results__session_model_config")
+        .order_by("created_at")
+    ) if relevant_ids else []
+
+    for run in relevant_runs:
+        _append_run_turns(run, coder_history, explainer_history)
 
     for run in reversed(previous_runs):
-        user_msg = HumanMessage(content=run.user_prompt)
-        
-        # --- Coder's View of the Past ---
-        coder_res = run.results.filter(session_model_config__role="coder").first()
+        _append_run_turns(run, coder_history, explainer_history)
+
+    # Latest coder output, lets the explainer work from a diff
+    previous_coder_output = ""
+    for run in previous_runs:
+        coder_res = next((r for r in run.results.all() if r.session_model_config.role == "coder"), None)
         if coder_res:
-            coder_history.append(user_msg)
-            coder_history.append(AIMessage(content=coder_res.output))
-            
-        # --- Explainer's View of the Past ---
-        explainer_res = run.results.filter(session_model_config__role="explainer").first()
-        if explainer_res:
-            # We also give the Explainer the user prompt for context
-            explainer_history.append(user_msg) 
-            explainer_history.append(AIMessage(content=explainer_res.output))
-            
-    return {"coder": coder_history, "explainer": explainer_history}
+            previous_coder_output = coder_res.output
+            break
+
+    return {
+        "coder": coder_history,
+        "explainer": explainer_history,
+        "previous_coder_output": previous_coder_output,
+    }
 
 # --------------- Function 3: Stream the explainer responde only
-def generate_explainer_only_stream(session, user_prompt, history_messages, run_instance):
+def generate_explainer_only_stream(session, user_prompt, history_messages, run_instance, context_code="", orchestrator=None, cancel=None):
     try:
-        explainer_cfg = session.model_configs.get(role="explainer", is_enabled=True)
-        orchestrator = OllamaOrchestrator(None, explainer_cfg) # No coder needed
+        if orchestrator:
+            explainer_cfg = orchestrator.explainer_config
+        else:
+            explainer_cfg = session.model_configs.select_related("ai_model").get(role="explainer", is_enabled=True)
+
+        explainer_breaker = get_breaker(explainer_cfg.ai_model.model_name)
+        if not explainer_breaker.allow():
+            yield _circuit_open_frame(run_instance, "explainer", explainer_breaker)
+            return
+
+        if orchestrator is None:
+            orchestrator = OllamaOrchestrator(None, explainer_cfg) # No coder needed
         
-        full_explanation = ""
-        # pass an empty string for 'full_code' since no new code was generated
-        for chunk in orchestrator.get_explainer_stream(user_prompt, "", history_messages['explainer']):
-            content = chunk.content
-            full_explanation += content
-            yield json.dumps({"sender": "explainer", "text": content}) + "\n"
-            
-        # Save results
-        run_instance.status = RunResultStatus.SUCCESS
+        # No new code was generated, so the explainer works on the code context (empty if none was sent)
+        explainer = _new_model_result()
+        yield from _stream_model(
+            "explainer",
+            explainer_breaker,
+            lambda: orchestrator.get_explainer_stream(user_prompt, context_code, history_messages['explainer']),
+            explainer,
+            cancel,
+        )
+
+        # Save results (the result row is what the replay reads and what the quota counts)
+        _save_model_result(run_instance, explainer_cfg, explainer)
+        run_instance.status = explainer["status"]
         run_instance.save()
+
+        if explainer["status"] == RunResultStatus.SUCCESS:
+            schedule_post_run_tasks(session.id)
+        else:
+            yield json.dumps({"sender": "explainer", "error": _failure_text("explainer", explainer, "Explanation failed.")}) + "\n"
     except Exception as e:
-        yield json.dumps({"sender": "explainer", "error": str(e)}) + "\n"
\ No newline at end of file
+        yield json.dumps({"sender": "explainer", "error": str(e)}) + "\n"
+
+
+# --------------- Function 4: Publish the frames of a live run for retried requests
+def broadcast_run_stream(run_id, stream):
+    """
+    Registers the run as live (right away, not when streaming starts) and returns
+    a stream that yields the frames of `stream` while recording them.
+    When the client disconnects before the end, the run is cancelled (a retry with the
+    same Idempotency-Key then starts a new run instead of waiting for this one).
+    """
+    broadcast = _RunBroadcast()
+    with _live_runs_lock:
+        _live_runs[run_id] = broadcast
+
+    def _stream():
+        finished = False
+        try:
+            for frame in stream:
+                broadcast.publish(frame)
+                yield frame
+            finished = True
+        finally:
+            # Stops the generation too (GeneratorExit reaches the model stream)
+            stream.close()
+            # The stream saves the final status, a run still pending was interrupted (or failed without saying so)
+            try:
+                DevRun.objects.filter(id=run_id, status=RunResultStatus.PENDING).update(
+                    status=RunResultStatus.ERROR if finished else RunResultStatus.CANCELLED
+                )
+            except Exception as e:
+                logger.error(f"Run Cancel Error: {e}")
+            broadcast.close()
+            with _live_runs_lock:
+                _live_runs.pop(run_id, None)
+
+    return _stream()
+
+
+# --------------- Function 5: Answer a retried request without generating again
+def generate_run_replay_stream(run_instance):
+    """
+    Attaches to the run if it is still streaming in this process, otherwise waits for it
+    to finish and replays the stored results (one frame per model).
+    """
+    with _live_runs_lock:
+        broadcast = _live_runs.get(run_instance.id)
+    if broadcast:
+        yield from broadcast.follow()
+        run_instance.refresh_from_db(fields=["status"])
+        if run_instance.status == RunResultStatus.CANCELLED:
+            yield json.dumps({"sender": "system", "error": "The original request was interrupted. Try again."}) + "\n"
+        return
+
+    # Streaming in another worker: poll until it is done (bounded by what is left of the run's deadline)
+    remaining = (run_instance.created_at - dev_run_deadline_cutoff()).total_seconds()
+    deadline = time.monotonic() + max(remaining, 0)
+    while run_instance.status == RunResultStatus.PENDING and time.monotonic() < deadline:
+        time.sleep(0.5)
+        run_instance.refresh_from_db(fields=["status"])
+
+    if run_instance.status in (RunResultStatus.PENDING, RunResultStatus.CANCELLED):
+        # A retry after this one starts a new run (the selector skips abandoned runs)
+        yield json.dumps({"sender": "system", "error": "The original request was interrupted. Try again."}) + "\n"
+        return
+
+    results = run_instance.results.select_related("session_model_config").order_by("created_at")
+    for result in results:
+        role = result.session_model_config.role
+        if result.status == RunResultStatus.SUCCESS:
+            yield json.dumps({"sender": role, "text": result.output}) + "\n"
+        else:
+            yield json.dumps({"sender": role, "error": f"{role.capitalize()} failed to respond."}) + "\n"
+
+    if run_instance.status != RunResultStatus.SUCCESS and not results:
+        yield json.dumps({"sender": "system", "error": "The original request failed."}) + "\n"
@@ -7,20 +7,40 @@ from django.db.models import Prefetch
 from rest_framework.permissions import IsAuthenticated
 
 from apps.ai_models.models import AiModel
+from apps.ai_models.warmup import warmup_scheduler
 from apps.developer.utils import (
     generate_dev_mode_stream, generate_explainer_only_stream, 
-    get_session_history
+    get_session_history, broadcast_run_stream, generate_run_replay_stream
 )
 from .models import (
     DevRun, 
     DevSession,
     RunResultStatus
 )
+from .selectors import (
+    context_chunks_missing,
+    context_code_assemble,
+    dev_run_get_by_idempotency_key,
+    dev_usage_quota_remaining
+)
 from .serializers import (
     AiModelOutSerializer,
     DevSessionOutSerializer, 
     DevSessionDetailOutSerializer, 
     DevSessionCreateAllInSerializer,
+    ContextChunksUploadInSerializer,
+    ContextHashesInSerializer,
+)
+from .services import (
+    context_chunks_store,
+    context_code_store,
+    dev_run_create
+)
+from core.idempotency import (
+    IDEMPOTENCY_HEADER,
+    IDEMPOTENCY_REPLAYED_HEADER,
+    get_idempotency_key,
+    request_fingerprint
 )
 from core.responses import (
     success_response,
@@ -29,6 +49,24 @@ from core.responses import (
 
 logger = logging.getLogger(__name__)
 
+# -------------- HELPERS ---------------
+
+# -------------- Helper 1: Tell the client what is left of its daily quotas
+def _set_quota_headers(response, quota):
+    if quota["tokens"] is not None:
+        response['X-Quota-Remaining-Tokens'] = str(quota["tokens"])
+    if quota["gpu_seconds"] is not None:
+        response['X-Quota-Remaining-Gpu-Seconds'] = str(quota["gpu_seconds"])
+    return response
+
+# -------------- Helper 2: A reused Idempotency-Key with a different request body
+def _idempotency_mismatch_response():
+    return error_response(
+        message=f"This {IDEMPOTENCY_HEADER} was already used with a different request.",
+        error_code="idempotency_key_mismatch",
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
 # -------------- VIEWS ---------------
 
 # ------- View 1: Dev session (Create and list)
@@ -85,6 +123,11 @@ class DevSessionDetailView(APIView):
             id=session_id,
             user=request.user
         )
+        # The user is about to run prompts in this session, load its models ahead of time
+        for config in session.model_configs.all():
+            if config.is_enabled:
+                warmup_scheduler.request(config.ai_model.model_name)
+
         serializer = DevSessionDetailOutSerializer(session)
         return success_response(data=serializer.data)
 
@@ -122,28 +165,94 @@ class DevRunStreamView(APIView):
             if initiator_role not in ["coder", "explainer"]:
                 return error_response(message="initiator_role must be coder or explainer")
 
+            try:
+                idempotency_key = get_idempotency_key(request)
+            except ValueError as e:
+                return error_response(message=str(e))
+
+            # A reused key must come with the same request, otherwise the replay would answer another prompt
+            request_hash = request_fingerprint({
+                "prompt": user_prompt,
+                "initiator_role": initiator_role,
+                "target": target,
+                "context_hashes": request.data.get("context_hashes") or [],
+                "context_code": request.data.get("context_code") or "",
+            })
+            previous_run = idempotency_key and dev_run_get_by_idempotency_key(session=session, idempotency_key=idempotency_key)
+            if previous_run and previous_run.request_hash != request_hash:
+                return _idempotency_mismatch_response()
+
+            # --- 1.1 Daily quota (checked before any generation) ---
+            # A retry of a run that already exists is still replayed once the quota is used up
+            quota = dev_usage_quota_remaining(user=request.user)
+            if quota["exhausted"] and not previous_run:
+                return _set_quota_headers(
+                    error_response(
+                        message="Daily usage quota reached. Try again tomorrow.",
+                        error_code="quota_exceeded",
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS
+                    ),
+                    quota
+                )
+
+            # --- 1.2 Code context ---
+            # Clients send the digests of chunks already uploaded, raw code is still accepted
+            hashes_serializer = ContextHashesInSerializer(data={"hashes": request.data.get("context_hashes") or []})
+            if not hashes_serializer.is_valid():
+                return error_response(message="Invalid context_hashes", errors=hashes_serializer.errors)
+
+            context_hashes = hashes_serializer.validated_data["hashes"]
+            raw_context_code = request.data.get("context_code") or ""
+            if raw_context_code:
+                context_hashes += context_code_store(user=request.user, context_code=raw_context_code)
+
+            try:
+                context_code = context_code_assemble(user=request.user, hashes=context_hashes)
+            except ValueError:
+                return error_response(
+                    message="Some context chunks are missing. Upload them first.",
+                    errors={"missing_hashes": context_chunks_missing(user=request.user, hashes=context_hashes)},
+                    status_code=status.HTTP_409_CONFLICT
+                )
+
             # --- 2. Database Record Creation ---
             #  create this first so there is a record of the attempt
-            run_instance = DevRun.objects.create(
+            run_instance, created = dev_run_create(
                 session=session,
                 user_prompt=user_prompt,
                 initiator_role=initiator_role,
+                context_hashes=context_hashes,
+                idempotency_key=idempotency_key,
+                request_hash=request_hash,
             )
 
+            # A retry of a request we already handled: replay it (or attach to it) instead of generating again
+            if not created:
+                if run_instance.request_hash != request_hash:
+                    # A concurrent request with another body created the run first
+                    return _idempotency_mismatch_response()
+                response = StreamingHttpResponse(generate_run_replay_stream(run_instance), content_type='application/json')
+                response['X-Accel-Buffering'] = 'no'
+                response[IDEMPOTENCY_REPLAYED_HEADER] = 'true'
+                return response
+
             # --- 3. Memory Retrieval ---
             # Fetches previous messages to give context to the AI
             history = get_session_history(run_instance)
 
             # --- 4. Logic Branching ---
             if target == 'explainer':
-                stream = generate_explainer_only_stream(session, user_prompt, history, run_instance)
+                stream = generate_explainer_only_stream(session, user_prompt, history, run_instance, context_code)
             else:
-                stream = generate_dev_mode_stream(session, user_prompt, history, run_instance)
+                stream = generate_dev_mode_stream(session, user_prompt, history, run_instance, context_code)
+
+            # Retries with the same Idempotency-Key can follow this stream, a disconnect cancels the run
+            stream = broadcast_run_stream(run_instance.id, stream)
 
             # --- 5. Return the Stream ---
             response = StreamingHttpResponse(stream, content_type='application/json')
             response['X-Accel-Buffering'] = 'no'
-            return response
+            return _set_quota_headers(response, quota)
 
         except Exception as e:
             # Log the technical error for your own debugging
@@ -157,3 +266,40 @@ class DevRunStreamView(APIView):
             # Return a clean error message to the website user
             return error_response(message="Failed to initialize the AI stream. Please try again.")
 
+
+# ----------- View 4: Upload chunks of code context (content-addressed)
+class ContextChunkUploadView(APIView):
+    """
+    Endpoint: POST /developer/context/chunks/
+    Stores code context chunks for the user and returns their digests.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ContextChunksUploadInSerializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(message="Validation failed", errors=serializer.errors)
+
+        hashes = context_chunks_store(user=request.user, chunks=serializer.validated_data["chunks"])
+        return success_response(
+            data={"hashes": hashes},
+            message="Context chunks stored successfully",
+            status_code=status.HTTP_201_CREATED
+        )
+
+
+# ----------- View 5: Tell the client which chunks it still has to upload
+class ContextChunkMissingView(APIView):
+    """
+    Endpoint: POST /developer/context/chunks/missing/
+    Returns the digests the server hasn't seen, so only those chunks are uploaded.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = ContextHashesInSerializer(data=request.data)
+        if not serializer.is_valid():
+            return error_response(message="Validation failed", errors=serializer.errors)
+
+        missing = context_chunks_missing(user=request.user, hashes=serializer.validated_data["hashes"])
+        return success_response(data={"missing": missing})
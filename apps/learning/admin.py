@@ -3,8 +3,20 @@ from django.contrib import admin
 from .models import (
     LearningProgress,
     ExerciseAttempt,
+    GradingMemoEntry,
+    ExerciseFeedback,
+    LearningEvent,
+    LearningActivityDaily,
+    Language,
+    Exercise,
 )
 
 # Register your models here.
 admin.site.register(LearningProgress)
 admin.site.register(ExerciseAttempt)
+admin.site.register(GradingMemoEntry)
+admin.site.register(ExerciseFeedback)
+admin.site.register(LearningEvent)
+admin.site.register(LearningActivityDaily)
+admin.site.register(Language)
+admin.site.register(Exercise)
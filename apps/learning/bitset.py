@@ -0,0 +1,54 @@
+"""
+   Completion bitsets (LearningProgress.completed_bits).
+
+   Every exercise has a stable "ordinal" in learning_content.json (unique in its language,
+   never reused), the exercise is completed when the bit at that position is set. Bit n is
+   bit n % 8 of byte n // 8 (least significant first), the layout of PostgreSQL's
+   get_bit/set_bit on bytea, so the same bits can be set in SQL and read here.
+"""
+
+
+# ----- Helper 1: Is the bit of an ordinal set
+def bits_test(bits, ordinal):
+    byte = ordinal >> 3
+    return byte < len(bits) and bool(bits[byte] & (1 << (ordinal & 7)))
+
+
+# ----- Helper 2: Copy of the bits with the bit of an ordinal set (grown as needed)
+def bits_set(bits, ordinal):
+    result = bytearray(bits)
+    byte = ordinal >> 3
+    if byte >= len(result):
+        result.extend(bytes(byte + 1 - len(result)))
+    result[byte] |= 1 << (ordinal & 7)
+    return bytes(result)
+
+
+# ----- Helper 3: Number of set bits (completed exercises)
+def bits_count(bits):
+    return int.from_bytes(bits, "little").bit_count()
+
+
+# ----- Helper 4: Bits with the given ordinals set
+def bits_from_ordinals(ordinals):
+    value = 0
+    for ordinal in ordinals:
+        value |= 1 << ordinal
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+# ----- Helper 5: The ordinals whose bit is set, in increasing order
+def bits_ordinals(bits):
+    value = int.from_bytes(bits, "little")
+    ordinals = []
+    while value:
+        lowest = value & -value
+        ordinals.append(lowest.bit_length() - 1)
+        value ^= lowest
+    return ordinals
+
+
+# ----- Helper 6: Bits set in either bitset
+def bits_union(bits, other):
+    value = int.from_bytes(bits, "little") | int.from_bytes(other, "little")
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
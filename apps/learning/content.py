@@ -0,0 +1,245 @@
+"""
+   In-process store of the learning content (Language/Exercise tables).
+
+   The catalog is split in two:
+     - the manifest: every language (slug, name, version, description) with the summary
+       of its exercises (id, ordinal, title, difficulty, requires). Small, kept resident.
+     - one shard per language: the language with its full exercises (prompt, starter and
+       expected code, tests, hints, fixtures). Loaded on demand (one query) and kept in a
+       bounded LRU, so memory and cold requests don't grow with the number of languages.
+
+   Both are built once per content version (see sync_learning_content). Before the first
+   sync the content comes from learning_content.json.
+"""
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from apps.learning.models import Language, Exercise
+
+# Source of the learning content (copied to the Language/Exercise tables by `manage.py sync_learning_content`)
+LEARNING_CONTENT_PATH = Path(__file__).resolve().parent / "learning_content.json"
+
+# Cache key of the content version (max Language.synced_at), set by the sync
+CONTENT_VERSION_KEY = "learning:content-version"
+
+# Fields of the manifest
+MANIFEST_LANGUAGE_FIELDS = ("slug", "name", "version", "description")
+MANIFEST_EXERCISE_FIELDS = ("id", "ordinal", "title", "difficulty", "requires")
+
+
+# ----- Helper 1: Read the content JSON file
+def load_content_file(path=LEARNING_CONTENT_PATH):
+    with Path(path).open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# ----- Helper 2: Index the exercises of a language by id (get_exercise uses it)
+def _indexed(language):
+    language["exercise_index"] = {ex.get("id"): ex for ex in language.get("exercises", [])}
+    return language
+
+
+# ----- Helper 3: Manifest entry of a full language
+def _manifest_language(language):
+    entry = {field: language[field] for field in MANIFEST_LANGUAGE_FIELDS if field in language}
+    entry["exercises"] = [
+        {field: ex[field] for field in MANIFEST_EXERCISE_FIELDS if field in ex}
+        for ex in language.get("exercises", [])
+    ]
+    return _indexed(entry)
+
+
+class ContentStore:
+    """
+    The manifest and an LRU of language shards for the current content version.
+    The dictionaries it returns are shared: callers must not modify them.
+    """
+
+    def __init__(self, max_shards=None):
+        self.max_shards = max_shards if max_shards is not None else settings.LEARNING_CONTENT_MAX_SHARDS
+
+        self._lock = threading.Lock()
+        self._version = None
+        self._manifest = None
+        self._content_hash = None
+        self._shards = OrderedDict()
+        # Parsed JSON file (only before the first sync)
+        self._file_content = None
+        self._shard_hits = 0
+        self._shard_loads = 0
+
+    def manifest(self):
+        version = self._current_version()
+        with self._lock:
+            if self._version == version and self._manifest is not None:
+                return self._manifest
+
+        if version.startswith("file:"):
+            manifest = {"languages": [_manifest_language(language) for language in self._file(version)["languages"]]}
+        else:
+            manifest = self._manifest_from_db()
+
+        with self._lock:
+            self._reset_if_stale(version)
+            self._manifest = manifest
+        return manifest
+
+    def language(self, language_slug):
+        """
+        The full language (all the exercise fields), None when it doesn't exist.
+        """
+        version = self._current_version()
+        with self._lock:
+            if self._version == version and language_slug in self._shards:
+                self._shards.move_to_end(language_slug)
+                self._shard_hits += 1
+                return self._shards[language_slug]
+
+        # Unknown languages are answered from the manifest, without a query
+        if not any(language.get("slug") == language_slug for language in self.manifest()["languages"]):
+            return None
+
+        if version.startswith("file:"):
+            shard = next(
+                (language for language in self._file(version)["languages"] if language.get("slug") == language_slug),
+                None,
+            )
+        else:
+            shard = self._shard_from_db(language_slug)
+        if shard is None:
+            return None
+
+        with self._lock:
+            self._reset_if_stale(version)
+            self._shard_loads += 1
+            if self.max_shards > 0:
+                self._shards[language_slug] = shard
+                while len(self._shards) > self.max_shards:
+                    self._shards.popitem(last=False)
+        return shard
+
+    def everything(self):
+        """
+        The full content of every language, for batch jobs (loads every shard).
+        """
+        languages = [self.language(language["slug"]) for language in self.manifest()["languages"]]
+        return {"languages": [language for language in languages if language is not None]}
+
+    def content_hash(self):
+        """
+        Hash of the whole content (built from the per-row hashes of the sync, no details are loaded).
+        """
+        version = self._current_version()
+        with self._lock:
+            if self._version == version and self._content_hash is not None:
+                return self._content_hash
+
+        if version.startswith("file:"):
+            digest = hashlib.sha256(LEARNING_CONTENT_PATH.read_bytes()).hexdigest()
+        else:
+            rows = [
+                list(Language.objects.order_by("slug").values_list("slug", "content_hash")),
+                list(Exercise.objects.order_by("language", "exercise_id").values_list("language", "exercise_id", "content_hash")),
+            ]
+            digest = hashlib.sha256(json.dumps(rows).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            self._reset_if_stale(version)
+            self._content_hash = digest
+        return digest
+
+    def version(self):
+        """
+        The current content version (what the derived structures, e.g. the search index, are keyed by).
+        """
+        return self._current_version()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._version,
+                "shards": list(self._shards),
+                "max_shards": self.max_shards,
+                "shard_hits": self._shard_hits,
+                "shard_loads": self._shard_loads,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._manifest = None
+            self._content_hash = None
+            self._file_content = None
+            self._shards.clear()
+
+    def _current_version(self):
+        # One cache read per call, the DB is only asked when the cached version expired
+        version = cache.get(CONTENT_VERSION_KEY)
+        if version is None:
+            synced_at = Language.objects.aggregate(synced_at=Max("synced_at"))["synced_at"]
+            version = synced_at.isoformat() if synced_at else ""
+            cache.set(CONTENT_VERSION_KEY, version, timeout=settings.LEARNING_CONTENT_CACHE_SECONDS)
+        return version or f"file:{LEARNING_CONTENT_PATH.stat().st_mtime_ns}"
+
+    def _reset_if_stale(self, version):
+        # Called with the lock held
+        if self._version != version:
+            self._version = version
+            self._manifest = None
+            self._content_hash = None
+            self._shards.clear()
+            self._file_content = None
+
+    def _file(self, version):
+        with self._lock:
+            self._reset_if_stale(version)
+            if self._file_content is None:
+                content = load_content_file()
+                for language in content.get("languages", []):
+                    _indexed(language)
+                self._file_content = content
+            return self._file_content
+
+    @staticmethod
+    def _manifest_from_db():
+        exercises = {}
+        rows = Exercise.objects.order_by("language", "position").values_list(
+            "language", "exercise_id", "ordinal", "title", "difficulty", "data__requires"
+        )
+        for language_slug, exercise_id, ordinal, title, difficulty, requires in rows:
+            summary = {"id": exercise_id, "ordinal": ordinal, "title": title, "difficulty": difficulty}
+            if requires is not None:
+                summary["requires"] = requires
+            exercises.setdefault(language_slug, []).append(summary)
+
+        languages = []
+        for slug, name, version, description in Language.objects.order_by("position").values_list(
+            "slug", "name", "data__version", "data__description"
+        ):
+            entry = {"slug": slug, "name": name, "exercises": exercises.get(slug, [])}
+            if version is not None:
+                entry["version"] = version
+            if description is not None:
+                entry["description"] = description
+            languages.append(_indexed(entry))
+        return {"languages": languages}
+
+    @staticmethod
+    def _shard_from_db(language_slug):
+        data = Language.objects.filter(slug=language_slug).values_list("data", flat=True).first()
+        if data is None:
+            return None
+        exercises = list(
+            Exercise.objects.filter(language=language_slug).order_by("position").values_list("data", flat=True)
+        )
+        return _indexed({**data, "exercises": exercises})
+
+
+content_store = ContentStore()
@@ -0,0 +1,118 @@
+"""
+   Prerequisite graph of the exercises of a language.
+
+   An exercise can declare the exercises that unlock it in learning_content.json:
+
+     "requires": ["py-01", "py-02"]
+
+   Without "requires" an exercise depends on the one before it (the linear path), and
+   "requires": [] makes it always unlocked. The graph is validated (unknown ids, cycles)
+   and compiled once per content version: a topological order and, per exercise, the
+   bitmask of its prerequisites' ordinals. An exercise is then unlocked when
+   `prerequisites & completed == prerequisites` against the user's completion bitset.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from apps.learning.content import content_store
+
+# Compiled curricula kept per content version (a few languages x a few versions)
+_MAX_CACHED = 32
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class CurriculumError(ValueError):
+    """
+    The exercises of a language don't form a valid prerequisite graph.
+    """
+
+
+class Curriculum:
+    """
+    Compiled prerequisite graph: `order` (exercise ids, topological, ties kept in
+    content order), `ordinals` ({id: ordinal}), `requires` ({id: [prerequisite ids]})
+    and `prerequisites` ({id: bitmask of the prerequisites' ordinals}).
+    """
+
+    def __init__(self, language):
+        exercises = language.get("exercises", [])
+        slug = language.get("slug")
+
+        self.ordinals = {}
+        used_ordinals = set()
+        for ex in exercises:
+            if ex.get("id") in self.ordinals:
+                raise CurriculumError(f"{slug}: duplicate exercise id {ex.get('id')!r}")
+            if ex["ordinal"] in used_ordinals:
+                raise CurriculumError(f"{slug}: duplicate ordinal {ex['ordinal']} ({ex.get('id')!r})")
+            self.ordinals[ex.get("id")] = ex["ordinal"]
+            used_ordinals.add(ex["ordinal"])
+
+        self.requires = requires = {}
+        for index, ex in enumerate(exercises):
+            default = [exercises[index - 1].get("id")] if index else []
+            requires[ex.get("id")] = list(ex.get("requires", default))
+            for required_id in requires[ex.get("id")]:
+                if required_id not in self.ordinals:
+                    raise CurriculumError(f"{slug}: {ex.get('id')!r} requires unknown exercise {required_id!r}")
+
+        self.order = self._topological_order(slug, requires)
+        self.prerequisites = {
+            ex_id: sum(1 << self.ordinals[required_id] for required_id in set(required_ids))
+            for ex_id, required_ids in requires.items()
+        }
+
+    @staticmethod
+    def _topological_order(slug, requires):
+        # Kahn's algorithm, the ready exercises are taken in content order
+        position = {ex_id: index for index, ex_id in enumerate(requires)}
+        dependents = {ex_id: [] for ex_id in requires}
+        missing = {}
+        for ex_id, required_ids in requires.items():
+            missing[ex_id] = len(set(required_ids))
+            for required_id in set(required_ids):
+                dependents[required_id].append(ex_id)
+
+        ready = deque(ex_id for ex_id in requires if not missing[ex_id])
+        order = []
+        while ready:
+            ex_id = ready.popleft()
+            order.append(ex_id)
+            for dependent in sorted(dependents[ex_id], key=position.get):
+                missing[dependent] -= 1
+                if not missing[dependent]:
+                    ready.append(dependent)
+
+        if len(order) != len(requires):
+            cycle = sorted((ex_id for ex_id in requires if missing[ex_id]), key=position.get)
+            raise CurriculumError(f"{slug}: prerequisite cycle between {', '.join(cycle)}")
+        return order
+
+    def is_locked(self, exercise_id, completed):
+        """
+        `completed` is the user's completion bitset as an int (int.from_bytes(bits, "little")).
+        """
+        prerequisites = self.prerequisites[exercise_id]
+        return prerequisites & completed != prerequisites
+
+
+# ----- The compiled curriculum of a language (built once per content version)
+def get_curriculum(language):
+    """
+    `language` is the manifest entry (or the shard) of the current content version, the
+    cache is keyed by that version and the slug, so a hit doesn't walk the exercises.
+    """
+    version = f"{content_store.version()}:{language['slug']}"
+    with _lock:
+        curriculum = _cache.get(version)
+        if curriculum is not None:
+            _cache.move_to_end(version)
+            return curriculum
+
+    curriculum = Curriculum(language)
+    with _lock:
+        _cache[version] = curriculum
+        while len(_cache) > _MAX_CACHED:
+            _cache.popitem(last=False)
+    return curriculum
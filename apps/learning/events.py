@@ -0,0 +1,178 @@
+"""
+   Handlers of the learning events outbox (apps.learning.models.LearningEvent).
+
+   The submit path only writes an event row, the consumer (`manage.py consume_learning_events`)
+   later calls every handler registered for the event type with all the pending events of
+   that type in a batch. Handlers run in the consumer's transaction together with marking
+   the events processed, so their updates are applied exactly once.
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.learning.models import ExerciseAttempt, ExerciseStats, ExerciseUserStats, LearningActivityDaily
+
+# Event types
+ATTEMPT_SUBMITTED = "attempt.submitted"
+
+_handlers = defaultdict(list)
+
+
+def event_handler(event_type):
+    """
+    Registers a function as a handler of an event type: handler(events: list[LearningEvent]).
+    """
+    def register(func):
+        _handlers[event_type].append(func)
+        return func
+    return register
+
+
+def handlers_for(event_type):
+    return _handlers.get(event_type, [])
+
+
+# ----- Helper 1: Add to the counters of a row (created on first use)
+def _counters_increment(model, lookup, counters):
+    increments = {field: F(field) + value for field, value in counters.items()}
+    if model.objects.filter(**lookup).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **counters)
+    except IntegrityError:
+        # Another consumer created the row first
+        model.objects.filter(**lookup).update(**increments)
+
+
+# ----- Handler 1: Attempts per user and day
+@event_handler(ATTEMPT_SUBMITTED)
+def activity_daily_update(events):
+    counters = defaultdict(lambda: {"attempts": 0, "passed_attempts": 0})
+    for event in events:
+        day = timezone.localdate(event.created_at)
+        row = counters[(event.user_id, day)]
+        row["attempts"] += 1
+        row["passed_attempts"] += event.payload.get("status") == "passed"
+
+    for (user_id, day), row in counters.items():
+        _counters_increment(LearningActivityDaily, {"user_id": user_id, "day": day}, row)
+
+
+# ----- Helper 2: Number of an attempt among the counted attempts of its user and exercise
+def _attempt_number(row, attempt_id):
+    return ExerciseAttempt.objects.filter(
+        user_id=row.user_id,
+        language_slug=row.language_slug,
+        exercise_id=row.exercise_id,
+        id__lte=attempt_id,
+        stats_counted=True,
+    ).count()
+
+
+# ----- Handler 2: Per exercise analytics (attempts, pass rate, unique users, attempts to pass)
+@event_handler(ATTEMPT_SUBMITTED)
+def exercise_stats_update(events):
+    keys = {
+        (event.user_id, event.payload["language_slug"], event.payload["exercise_id"]) for event in events
+    }
+
+    # Locked in a stable order, so concurrent consumers can't deadlock (and before the
+    # attempts, like the rebuild, which locks these tables first)
+    user_rows = {
+        (row.user_id, row.language_slug, row.exercise_id): row
+        for row in ExerciseUserStats.objects.select_for_update().filter(
+            user_id__in={key[0] for key in keys},
+            exercise_id__in={key[2] for key in keys},
+        ).order_by("pk")
+    }
+
+    # The attempts not counted yet, marked in this transaction: a replayed event, or an
+    # attempt counted by the last rebuild, is skipped whatever the order the events come in
+    new_attempt_ids = set(
+        ExerciseAttempt.objects.select_for_update()
+        .filter(id__in=[event.payload.get("attempt_id") for event in events], stats_counted=False)
+        .order_by("pk")
+        .values_list("id", flat=True)
+    )
+    ExerciseAttempt.objects.filter(id__in=new_attempt_ids).update(stats_counted=True)
+
+    # The new attempts of every (user, exercise) of the batch, in attempt order
+    attempts = defaultdict(list)
+    for event in events:
+        payload = event.payload
+        if payload.get("attempt_id") in new_attempt_ids:
+            key = (event.user_id, payload["language_slug"], payload["exercise_id"])
+            attempts[key].append((payload["attempt_id"], payload.get("status") == "passed"))
+
+    deltas = defaultdict(lambda: {"attempts": 0, "passed_attempts": 0, "unique_users": 0, "users_passed": 0, "attempts_to_pass": Counter()})
+    created, updated = [], []
+    for key, user_attempts in attempts.items():
+        row = user_rows.get(key)
+        if row is None:
+            row = ExerciseUserStats(user_id=key[0], language_slug=key[1], exercise_id=key[2])
+            created.append(row)
+            deltas[key[1:]]["unique_users"] += 1
+        else:
+            updated.append(row)
+
+        delta = deltas[key[1:]]
+        for attempt_id, passed in sorted(user_attempts):
+            in_order = attempt_id > row.last_attempt_id
+            row.attempts += 1
+            row.passed_attempts += passed
+            row.last_attempt_id = max(row.last_attempt_id, attempt_id)
+            delta["attempts"] += 1
+            delta["passed_attempts"] += passed
+
+            if row.first_passed_attempt_id is not None and attempt_id < row.first_passed_attempt_id:
+                # An attempt older than the first pass came late: the pass is one attempt further,
+                # or this attempt is the first pass
+                delta["attempts_to_pass"][str(row.attempts_to_pass)] -= 1
+                if passed:
+                    row.first_passed_attempt_id = attempt_id
+                    row.attempts_to_pass = _attempt_number(row, attempt_id)
+                else:
+                    row.attempts_to_pass += 1
+                delta["attempts_to_pass"][str(row.attempts_to_pass)] += 1
+            elif passed and row.first_passed_attempt_id is None:
+                row.first_passed_attempt_id = attempt_id
+                # Every counted attempt is older than an attempt after the newest one
+                row.attempts_to_pass = row.attempts if in_order else _attempt_number(row, attempt_id)
+                delta["users_passed"] += 1
+                delta["attempts_to_pass"][str(row.attempts_to_pass)] += 1
+
+    ExerciseUserStats.objects.bulk_create(created)
+    ExerciseUserStats.objects.bulk_update(
+        updated, ["attempts", "passed_attempts", "attempts_to_pass", "first_passed_attempt_id", "last_attempt_id"]
+    )
+
+    stats_rows = {
+        (row.language_slug, row.exercise_id): row
+        for row in ExerciseStats.objects.select_for_update().filter(
+            language_slug__in={key[0] for key in deltas},
+            exercise_id__in={key[1] for key in deltas},
+        ).order_by("pk")
+    }
+    created, updated = [], []
+    for (language_slug, exercise_id), delta in deltas.items():
+        row = stats_rows.get((language_slug, exercise_id))
+        if row is None:
+            row = ExerciseStats(language_slug=language_slug, exercise_id=exercise_id, attempts_to_pass={})
+            created.append(row)
+        else:
+            updated.append(row)
+        for field in ("attempts", "passed_attempts", "unique_users", "users_passed"):
+            setattr(row, field, getattr(row, field) + delta[field])
+        # Buckets that drop to 0 are removed (a late attempt moves a user to the next bucket)
+        histogram = Counter(row.attempts_to_pass)
+        histogram.update(delta["attempts_to_pass"])
+        row.attempts_to_pass = {bucket: users for bucket, users in histogram.items() if users > 0}
+        row.updated_at = timezone.now()
+
+    ExerciseStats.objects.bulk_create(created)
+    ExerciseStats.objects.bulk_update(
+        updated, ["attempts", "passed_attempts", "unique_users", "users_passed", "attempts_to_pass", "updated_at"]
+    )
@@ -0,0 +1,356 @@
+"""
+   Execution based grading of the exercises.
+
+   Python and JavaScript submissions run in a pool of long-lived sandbox worker processes
+   (see sandbox/), so the interpreter start-up is paid once per worker instead of once per
+   submission. Their output is compared to the test cases declared on each exercise in
+   learning_content.json:
+
+     "tests": [{"stdin": "", "stdout": "Hello, Python\n"}]
+
+   SQL submissions run against an in-memory SQLite copy of the exercise's fixture
+   (declared once per language under "fixtures", referenced with "fixture": "<name>"),
+   and their result set is compared to the one of the expected query.
+"""
+import sys
+import json
+import time
+import queue
+import select
+import sqlite3
+import hashlib
+import logging
+import threading
+import subprocess
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SANDBOX_DIR = Path(__file__).resolve().parent / "sandbox"
+
+# Languages graded by running the code (the others are compared as text)
+EXECUTABLE_LANGUAGES = ("python", "javascript")
+
+
+# ----- Helper 1: Command that starts a worker for a language
+def _worker_command(language_slug):
+    if language_slug == "python":
+        # -I: isolated mode (no user site-packages, no PYTHON* env vars, no cwd on sys.path)
+        return [sys.executable, "-I", str(SANDBOX_DIR / "python_worker.py")]
+
+    script = str(SANDBOX_DIR / "javascript_worker.js")
+    return [
+        settings.GRADER_NODE_BINARY,
+        f"--max-old-space-size={settings.GRADER_MEMORY_LIMIT_MB}",
+        # Node's permission model: no child processes, workers or fs writes, only the worker script can be read
+        "--experimental-permission",
+        f"--allow-fs-read={script}",
+        script,
+    ]
+
+
+# ----- Helper 2: Compare outputs without caring about trailing spaces or blank lines at the end
+def _normalize_output(text):
+    lines = [line.rstrip() for line in (text or "").replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip("\n")
+
+
+class SandboxWorkerDied(Exception):
+    """
+    The worker process exited or stopped answering (e.g. it ran out of memory).
+    """
+
+
+class SandboxWorker:
+    """
+    One sandbox process speaking the JSON lines protocol of sandbox/*_worker.
+    """
+
+    def __init__(self, language_slug):
+        self.language_slug = language_slug
+        self.process = subprocess.Popen(
+            _worker_command(language_slug),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=SANDBOX_DIR,
+            text=True,
+            bufsize=1,
+            # Only what the interpreters need, nothing from the Django environment
+            env={"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8"},
+        )
+
+    def run(self, job, timeout):
+        try:
+            self.process.stdin.write(json.dumps(job) + "\n")
+            self.process.stdin.flush()
+            ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+            line = self.process.stdout.readline() if ready else ""
+        except (OSError, ValueError) as e:
+            raise SandboxWorkerDied(str(e))
+
+        if not line:
+            raise SandboxWorkerDied("No answer from the sandbox worker")
+        return json.loads(line)
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+class SandboxPool:
+    """
+    Long-lived sandbox workers per language. A submission borrows an idle worker,
+    so at most `size` submissions per language run at the same time and the others wait.
+    Workers are started on first use, a worker that dies (or hangs) is replaced on the next one.
+    """
+
+    def __init__(self, size=None, languages=EXECUTABLE_LANGUAGES):
+        self.size = size or settings.GRADER_WORKERS_PER_LANGUAGE
+        self.time_limit = settings.GRADER_TIME_LIMIT_SECONDS
+        self.memory_mb = settings.GRADER_MEMORY_LIMIT_MB
+        self.output_limit = settings.GRADER_OUTPUT_LIMIT_BYTES
+        self.sandbox_uid = settings.GRADER_SANDBOX_UID
+        self._warned_not_isolated = False
+
+        # One slot per worker, None until the worker is started: a language whose interpreter
+        # is missing (e.g. no node binary) only fails its own submissions
+        self._idle = {}
+        for language_slug in languages:
+            self._idle[language_slug] = queue.Queue()
+            for _ in range(self.size):
+                self._idle[language_slug].put(None)
+
+    def execute(self, *, language_slug, code, tests):
+        """
+        Runs `code` once per test case and returns one result per test:
+        {"status": "ok" | "error" | "timeout", "stdout": str, "error": str}
+        """
+        job = {
+            "code": code,
+            "tests": tests,
+            "time_limit": self.time_limit,
+            "memory_mb": self.memory_mb,
+            "output_limit": self.output_limit,
+            "sandbox_uid": self.sandbox_uid,
+        }
+        # Every test has its own limit, plus some slack for the worker itself
+        timeout = len(tests or [None]) * (self.time_limit + 1) + 2
+
+        worker = self._idle[language_slug].get()
+        try:
+            if worker is None:
+                worker = SandboxWorker(language_slug)
+            results = worker.run(job, timeout)["results"]
+        except OSError as e:
+            # The interpreter couldn't be started, the slot stays empty and is retried next time
+            logger.error(f"Sandbox Worker Start Failed ({language_slug}): {e}")
+            results = [
+                {"status": "error", "stdout": "", "error": "The grader for this language is unavailable", "died": True}
+                for _ in tests or [None]
+            ]
+        except SandboxWorkerDied as e:
+            logger.warning(f"Sandbox Worker Died ({language_slug}): {e}")
+            worker.kill()
+            worker = None
+            results = [
+                {"status": "error", "stdout": "", "error": "The program used too many resources", "died": True}
+                for _ in tests or [None]
+            ]
+        finally:
+            self._idle[language_slug].put(worker)
+
+        if language_slug == "python" and not self._warned_not_isolated and any(
+            result.get("isolated") is False for result in results
+        ):
+            # Only the audit hook and the limits confine the submissions (see sandbox/python_worker.py)
+            logger.warning("Sandbox Not Isolated (python): run the server as root so the worker can chroot and drop privileges")
+            self._warned_not_isolated = True
+        return results
+
+    def close(self):
+        for idle in self._idle.values():
+            while not idle.empty():
+                worker = idle.get()
+                if worker is not None:
+                    worker.kill()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool():
+    """
+    The process-wide pool, its workers are started on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+
+# ----- Grade a submission against the test cases of an exercise
+def grade_submission(*, language_slug, exercise, user_code, pool=None):
+    """
+    Returns {"passed": bool, "message": str, "tests_passed": int, "tests_total": int, "cacheable": bool}.
+    A grade is not cacheable when a test hit a resource limit (that can depend on the load).
+    """
+    tests = exercise.get("tests") or []
+    results = (pool or get_sandbox_pool()).execute(language_slug=language_slug, code=user_code, tests=tests)
+
+    tests_passed = 0
+    first_failure = None
+    for index, (test, result) in enumerate(zip(tests, results), start=1):
+        if result["status"] == "ok" and _normalize_output(result["stdout"]) == _normalize_output(test.get("stdout")):
+            tests_passed += 1
+        elif first_failure is None:
+            first_failure = (index, test, result)
+
+    cacheable = all(result["status"] != "timeout" and not result.get("died") for result in results)
+    if first_failure is None:
+        return {
+            "passed": True,
+            "message": "Correct ✅",
+            "tests_passed": tests_passed,
+            "tests_total": len(tests),
+            "cacheable": cacheable,
+        }
+
+    index, test, result = first_failure
+    if result["status"] == "timeout":
+        reason = "time limit exceeded"
+    elif result["status"] == "error":
+        reason = result["error"] or "the program failed"
+    else:
+        reason = f"expected output {_normalize_output(test.get('stdout'))!r}, got {_normalize_output(result['stdout'])!r}"
+
+    return {
+        "passed": False,
+        "message": f"Incorrect ❌ Test {index}: {reason}",
+        "tests_passed": tests_passed,
+        "tests_total": len(tests),
+        "cacheable": cacheable,
+    }
+
+
+# ------------------------- SQL exercises -------------------------
+
+# What a submission may do to its copy of the fixture: read-only queries
+SQL_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),
+}
+
+# Fixture databases built once per process (fixture key -> template connection),
+# and the result sets of the expected queries ((fixture key, query) -> rows)
+_sql_templates = {}
+_sql_expected = {}
+_sql_lock = threading.Lock()
+
+
+# ----- Helper 3: The template database of a fixture, built on first use
+def _sql_template(language, fixture_name):
+    fixture = (language.get("fixtures") or {}).get(fixture_name)
+    if fixture is None:
+        raise ValueError(f"Unknown SQL fixture: {fixture_name}")
+
+    # Editing the schema or seed of a fixture gives it a new key (and a new template)
+    digest = hashlib.sha256(json.dumps(fixture, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    key = f"{language.get('slug')}:{fixture_name}:{digest}"
+
+    with _sql_lock:
+        template = _sql_templates.get(key)
+        if template is None:
+            template = sqlite3.connect(":memory:", check_same_thread=False)
+            for statement in fixture.get("schema", []) + fixture.get("seed", []):
+                template.execute(statement)
+            template.commit()
+            _sql_templates[key] = template
+    return key, template
+
+
+# ----- Helper 4: Copy a template into a fresh in-memory database (SQLite backup API)
+def _sql_clone(template):
+    database = sqlite3.connect(":memory:")
+    with _sql_lock:
+        template.backup(database)
+    return database
+
+
+# ----- Helper 5: Run one read-only query with a time and a memory limit
+def _sql_query(template, query, max_rows=None):
+    database = _sql_clone(template)
+    try:
+        # The progress handler can't stop a single function call (e.g. randomblob(10**9)),
+        # so the size of any string or blob (and of the query text) is capped
+        database.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, settings.GRADER_SQL_MAX_VALUE_BYTES)
+        database.setlimit(sqlite3.SQLITE_LIMIT_SQL_LENGTH, settings.GRADER_SQL_MAX_QUERY_BYTES)
+        deadline = time.monotonic() + settings.GRADER_TIME_LIMIT_SECONDS
+        # Called every 1000 SQLite VM instructions, a non-zero return aborts the query
+        database.set_progress_handler(lambda: int(time.monotonic() > deadline), 1000)
+        database.set_authorizer(
+            lambda action, *args: sqlite3.SQLITE_OK if action in SQL_ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+        )
+        cursor = database.execute(query)
+        return cursor.fetchmany(max_rows) if max_rows else cursor.fetchall()
+    finally:
+        database.close()
+
+
+# ----- Grade a SQL submission by comparing result sets
+def grade_sql_submission(*, language, exercise, user_code):
+    """
+    Returns {"passed": bool, "message": str, "tests_passed": int, "tests_total": int, "cacheable": bool}.
+    Rows are compared in order only when the exercise sets "ordered": true.
+    """
+    key, template = _sql_template(language, exercise.get("fixture"))
+
+    expected_query = exercise.get("expected_code", "")
+    expected = _sql_expected.get((key, expected_query))
+    if expected is None:
+        expected = _sql_query(template, expected_query)
+        _sql_expected[(key, expected_query)] = expected
+
+    try:
+        # One row more than expected is enough to tell the result is wrong
+        actual = _sql_query(template, user_code, max_rows=len(expected) + 1)
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        timed_out = "interrupted" in str(e)
+        if timed_out:
+            reason = "the query took too long"
+        elif "not authorized" in str(e):
+            reason = "only SELECT queries are allowed"
+        elif "too big" in str(e):
+            reason = "the query or one of its values is too large"
+        else:
+            reason = str(e)
+        return {
+            "passed": False,
+            "message": f"Incorrect ❌ {reason}",
+            "tests_passed": 0,
+            "tests_total": 1,
+            "cacheable": not timed_out,
+        }
+
+    ordered = exercise.get("ordered", False)
+    if ordered:
+        passed = actual == expected
+    else:
+        passed = sorted(actual, key=repr) == sorted(expected, key=repr)
+
+    if passed:
+        return {"passed": True, "message": "Correct ✅", "tests_passed": 1, "tests_total": 1, "cacheable": True}
+
+    if len(actual) != len(expected):
+        reason = f"expected {len(expected)} row(s), got {len(actual) if len(actual) <= len(expected) else 'more'}"
+    elif ordered and sorted(actual, key=repr) == sorted(expected, key=repr):
+        reason = "the rows are right but not in the expected order"
+    else:
+        reason = "the rows don't match the expected result"
+    return {"passed": False, "message": f"Incorrect ❌ {reason}", "tests_passed": 0, "tests_total": 1, "cacheable": True}
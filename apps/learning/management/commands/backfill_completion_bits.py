@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.learning.services import learning_progress_bits_backfill
+
+
+class Command(BaseCommand):
+    help = "Moves the legacy completed_exercise_ids lists of LearningProgress to the completion bitsets (run once after migrating)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch.")
+
+    def handle(self, *args, **options):
+        updated = learning_progress_bits_backfill(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled the completion bitset of {updated} progress row(s)."))
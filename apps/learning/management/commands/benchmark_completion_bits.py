@@ -0,0 +1,73 @@
+import json
+import time
+import random
+
+from django.core.management.base import BaseCommand
+
+from apps.learning.bitset import bits_count, bits_from_ordinals, bits_set, bits_test
+
+
+class Command(BaseCommand):
+    help = "Compares the completion bitset with the legacy JSON list of completed ids on a synthetic track."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--exercises", type=int, default=2000, help="Exercises in the track.")
+        parser.add_argument("--completed", type=float, default=0.5, help="Fraction of the exercises completed.")
+        parser.add_argument("--rounds", type=int, default=50, help="Times each operation is repeated.")
+
+    def handle(self, *args, **options):
+        total = options["exercises"]
+        rounds = options["rounds"]
+        exercises = [{"id": f"ex-{ordinal:05d}", "ordinal": ordinal} for ordinal in range(total)]
+
+        random.seed(42)
+        completed = random.sample(exercises, int(total * options["completed"]))
+        completed_ids = [ex["id"] for ex in completed]
+        completed_bits = bits_from_ordinals(ex["ordinal"] for ex in completed)
+        pending = next(ex for ex in exercises if not bits_test(completed_bits, ex["ordinal"]))
+
+        def _states_list():
+            # Completion and lock state of every exercise (LanguageExercisesListApi)
+            return [
+                (ex["id"] in completed_ids, index > 0 and exercises[index - 1]["id"] not in completed_ids)
+                for index, ex in enumerate(exercises)
+            ]
+
+        def _states_bits():
+            return [
+                (bits_test(completed_bits, ex["ordinal"]), index > 0 and not bits_test(completed_bits, exercises[index - 1]["ordinal"]))
+                for index, ex in enumerate(exercises)
+            ]
+
+        def _complete_list():
+            ids = json.loads(json.dumps(completed_ids))
+            if pending["id"] not in ids:
+                ids.append(pending["id"])
+            return round(100 * len(ids) / total, 2)
+
+        def _complete_bits():
+            return round(100 * bits_count(bits_set(completed_bits, pending["ordinal"])) / total, 2)
+
+        assert _states_list() == _states_bits() and _complete_list() == _complete_bits()
+
+        self.stdout.write(
+            f"{total} exercises, {len(completed)} completed: "
+            f"JSON list {len(json.dumps(completed_ids))} bytes, bitset {len(completed_bits)} bytes"
+        )
+        for name, list_func, bits_func in (
+            ("exercise states", _states_list, _states_bits),
+            ("complete + percentage", _complete_list, _complete_bits),
+        ):
+            list_seconds = self._time(list_func, rounds)
+            bits_seconds = self._time(bits_func, rounds)
+            self.stdout.write(
+                f"{name:<22} JSON list {list_seconds * 1e3:9.3f} ms   "
+                f"bitset {bits_seconds * 1e3:9.3f} ms   ({list_seconds / bits_seconds:.1f}x)"
+            )
+
+    @staticmethod
+    def _time(func, rounds):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        return (time.perf_counter() - started) / rounds
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.learning.grading import EXECUTABLE_LANGUAGES, SandboxPool, grade_submission
+from apps.learning.selectors import load_learning_content
+
+
+class Command(BaseCommand):
+    help = "Grades the reference solutions of the executable exercises through the sandbox pool and reports submissions per second."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--submissions", type=int, default=200, help="Total number of submissions to grade.")
+        parser.add_argument("--workers", type=int, default=None, help="Workers per language (default: GRADER_WORKERS_PER_LANGUAGE).")
+        parser.add_argument("--concurrency", type=int, default=8, help="Submissions sent at the same time.")
+        parser.add_argument("--language", choices=EXECUTABLE_LANGUAGES, default=None, help="Only one language.")
+
+    def handle(self, *args, **options):
+        languages = [options["language"]] if options["language"] else list(EXECUTABLE_LANGUAGES)
+        submissions = [
+            (language["slug"], exercise)
+            for language in load_learning_content().get("languages", [])
+            if language.get("slug") in languages
+            for exercise in language.get("exercises", [])
+            if exercise.get("tests")
+        ]
+        if not submissions:
+            self.stderr.write("No exercises with test cases found.")
+            return
+
+        started = time.perf_counter()
+        pool = SandboxPool(size=options["workers"], languages=languages)
+        self.stdout.write(f"Started {pool.size} worker(s) per language in {time.perf_counter() - started:.2f}s")
+
+        def _grade(index):
+            language_slug, exercise = submissions[index % len(submissions)]
+            return grade_submission(
+                language_slug=language_slug,
+                exercise=exercise,
+                user_code=exercise.get("expected_code", ""),
+                pool=pool,
+            )["passed"]
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                passed = sum(executor.map(_grade, range(options["submissions"])))
+            elapsed = time.perf_counter() - started
+        finally:
+            pool.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Graded {options['submissions']} submissions in {elapsed:.2f}s "
+            f"({options['submissions'] / elapsed:.1f} submissions/s), {passed} passed"
+        ))
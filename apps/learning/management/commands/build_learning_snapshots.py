@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.learning.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Renders the public learning catalog responses to gzip/brotli precompressed snapshot files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Rebuild even if the snapshots of this content exist.")
+        parser.add_argument("--keep", type=int, default=3, help="Snapshot sets (content versions) to keep.")
+
+    def handle(self, *args, **options):
+        result = build_snapshots(force=options["force"], keep=options["keep"])
+        if result["skipped"]:
+            self.stdout.write(f"Snapshots {result['key']} already built.")
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built snapshots {result['key']}: {result['responses']} responses, {result['bytes']} bytes, "
+            f"gzip {result['gzip_bytes']} bytes, brotli {result['brotli_bytes'] or '-'} bytes"
+        ))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.learning.selectors import learning_events_lag
+from apps.learning.services import learning_events_consume, learning_events_prune
+
+# How often processed events are pruned while the worker runs
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class Command(BaseCommand):
+    help = "Consumes the learning events outbox in batches (runs until stopped, or --once)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain the pending events and exit.")
+        parser.add_argument("--batch-size", type=int, default=None, help="Events per batch (default: LEARNING_EVENTS_BATCH_SIZE).")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to wait when there is nothing to consume.")
+
+    def handle(self, *args, **options):
+        last_prune = 0.0
+        while True:
+            started = time.perf_counter()
+            consumed = learning_events_consume(batch_size=options["batch_size"])
+            if consumed and options["verbosity"] >= 2:
+                self.stdout.write(f"Consumed {consumed} event(s) in {time.perf_counter() - started:.3f}s, lag: {learning_events_lag()}")
+
+            if consumed:
+                continue
+
+            if options["once"]:
+                self.stdout.write(self.style.SUCCESS(f"No pending events, lag: {learning_events_lag()}"))
+                return
+
+            if time.monotonic() - last_prune > PRUNE_INTERVAL_SECONDS:
+                pruned = learning_events_prune()
+                if pruned and options["verbosity"] >= 2:
+                    self.stdout.write(f"Pruned {pruned} processed event(s)")
+                last_prune = time.monotonic()
+
+            close_old_connections()
+            time.sleep(options["interval"])
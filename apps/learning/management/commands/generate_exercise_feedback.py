@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ai_models.models import AiModel
+from apps.learning.selectors import exercise_wrong_answer_clusters
+from apps.learning.services import exercise_feedback_generate
+
+
+class Command(BaseCommand):
+    help = "Generates feedback for the most frequent wrong answers of every exercise (run it offline, e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", required=True, help="model_name of the AiModel that writes the feedback.")
+        parser.add_argument("--top", type=int, default=5, help="Wrong answers per exercise.")
+        parser.add_argument("--min-count", type=int, default=2, help="Only answers seen at least this many times.")
+        parser.add_argument("--dry-run", action="store_true", help="Only list the clusters, don't call the model.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            for cluster in exercise_wrong_answer_clusters(top_n=options["top"], min_count=options["min_count"]):
+                self.stdout.write(
+                    f"{cluster['language_slug']}/{cluster['exercise_id']} "
+                    f"{cluster['code_hash'][:12]} x{cluster['attempts']}"
+                )
+            return
+
+        ai_model = AiModel.objects.filter(model_name=options["model"], is_active=True).first()
+        if not ai_model:
+            raise CommandError(f"No active AiModel named {options['model']!r}")
+
+        created = exercise_feedback_generate(ai_model=ai_model, top_n=options["top"], min_count=options["min_count"])
+        self.stdout.write(self.style.SUCCESS(f"Generated feedback for {created} wrong answer(s)."))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.learning.services import exercise_stats_rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the per exercise analytics from the attempts (run nightly, the events consumer keeps them up to date in between)."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = exercise_stats_rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the stats of {result['exercise_rows']} exercise(s) from {result['user_rows']} "
+            f"user/exercise row(s) in {time.perf_counter() - started:.2f}s"
+        ))
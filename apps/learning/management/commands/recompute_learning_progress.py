@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.learning.selectors import learning_progress_stale_languages
+from apps.learning.services import learning_progress_recompute
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the completion of the LearningProgress rows of the languages whose exercises "
+        "were added or removed since the last run (run after sync_learning_content)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--language", action="append", dest="languages", help="Only this language (repeatable).")
+        parser.add_argument("--force", action="store_true", help="Recompute the languages even if their exercises didn't change.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch (and per transaction).")
+
+    def handle(self, *args, **options):
+        languages = learning_progress_stale_languages(language_slugs=options["languages"], force=options["force"])
+        if not languages:
+            self.stdout.write(self.style.SUCCESS("The progress of every language is up to date."))
+            return
+
+        for language in languages:
+            started = time.perf_counter()
+            result = learning_progress_recompute(**language, batch_size=options["batch_size"])
+            seconds = time.perf_counter() - started
+            self.stdout.write(
+                f"{language['language_slug']}: {result['rows']} row(s) read, {result['updated']} updated "
+                f"in {seconds:.2f}s ({result['rows'] / seconds if seconds else 0:.0f} rows/s)"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the progress of {len(languages)} language(s)."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.learning.content import LEARNING_CONTENT_PATH, load_content_file
+from apps.learning.services import learning_content_sync
+from apps.learning.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Upserts the learning content JSON into the Language/Exercise tables (only the rows that changed)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", default=str(LEARNING_CONTENT_PATH), help="Content JSON file.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change.")
+        parser.add_argument("--no-snapshots", action="store_true", help="Don't build the catalog snapshots.")
+
+    def handle(self, *args, **options):
+        try:
+            content = load_content_file(options["file"])
+            result = learning_content_sync(content=content, dry_run=options["dry_run"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        prefix = "Would sync" if options["dry_run"] else "Synced"
+        for table, counts in result.items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{prefix} {table}: {counts['created']} created, {counts['updated']} updated, "
+                f"{counts['deleted']} deleted, {counts['unchanged']} unchanged"
+            ))
+
+        if not options["dry_run"] and not options["no_snapshots"]:
+            snapshots = build_snapshots()
+            if not snapshots["skipped"]:
+                self.stdout.write(self.style.SUCCESS(f"Built snapshots {snapshots['key']} ({snapshots['responses']} responses)"))
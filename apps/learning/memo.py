@@ -0,0 +1,145 @@
+"""
+   Memo of exercise grades, keyed by (content version, language, exercise id, hash of the graded code).
+
+   Learners send the same answers again and again. Those are answered from an in-memory
+   LRU (and, with GRADING_MEMO_PERSIST, from the grading_memo_entry table shared by all
+   processes) instead of being graded (executed) again. The content version is a hash of
+   the exercise, so editing an exercise invalidates its grades without any cleanup.
+"""
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.learning.models import GradingMemoEntry
+
+logger = logging.getLogger(__name__)
+
+# Part of every content version: bump it when the grading logic changes so old grades are not reused
+GRADER_VERSION = "2"
+
+
+# ----- Helper 1: Version of everything a grade of the exercise depends on
+def exercise_content_version(language, exercise):
+    payload = {"grader": GRADER_VERSION, "exercise": exercise}
+    fixture_name = exercise.get("fixture")
+    if fixture_name:
+        payload["fixture"] = (language.get("fixtures") or {}).get(fixture_name)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ----- Helper 2: Hash of a submission (also stored on ExerciseAttempt.code_hash)
+def code_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class GradingMemo:
+    """
+    Bounded LRU of grades ({"passed", "score", "message"}) with hit/miss counters.
+    """
+
+    def __init__(self, size=None, persist=None):
+        self.size = size if size is not None else settings.GRADING_MEMO_SIZE
+        self.persist = settings.GRADING_MEMO_PERSIST if persist is None else persist
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._persisted_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def key(*, language_slug, exercise_id, content_version, code_hash):
+        return (content_version, language_slug, exercise_id, code_hash)
+
+    def get(self, key):
+        with self._lock:
+            grade = self._entries.get(key)
+            if grade is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return grade
+
+        grade = self._get_persisted(key) if self.persist else None
+        with self._lock:
+            if grade is None:
+                self._misses += 1
+                return None
+            self._persisted_hits += 1
+        self._remember(key, grade)
+        return grade
+
+    def put(self, key, grade):
+        self._remember(key, grade)
+        if self.persist:
+            self._put_persisted(key, grade)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._persisted_hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.size,
+                "hits": self._hits,
+                "persisted_hits": self._persisted_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._persisted_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._persisted_hits = self._misses = 0
+
+    def _remember(self, key, grade):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = grade
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _get_persisted(self, key):
+        content_version, language_slug, exercise_id, submission_hash = key
+        row = (
+            GradingMemoEntry.objects
+            .filter(
+                language_slug=language_slug,
+                exercise_id=exercise_id,
+                content_version=content_version,
+                code_hash=submission_hash,
+            )
+            .values("passed", "score", "response_message")
+            .first()
+        )
+        if row is None:
+            return None
+        return {"passed": row["passed"], "score": row["score"], "message": row["response_message"]}
+
+    def _put_persisted(self, key, grade):
+        content_version, language_slug, exercise_id, submission_hash = key
+        try:
+            # Own savepoint, a failure here must not break the submit transaction
+            with transaction.atomic():
+                GradingMemoEntry.objects.bulk_create([
+                    GradingMemoEntry(
+                        language_slug=language_slug,
+                        exercise_id=exercise_id,
+                        content_version=content_version,
+                        code_hash=submission_hash,
+                        passed=grade["passed"],
+                        score=grade["score"],
+                        response_message=grade["message"],
+                    )
+                ], ignore_conflicts=True)
+        except Exception as e:
+            # The memo is an optimization, grading must not fail because of it
+            logger.error(f"Grading Memo Error: {e}")
+
+
+grading_memo = GradingMemo()
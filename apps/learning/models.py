@@ -2,6 +2,7 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from apps.ai_models.models import AiModel
 from core.models import TimeStampedModel
 
 
@@ -20,7 +21,10 @@ class LearningProgress(TimeStampedModel):
 
     # These will be retrived from the JSON file (Probably updated via signals)
     current_exercise_id = models.CharField(max_length=50, blank=True, default="")
+    # Legacy list of completed ids, no longer written: `manage.py backfill_completion_bits` moves it to completed_bits
     completed_exercise_ids = models.JSONField(default=list, blank=True)
+    # Completed exercises as a bitset indexed by the exercise "ordinal" (see apps/learning/bitset.py)
+    completed_bits = models.BinaryField(default=bytes, blank=True)
 
     completion_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
 
@@ -47,22 +51,255 @@ class ExerciseAttempt(models.Model):
     exercise_id = models.CharField(max_length=50)
     
     user_code = models.TextField()
+    # SHA-256 of the graded code, groups identical answers (see apps.learning.memo.code_hash)
+    code_hash = models.CharField(max_length=64, blank=True, default="")
 
     status = models.CharField(max_length=10, choices=AttemptStatus.choices)
     # This is the customized message
     response_message = models.TextField(blank=True, default="")
     score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
 
+    # Client-sent Idempotency-Key header, a retry with the same key returns this attempt
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    # Hash of the request body sent with the key (a reused key must come with the same body)
+    request_hash = models.CharField(max_length=64, blank=True, default="")
+    # Set when the attempt is added to the exercise analytics (ExerciseUserStats), so it is counted exactly once
+    stats_counted = models.BooleanField(default=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         db_table = "exercise_attempt"
         indexes = [
-            models.Index(fields=["user", "language_slug", "created_at"]),
+            # Attempts history (keyset pagination on created_at, id), with and without a language
+            models.Index(fields=["user", "language_slug", "created_at", "id"]),
+            models.Index(fields=["user", "created_at", "id"]),
             models.Index(fields=["exercise_id"]),
             models.Index(fields=["status"]),
+            models.Index(fields=["language_slug", "exercise_id", "code_hash"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["user", "idempotency_key"], name="uq_exercise_attempt_user_idempotency_key"),
         ]
         ordering = ["-created_at"]
 
     def __str__(self):
         return f"{self.user_id}:{self.exercise_id}:{self.status}"
+
+
+# ---------- Model 3: Persisted grades of already seen submissions (see apps.learning.memo)
+class GradingMemoEntry(models.Model):
+    language_slug = models.CharField(max_length=50)
+    exercise_id = models.CharField(max_length=50)
+
+    # Hash of the exercise content (and grader version) the grade was computed with
+    content_version = models.CharField(max_length=64)
+    # SHA-256 of the normalized submitted code
+    code_hash = models.CharField(max_length=64)
+
+    passed = models.BooleanField()
+    score = models.DecimalField(max_digits=5, decimal_places=2)
+    response_message = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "grading_memo_entry"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["language_slug", "exercise_id", "content_version", "code_hash"],
+                name="uq_grading_memo_entry_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.language_slug}:{self.exercise_id}:{self.code_hash[:12]}"
+
+
+# ---------- Model 4: Feedback generated offline for the most frequent wrong answers
+class ExerciseFeedback(TimeStampedModel):
+    language_slug = models.CharField(max_length=50)
+    exercise_id = models.CharField(max_length=50)
+
+    # Same keys as the grading memo: the exercise content and the normalized code
+    content_version = models.CharField(max_length=64)
+    code_hash = models.CharField(max_length=64)
+
+    feedback = models.TextField()
+    # How many failed attempts had this answer when the feedback was generated
+    attempt_count = models.PositiveIntegerField(default=0)
+    ai_model = models.ForeignKey(AiModel, on_delete=models.SET_NULL, null=True, blank=True, related_name="exercise_feedback")
+
+    class Meta:
+        db_table = "exercise_feedback"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["language_slug", "exercise_id", "content_version", "code_hash"],
+                name="uq_exercise_feedback_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.language_slug}:{self.exercise_id}:{self.code_hash[:12]}"
+
+
+# ---------- Model 5: Transactional outbox of learning events (consumed by apps.learning.events)
+class LearningEvent(models.Model):
+    """
+    Written in the same transaction as the change it describes (e.g. an attempt),
+    so side work can run later in a worker without ever being lost or done twice.
+    """
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="learning_events")
+    payload = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once every handler ran (or the event gave up after too many failures)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    failures = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        db_table = "learning_event"
+        indexes = [
+            # The consumer only ever scans the pending events, in id order
+            models.Index(fields=["id"], condition=models.Q(processed_at__isnull=True), name="learning_event_pending_idx"),
+            models.Index(fields=["processed_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.id}:{self.event_type}"
+
+
+# ---------- Model 6: Daily learning activity per user (derived from the outbox, e.g. for streaks)
+class LearningActivityDaily(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="learning_activity")
+    day = models.DateField()
+
+    attempts = models.PositiveIntegerField(default=0)
+    passed_attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = "learning_activity_daily"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "day"], name="uq_learning_activity_daily_user_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.day}"
+
+
+# ---------- Model 7: A language of the learning content (synced from learning_content.json)
+class Language(models.Model):
+    """
+    Written by `manage.py sync_learning_content`, read through the content cache
+    (apps.learning.content.ContentStore).
+    """
+    slug = models.CharField(max_length=50, primary_key=True)
+    name = models.CharField(max_length=100)
+    position = models.PositiveIntegerField(default=0)
+
+    # Everything of the language in the JSON but its exercises (version, description, fixtures...)
+    data = models.JSONField(default=dict)
+    # SHA-256 of `data`, the sync only writes the rows whose hash changed
+    content_hash = models.CharField(max_length=64)
+    # When the sync last changed any content (the content cache version)
+    synced_at = models.DateTimeField(default=timezone.now)
+    # Hash of the exercise ordinals the stored progress percentages were last computed with
+    # (`manage.py recompute_learning_progress` recomputes the languages where it changed)
+    progress_hash = models.CharField(max_length=64, blank=True, default="")
+
+    class Meta:
+        db_table = "learning_language"
+        ordering = ["position"]
+
+    def __str__(self):
+        return self.slug
+
+
+# ---------- Model 8: An exercise of the learning content (synced from learning_content.json)
+class Exercise(models.Model):
+    # Column "language_slug", the same as ExerciseAttempt/LearningProgress, so they join on it
+    language = models.ForeignKey(Language, on_delete=models.CASCADE, related_name="exercises", db_column="language_slug")
+    exercise_id = models.CharField(max_length=50)
+    ordinal = models.PositiveIntegerField()
+    position = models.PositiveIntegerField(default=0)
+
+    title = models.CharField(max_length=200)
+    difficulty = models.CharField(max_length=20, blank=True, default="")
+
+    # The exercise as it is in the JSON (prompt, starter/expected code, tests, hints...)
+    data = models.JSONField(default=dict)
+    content_hash = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = "learning_exercise"
+        ordering = ["language", "position"]
+        indexes = [
+            models.Index(fields=["language", "position"]),
+            models.Index(fields=["difficulty"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["language", "exercise_id"], name="uq_learning_exercise_language_id"),
+            models.UniqueConstraint(fields=["language", "ordinal"], name="uq_learning_exercise_language_ordinal"),
+        ]
+
+    def __str__(self):
+        return f"{self.language_id}:{self.exercise_id}"
+
+
+# ---------- Model 9: Attempts of a user on an exercise (feeds ExerciseStats, see apps.learning.events)
+class ExerciseUserStats(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="exercise_stats")
+    language_slug = models.CharField(max_length=50)
+    exercise_id = models.CharField(max_length=50)
+
+    attempts = models.PositiveIntegerField(default=0)
+    passed_attempts = models.PositiveIntegerField(default=0)
+    # Number of the attempt that first passed, in attempt order (None until the user passes)
+    attempts_to_pass = models.PositiveIntegerField(null=True, blank=True)
+    first_passed_attempt_id = models.BigIntegerField(null=True, blank=True)
+    # The newest attempt counted: an attempt after it is numbered without a query
+    last_attempt_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = "exercise_user_stats"
+        constraints = [
+            models.UniqueConstraint(fields=["user", "language_slug", "exercise_id"], name="uq_exercise_user_stats_user_exercise"),
+        ]
+        indexes = [
+            models.Index(fields=["language_slug", "exercise_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.language_slug}:{self.exercise_id}"
+
+
+# ---------- Model 10: Analytics of an exercise, kept up to date by the events consumer
+class ExerciseStats(models.Model):
+    """
+    Counters incremented from the outbox events (no GROUP BY over exercise_attempt on
+    read), rebuilt from the attempts by `manage.py rebuild_exercise_stats`.
+    """
+    language_slug = models.CharField(max_length=50)
+    exercise_id = models.CharField(max_length=50)
+
+    attempts = models.PositiveIntegerField(default=0)
+    passed_attempts = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    users_passed = models.PositiveIntegerField(default=0)
+    # Histogram of the attempts needed to pass: {"1": users, "2": users, ...} (gives the median)
+    attempts_to_pass = models.JSONField(default=dict, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "exercise_stats"
+        ordering = ["language_slug", "exercise_id"]
+        constraints = [
+            models.UniqueConstraint(fields=["language_slug", "exercise_id"], name="uq_exercise_stats_exercise"),
+        ]
+
+    def __str__(self):
+        return f"{self.language_slug}:{self.exercise_id}"
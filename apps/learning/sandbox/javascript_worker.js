@@ -0,0 +1,72 @@
+/*
+   Sandbox worker for JavaScript submissions, started (and reused) by apps.learning.grading.SandboxPool.
+
+   Same protocol as python_worker.py: one JSON job per line on stdin, one JSON result per line on stdout.
+
+   Node starts once. Every test runs in a fresh vm context that holds no host objects
+   (no require, process, timers or network), with string code generation disabled and
+   a timeout that also covers its promise callbacks. The heap is limited with --max-old-space-size by the pool.
+*/
+"use strict";
+
+const vm = require("vm");
+const readline = require("readline");
+
+// Defines console/input inside the context, so the submission never gets a host function
+const BOOTSTRAP = `
+  "use strict";
+  const __output = { text: "", limit: 0 };
+  const __format = (value) =>
+    typeof value === "string" ? value
+      : (value !== null && typeof value === "object") ? JSON.stringify(value)
+      : String(value);
+  const __write = (...args) => {
+    const line = args.map(__format).join(" ") + "\\n";
+    if (__output.text.length < __output.limit) {
+      __output.text += line.slice(0, __output.limit - __output.text.length);
+    }
+  };
+  globalThis.console = Object.freeze({ log: __write, info: __write, warn: __write, error: __write });
+`;
+
+function runTest(script, test, job) {
+  // Microtasks (promise callbacks) run inside the timeout, before the output is read
+  const context = vm.createContext({}, {
+    codeGeneration: { strings: false, wasm: false },
+    microtaskMode: "afterEvaluate",
+  });
+  vm.runInContext(BOOTSTRAP, context);
+  vm.runInContext(`__output.limit = ${Number(job.output_limit)}; globalThis.input = ${JSON.stringify(test.stdin || "")};`, context);
+
+  let status = "ok";
+  let error = "";
+  try {
+    script.runInContext(context, { timeout: Math.ceil(job.time_limit * 1000) });
+  } catch (e) {
+    if (e && e.code === "ERR_SCRIPT_EXECUTION_TIMEOUT") {
+      return { status: "timeout", stdout: "", error: "Time limit exceeded" };
+    }
+    status = "error";
+    error = vm.runInContext("(e) => String(e)", context)(e);
+  }
+  return { status, stdout: String(vm.runInContext("__output.text", context)), error: String(error) };
+}
+
+function handle(job) {
+  const tests = job.tests && job.tests.length ? job.tests : [{}];
+  let script;
+  try {
+    script = new vm.Script(job.code, { filename: "submission.js" });
+  } catch (e) {
+    return { results: tests.map(() => ({ status: "error", stdout: "", error: String(e) })) };
+  }
+  return { results: tests.map((test) => runTest(script, test, job)) };
+}
+
+const lines = readline.createInterface({ input: process.stdin });
+lines.on("line", (line) => {
+  if (!line.trim()) {
+    return;
+  }
+  process.stdout.write(JSON.stringify(handle(JSON.parse(line))) + "\n");
+});
@@ -0,0 +1,287 @@
+"""
+   Sandbox worker for Python submissions, started (and reused) by apps.learning.grading.SandboxPool.
+
+   Protocol: one JSON job per line on stdin, one JSON result per line on stdout.
+     job:    {"code": str, "tests": [{"stdin": str}], "time_limit": float, "memory_mb": int,
+              "output_limit": int, "sandbox_uid": int}
+     result: {"results": [{"status": "ok" | "error" | "timeout", "stdout": str, "error": str, "isolated": bool}]}
+
+   The interpreter starts once. Every test runs in a forked child that is confined before
+   the submission runs:
+     - when the worker runs as root: a new network namespace (Python 3.12+), a chroot into
+       an empty per-test directory (no project file is reachable) and an unprivileged uid,
+       so RLIMIT_NPROC=0 forbids any new process whatever API is used to create it;
+     - always: CPU, memory, file size, process and open files limits, /dev/null as the
+       standard streams, and an audit hook that only lets files of the test directory be
+       opened and blocks sockets, processes, native code, signals and frame introspection
+       (what could reach and disable the hook itself).
+   Without root only the audit hook and the limits apply ("isolated": false in the results),
+   which is not enough to run untrusted code in production.
+   The modules a submission may import are loaded before the chroot (SUBMISSION_MODULES).
+   This file only uses the standard library (it runs outside Django, with `python -I`).
+"""
+import io
+import os
+import sys
+import json
+import math
+import time
+import types
+import shutil
+import select
+import signal
+import resource
+import tempfile
+import traceback
+
+# Standard library modules available to the submissions (nothing can be imported after the chroot)
+SUBMISSION_MODULES = (
+    "abc", "array", "bisect", "collections", "copy", "dataclasses", "datetime", "decimal",
+    "enum", "fractions", "functools", "heapq", "itertools", "json", "math", "numbers",
+    "operator", "random", "re", "statistics", "string", "textwrap", "typing",
+)
+
+# Modules a submission may not import (or find already imported): processes, native code,
+# network, signal handlers (they receive frames), resource limits
+BLOCKED_MODULES = frozenset((
+    "_posixsubprocess", "subprocess", "_ctypes", "ctypes", "_socket", "socket", "ssl",
+    "multiprocessing", "_multiprocessing", "pty", "signal", "_signal", "resource",
+    "faulthandler", "gc", "_thread", "threading", "posix", "os", "shutil", "tempfile",
+))
+
+# Audit events a submission may not trigger
+BLOCKED_EVENTS = (
+    "socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn",
+    "os.fork", "os.forkpty", "os.kill", "os.killpg", "ctypes.", "os.remove", "os.rename",
+    "os.rmdir", "os.mkdir", "os.chmod", "os.chown", "os.chdir", "os.truncate", "os.symlink",
+    "os.link", "os.listdir", "os.scandir", "os.setxattr", "os.removexattr", "os.utime",
+    "shutil.", "glob.", "resource.setrlimit", "gc.get_", "sys._current_frames", "sys.settrace",
+    "sys.setprofile", "sys.addaudithook", "sys.unraisablehook", "cpython.",
+)
+# Attributes that give a frame (and from it the worker's globals)
+FRAME_ATTRIBUTES = frozenset(("tb_frame", "gi_frame", "cr_frame", "ag_frame", "f_back"))
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+# uid/gid of the submissions when the worker runs as root ("nobody")
+DEFAULT_SANDBOX_UID = 65534
+
+
+class _LimitedOutput(io.StringIO):
+    """
+    stdout of a submission, anything past the limit is dropped.
+    """
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, text):
+        room = self.limit - self.tell()
+        if room > 0:
+            super().write(text[:room])
+        return len(text)
+
+
+def _make_audit_hook(jail):
+    """
+    The hook only uses the values bound here and methods of built-in types: the submission
+    shares the builtins and the modules of the worker and could patch them, not these.
+    """
+    jail_parts = [part for part in jail.split("/") if part]
+    fspath = os.fspath
+    blocked_events, blocked_modules, frame_attributes = BLOCKED_EVENTS, BLOCKED_MODULES, FRAME_ATTRIBUTES
+    write_flags, write_modes = WRITE_FLAGS, frozenset("wax+")
+    str_type, bytes_type, int_type, is_instance, to_set = str, bytes, int, isinstance, set
+    permission_error, value_error = PermissionError, ValueError
+
+    def audit_hook(event, args):
+        if event.startswith(blocked_events):
+            raise permission_error(f"{event} is not allowed in exercises")
+        if event == "import" and args[0].partition(".")[0] in blocked_modules:
+            raise permission_error(f"import {args[0]} is not allowed in exercises")
+        if event in ("object.__getattr__", "object.__setattr__") and args[1] in frame_attributes:
+            raise permission_error("Frames are not available in exercises")
+        if event == "sys._getframe":
+            # ValueError: what the standard library expects when there is no frame (namedtuple, enum)
+            raise value_error("Frames are not available in exercises")
+        if event == "open":
+            path, mode, flags = args
+            if (mode and to_set(mode) & write_modes) or (flags or 0) & write_flags:
+                raise permission_error("Writing files is not allowed in exercises")
+            if is_instance(path, int_type):
+                if path > 2:
+                    raise permission_error("Opening file descriptors is not allowed in exercises")
+                return
+            if is_instance(path, bytes_type):
+                path = path.decode("utf-8", "surrogateescape")
+            if not is_instance(path, str_type):
+                path = fspath(path)
+            # Resolved lexically (the jail is empty and no link can be created in it)
+            parts = [] if path.startswith("/") else jail_parts[:]
+            for part in path.split("/"):
+                if part == "..":
+                    if parts:
+                        parts.pop()
+                elif part and part != ".":
+                    parts.append(part)
+            if parts[:len(jail_parts)] != jail_parts:
+                raise permission_error("Only the files of the exercise can be opened")
+
+    return audit_hook
+
+
+def _confine(job_dir, job):
+    """
+    Confines the child to `job_dir`. Returns (jail path as seen by the child, isolated).
+    """
+    # Nothing can talk to the worker protocol through the standard streams
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+    jail, isolated = job_dir, False
+    if os.geteuid() == 0:
+        if hasattr(os, "unshare"):
+            # No network interface but an unconfigured loopback
+            os.unshare(os.CLONE_NEWNET)
+        uid = job.get("sandbox_uid", DEFAULT_SANDBOX_UID)
+        os.chroot(job_dir)
+        os.chdir("/")
+        os.setgroups([])
+        os.setgid(uid)
+        os.setuid(uid)
+        jail, isolated = "/", True
+    else:
+        os.chdir(job_dir)
+
+    cpu_seconds = max(1, math.ceil(job["time_limit"]))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = job["memory_mb"] * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    # No files can be written (writes fail instead of killing the process)
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    # No new process or thread (enforced by the kernel for non-root uids)
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (16, 16))
+    return jail, isolated
+
+
+def _run_child(code, test, job, job_dir, token, write_fd):
+    output = _LimitedOutput(job["output_limit"])
+    status, error, isolated = "ok", "", False
+    # What is needed once the submission ran, bound here: the module globals are cleared
+    dumps, write, exit_process = json.dumps, os.write, os._exit
+    format_exception_only = traceback.format_exception_only
+    try:
+        jail, isolated = _confine(job_dir, job)
+        sys.stdin = io.StringIO(test.get("stdin") or "")
+        sys.stdout = sys.stderr = output
+
+        # The submission gets its own __main__ and can't find the blocked modules, nor reach
+        # them (or this function's token) through the globals of the worker's functions
+        main_module = types.ModuleType("__main__")
+        main_module.__builtins__ = __builtins__
+        sys.modules["__main__"] = main_module
+        for name in list(sys.modules):
+            if name.partition(".")[0] in BLOCKED_MODULES:
+                del sys.modules[name]
+        sys.addaudithook(_make_audit_hook(jail))
+        globals().clear()
+
+        exec(code, main_module.__dict__)
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            status, error = "error", f"SystemExit: {e.code}"
+    except MemoryError:
+        status, error = "error", "MemoryError: memory limit exceeded"
+    except BaseException as e:
+        # Without the chained exceptions: formatting them would walk their tracebacks' frames
+        e.__cause__ = e.__context__ = None
+        try:
+            status, error = "error", "".join(format_exception_only(type(e), e)).strip()
+        except BaseException:
+            status, error = "error", type(e).__name__
+
+    payload = dumps({
+        "status": status, "stdout": output.getvalue(), "error": error, "isolated": isolated, "token": token,
+    }).encode()
+    view = memoryview(payload)
+    while view:
+        view = view[write(write_fd, view):]
+    exit_process(0)
+
+
+def run_test(code, test, job):
+    # An empty directory per test (the chroot), and a token the submission can't read:
+    # anything it writes on the result pipe itself is not taken for the result
+    job_dir = os.path.realpath(tempfile.mkdtemp(prefix="sandbox-"))
+    token = os.urandom(16).hex()
+    try:
+        return _run_test(code, test, job, job_dir, token)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def _run_test(code, test, job, job_dir, token):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _run_child(code, test, job, job_dir, token, write_fd)
+    os.close(write_fd)
+
+    # Wall clock deadline on top of the CPU limit (sleeping or blocked code doesn't use CPU)
+    deadline = time.monotonic() + job["time_limit"] + 0.5
+    data, timed_out = b"", False
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+            timed_out = True
+            break
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        data += chunk
+
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    os.close(read_fd)
+    _, wait_status = os.waitpid(pid, 0)
+
+    if timed_out or (os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) in (signal.SIGXCPU, signal.SIGKILL)):
+        return {"status": "timeout", "stdout": "", "error": "Time limit exceeded"}
+    try:
+        result = json.loads(data)
+    except ValueError:
+        result = None
+    if not isinstance(result, dict) or result.pop("token", None) != token:
+        return {"status": "error", "stdout": "", "error": "The program crashed"}
+    return result
+
+
+def handle(job):
+    tests = job.get("tests") or [{}]
+    try:
+        code = compile(job["code"], "<submission>", "exec")
+    except (SyntaxError, ValueError) as e:
+        error = f"{type(e).__name__}: {getattr(e, 'msg', e)}"
+        if getattr(e, "lineno", None):
+            error += f" (line {e.lineno})"
+        return {"results": [{"status": "error", "stdout": "", "error": error} for _ in tests]}
+    return {"results": [run_test(code, test, job) for test in tests]}
+
+
+def main():
+    sys.dont_write_bytecode = True
+    for name in SUBMISSION_MODULES:
+        __import__(name)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        sys.stdout.write(json.dumps(handle(json.loads(line))) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
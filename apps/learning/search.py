@@ -0,0 +1,155 @@
+"""
+   Search and pagination of the exercises of a language.
+
+   An inverted index is built once per content version and language: every word of the
+   exercise titles and prompts (casefolded) maps to the bitmask of the exercises that
+   contain it, bit n being the n-th exercise in curriculum order. The words are kept
+   sorted, so a query term matches every word it is a prefix of ("loo" -> "loop",
+   "loops") with a binary search, and a query is a few ANDs of bitmasks:
+
+     "for loop" + difficulty=easy -> prefix("for") & prefix("loop") & difficulty["easy"]
+
+   The pages are read from the resulting bitmask, the cursor being the position of the
+   last exercise returned, so no query scans the exercises of the language.
+"""
+import re
+import base64
+import hashlib
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from apps.learning.content import content_store
+from apps.learning.curriculum import get_curriculum
+
+# Largest page a client can ask for (the default is settings.LEARNING_EXERCISES_PAGE_SIZE)
+MAX_PAGE_SIZE = 100
+
+# Indexes kept per content version (a few languages x a few versions)
+_MAX_CACHED = 32
+# Prefix bitmasks remembered per index (short prefixes match many words)
+_MAX_PREFIXES = 1024
+
+_WORD = re.compile(r"\w+")
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+class SearchError(ValueError):
+    """
+    The search or pagination parameters can't be used (e.g. a cursor of another content version).
+    """
+
+
+# ----- Helper 1: Words of a text, as they are indexed and searched
+def tokenize(text):
+    return _WORD.findall((text or "").casefold())
+
+
+class ExerciseIndex:
+    """
+    Inverted index of the exercises of a language: `order` (exercise ids in curriculum
+    order, the bit positions), the sorted words with their bitmasks, and a bitmask per
+    difficulty.
+    """
+
+    def __init__(self, language, order, key):
+        self.order = list(order)
+        self.key = key
+        self.all = (1 << len(self.order)) - 1
+
+        postings = {}
+        self.difficulties = {}
+        for position, exercise_id in enumerate(self.order):
+            ex = language["exercise_index"][exercise_id]
+            bit = 1 << position
+            for word in set(tokenize(ex.get("title")) + tokenize(ex.get("prompt"))):
+                postings[word] = postings.get(word, 0) | bit
+            difficulty = (ex.get("difficulty") or "").casefold()
+            self.difficulties[difficulty] = self.difficulties.get(difficulty, 0) | bit
+
+        self.words = sorted(postings)
+        self._postings = [postings[word] for word in self.words]
+        self._prefixes = {}
+
+    def search(self, *, q="", difficulty=None):
+        """
+        Bitmask of the exercises matching every term of `q` (as a word prefix) and the difficulty.
+        """
+        mask = self.all
+        if difficulty:
+            mask &= self.difficulties.get(difficulty.casefold(), 0)
+        for term in tokenize(q):
+            if not mask:
+                break
+            mask &= self._prefix(term)
+        return mask
+
+    def page(self, mask, *, cursor=None, limit):
+        """
+        The exercise ids of the page of `mask` after `cursor` (in curriculum order), and the
+        cursor of the next page (None on the last one).
+        """
+        after = self._decode_cursor(cursor) if cursor else -1
+        remaining = mask >> (after + 1) << (after + 1)
+
+        exercise_ids = []
+        position = after
+        while remaining and len(exercise_ids) < limit:
+            lowest = remaining & -remaining
+            position = lowest.bit_length() - 1
+            exercise_ids.append(self.order[position])
+            remaining ^= lowest
+
+        next_cursor = self._encode_cursor(position) if remaining else None
+        return exercise_ids, next_cursor
+
+    def _prefix(self, term):
+        mask = self._prefixes.get(term)
+        if mask is None:
+            start = bisect_left(self.words, term)
+            end = bisect_left(self.words, term[:-1] + chr(ord(term[-1]) + 1), start)
+            mask = 0
+            for posting in self._postings[start:end]:
+                mask |= posting
+            if len(self._prefixes) >= _MAX_PREFIXES:
+                self._prefixes.clear()
+            self._prefixes[term] = mask
+        return mask
+
+    def _encode_cursor(self, position):
+        return base64.urlsafe_b64encode(f"{self.key}:{position}".encode("ascii")).decode("ascii").rstrip("=")
+
+    def _decode_cursor(self, cursor):
+        try:
+            key, _, position = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii").partition(":")
+            position = int(position)
+        except ValueError:
+            raise SearchError("Invalid cursor.")
+        if key != self.key or not 0 <= position < len(self.order):
+            # The content changed since the cursor was given: the positions don't match anymore
+            raise SearchError("The cursor has expired, start again from the first page.")
+        return position
+
+
+# ----- The search index of a language (built once per content version)
+def get_exercise_index(language):
+    """
+    `language` is the manifest entry of the language, the prompts are read from its shard
+    when the index is built.
+    """
+    key = hashlib.sha256(f"{content_store.version()}:{language['slug']}".encode("utf-8")).hexdigest()[:16]
+    with _lock:
+        index = _cache.get(key)
+        if index is not None:
+            _cache.move_to_end(key)
+            return index
+
+    shard = content_store.language(language["slug"]) or language
+    index = ExerciseIndex(shard, get_curriculum(language).order, key)
+    with _lock:
+        _cache[key] = index
+        while len(_cache) > _MAX_CACHED:
+            _cache.popitem(last=False)
+    return index
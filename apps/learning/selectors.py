@@ -1,28 +1,68 @@
 # ----------- IMPORTS ----------
 from __future__ import annotations
 from typing import Optional
+import time
 import json
-from pathlib import Path
+import base64
+import hashlib
+from datetime import datetime
 
-from apps.learning.models import LearningProgress
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from apps.learning.bitset import bits_ordinals
+from apps.learning.content import content_store
+from apps.learning.models import (
+    LearningProgress,
+    ExerciseAttempt,
+    ExerciseFeedback,
+    ExerciseStats,
+    Language,
+    Exercise,
+    LearningEvent,
+)
 from apps.accounts.models import User 
+from core.idempotency import idempotency_cutoff
 
 # ------------ HELPERS (Private functions) --------------
-# ----- HELPER 1: Load the json content ------
+# ----- HELPER 1: Load the learning content ------
+def load_learning_manifest() -> dict:
+    """
+    Returns the catalog without the exercise details (resident in memory, see apps.learning.content):
+    {"languages": [{slug, name, version, description, "exercises": [{id, ordinal, title, difficulty, requires}]}]}
+    The returned dictionary is shared: callers must not modify it.
+
+    Returns:
+        dict: The manifest of all languages and exercises.
+    """
+    return content_store.manifest()
+
+
+def load_language(language_slug: str) -> dict | None:
+    """
+    Returns a language with the full details of its exercises (loaded on demand,
+    an LRU of languages is kept in memory). The returned dictionary is shared.
+
+    Args:
+        language_slug (str): The unique string identifier for the language (e.g., 'python').
+
+    Returns:
+        dict | None: The language dictionary if found, otherwise None.
+    """
+    return content_store.language(language_slug)
+
+
 def load_learning_content() -> dict:
     """
-    Reads and parses the learning content from a local JSON file.
+    Returns the full learning content (every language with its exercise details).
+    Only for batch jobs: requests should use load_learning_manifest/load_language.
 
     Returns:
         dict: The full dictionary containing all languages and exercises.
     """
-    # Resolve the path of the JSON file
-    base_dir = Path(__file__).resolve().parent
-    path = base_dir / "learning_content.json"
-
-    # Open and load the json content
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return content_store.everything()
     
 # ----- HELPER 2: Get the language object from the JSON  ------
 def get_language(content: dict, language_slug: str) -> dict | None:
@@ -53,11 +93,80 @@ def get_exercise(language: dict, exercise_id: str) -> dict | None:
     Returns:
         dict | None: The exercise detail dictionary if found, otherwise None.
     """
+    exercise_index = language.get("exercise_index")
+    if exercise_index is not None:
+        return exercise_index.get(exercise_id)
+
     for ex in language.get("exercises", []):
         if ex.get("id") == exercise_id:
             return ex
     return None
 
+# ----- HELPER 4: Map the exercise ids of a language to their ordinals ------
+def exercise_ordinals(language: dict) -> dict:
+    """
+    Maps each exercise id of the language to its stable "ordinal" (its bit in
+    LearningProgress.completed_bits).
+
+    Args:
+        language (dict): The dictionary representing a specific language.
+
+    Returns:
+        dict: {exercise_id: ordinal}
+    """
+    return {ex.get("id"): ex["ordinal"] for ex in language.get("exercises", [])}
+
+# ----- HELPER 5: Cache keys of the progress summary of a user ------
+def _progress_summary_version_key(user_id) -> str:
+    return f"learning:progress-summary-version:{user_id}"
+
+def _progress_summary_version(user_id) -> int:
+    """
+    Current version of the user's progress summary (bumped after every progress change).
+    A missing version (never set, or evicted) starts from the clock, so it can't
+    match a summary cached under an older version.
+    """
+    key = _progress_summary_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+# ----- HELPER 6: Cursor of the attempts list (created_at and id of the last attempt of a page) ------
+def _attempts_cursor_encode(attempt: ExerciseAttempt) -> str:
+    value = f"{attempt.created_at.isoformat()}|{attempt.pk}"
+    return base64.urlsafe_b64encode(value.encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _attempts_cursor_decode(cursor: str) -> tuple[datetime, int]:
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        created_at, _, pk = value.partition("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+
+
+# ----- HELPER 7: Median of a histogram {"value": count} ------
+def _histogram_median(histogram: dict) -> float | None:
+    total = sum(histogram.values())
+    if not total:
+        return None
+
+    # The two middle values (the same one when the total is odd)
+    middle = ((total - 1) // 2, total // 2)
+    values = []
+    seen = 0
+    for value, count in sorted((int(value), count) for value, count in histogram.items()):
+        seen += count
+        while len(values) < 2 and middle[len(values)] < seen:
+            values.append(value)
+        if len(values) == 2:
+            break
+    return sum(values) / 2
+
 
 # ----------- SELECTORS -----------------
 # ---- Selector 1: get the learning progress model for a particular language ------
@@ -78,3 +187,286 @@ def learning_progress_get(*, user: User, language_slug: str) -> Optional[Learnin
         .filter(user=user, language_slug=language_slug)
         .first()
     )
+
+
+# ---- Selector 2: get the attempt a retried submission refers to ------
+def exercise_attempt_get_by_idempotency_key(*, user: User, idempotency_key: str) -> Optional[ExerciseAttempt]:
+    """
+    Fetches the attempt submitted with the same Idempotency-Key, if the key hasn't expired.
+
+    Args:
+        user (User): The user who submitted the attempt.
+        idempotency_key (str): The key sent by the client.
+
+    Returns:
+        Optional[ExerciseAttempt]: The previous attempt if it exists, otherwise None.
+    """
+    return (
+        ExerciseAttempt.objects
+        .filter(user=user, idempotency_key=idempotency_key, created_at__gte=idempotency_cutoff())
+        .first()
+    )
+
+
+
+# ---- Selector 3: precomputed feedback for a wrong answer ------
+def exercise_feedback_get(
+    *,
+    language_slug: str,
+    exercise_id: str,
+    content_version: str,
+    code_hash: str,
+) -> Optional[str]:
+    """
+    Looks up the feedback generated offline for this exact (normalized) answer.
+    A single lookup on the unique key of exercise_feedback.
+
+    Args:
+        language_slug (str): The slug of the language for the exercise.
+        exercise_id (str): The exercise that was attempted.
+        content_version (str): Version of the exercise content (see apps.learning.memo).
+        code_hash (str): Hash of the graded code (see apps.learning.memo.code_hash).
+
+    Returns:
+        Optional[str]: The feedback text if some was generated, otherwise None.
+    """
+    return (
+        ExerciseFeedback.objects
+        .filter(
+            language_slug=language_slug,
+            exercise_id=exercise_id,
+            content_version=content_version,
+            code_hash=code_hash,
+        )
+        .values_list("feedback", flat=True)
+        .first()
+    )
+
+
+# ---- Selector 4: the most frequent wrong answers of every exercise ------
+def exercise_wrong_answer_clusters(*, top_n: int, min_count: int) -> list[dict]:
+    """
+    Groups the failed attempts by (language, exercise, code hash) and keeps the
+    `top_n` most frequent answers of each exercise.
+
+    Args:
+        top_n (int): Max number of answers per exercise.
+        min_count (int): Answers seen fewer times than this are ignored.
+
+    Returns:
+        list[dict]: language_slug, exercise_id, code_hash, attempts and latest_id
+        (the newest attempt with that answer), most frequent first per exercise.
+    """
+    rows = (
+        ExerciseAttempt.objects
+        .filter(status="failed")
+        .exclude(code_hash="")
+        .values("language_slug", "exercise_id", "code_hash")
+        .annotate(attempts=Count("id"), latest_id=Max("id"))
+        .filter(attempts__gte=min_count)
+        .order_by("language_slug", "exercise_id", "-attempts", "-latest_id")
+    )
+
+    clusters = []
+    per_exercise = {}
+    for row in rows:
+        key = (row["language_slug"], row["exercise_id"])
+        if per_exercise.get(key, 0) < top_n:
+            per_exercise[key] = per_exercise.get(key, 0) + 1
+            clusters.append(row)
+    return clusters
+
+
+
+# ---- Selector 5: how far behind the events consumer is ------
+def learning_events_lag() -> dict:
+    """
+    Reports the backlog of the learning events outbox.
+
+    Returns:
+        dict: pending (events not processed yet), oldest_pending_age_seconds
+        (0 when nothing is pending) and given_up (events that failed too often).
+    """
+    pending = LearningEvent.objects.filter(processed_at__isnull=True)
+    oldest = pending.order_by("id").values_list("created_at", flat=True).first()
+    return {
+        "pending": pending.count(),
+        "oldest_pending_age_seconds": round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0,
+        "given_up": LearningEvent.objects.filter(failures__gte=settings.LEARNING_EVENTS_MAX_FAILURES).count(),
+    }
+
+
+
+# ---- Selector 6: the progress of a user in every language (cached) ------
+def learning_progress_summary(*, user: User) -> dict:
+    """
+    Returns the user's progress per language, from the cache when it is up to date.
+    Cached under the user's summary version, which the services bump once a progress
+    change commits: a hit costs no query, and a read racing the commit can get the
+    previous summary until the bump lands. Only cached with a shared cache backend
+    (LEARNING_PROGRESS_CACHE_SECONDS is 0 otherwise), so the bump reaches every process.
+
+    Args:
+        user (User): The user whose progress is summarized (anonymous users have none).
+
+    Returns:
+        dict: {language_slug: {"completed_bits": bytes, "completed_exercise_ids": list,
+        "completion_percentage": Decimal, "current_exercise_id", "started_at", "last_activity_at"}}
+    """
+    if not user.is_authenticated:
+        return {}
+
+    key = None
+    if settings.LEARNING_PROGRESS_CACHE_SECONDS > 0:
+        key = f"learning:progress-summary:{user.pk}:{_progress_summary_version(user.pk)}"
+        summary = cache.get(key)
+        if summary is not None:
+            return summary
+
+    content = None
+    summary = {}
+    for progress in LearningProgress.objects.filter(user=user).values(
+        "language_slug",
+        "started_at",
+        "last_activity_at",
+        "current_exercise_id",
+        "completed_bits",
+        "completion_percentage",
+    ):
+        # bytea comes back as a memoryview
+        progress["completed_bits"] = bytes(progress["completed_bits"])
+
+        content = content or load_learning_manifest()
+        language = get_language(content, progress["language_slug"]) or {}
+        ids_by_ordinal = {ordinal: ex_id for ex_id, ordinal in exercise_ordinals(language).items()}
+        progress["completed_exercise_ids"] = [
+            ids_by_ordinal[ordinal] for ordinal in bits_ordinals(progress["completed_bits"]) if ordinal in ids_by_ordinal
+        ]
+        summary[progress["language_slug"]] = progress
+
+    if key:
+        cache.set(key, summary, timeout=settings.LEARNING_PROGRESS_CACHE_SECONDS)
+    return summary
+
+
+# ---- Selector 7: a page of the attempts of a user, newest first ------
+def exercise_attempt_list(
+    *,
+    user: User,
+    limit: int,
+    language_slug: Optional[str] = None,
+    exercise_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_code: bool = False,
+) -> tuple[list[ExerciseAttempt], Optional[str]]:
+    """
+    Keyset pagination on (created_at, id): the page starts right after the last attempt
+    of the previous one, read from the (user, [language_slug,] created_at, id) indexes,
+    so any page costs the same however deep it is (no OFFSET).
+
+    Args:
+        user (User): The user whose attempts are listed.
+        limit (int): Attempts per page.
+        language_slug (str): Only the attempts in this language.
+        exercise_id (str): Only the attempts of this exercise.
+        cursor (str): The cursor returned with the previous page.
+        include_code (bool): Load the submitted code (deferred otherwise, it is the heavy column).
+
+    Returns:
+        tuple: The attempts of the page, and the cursor of the next page (None on the last one).
+
+    Raises:
+        ValueError: If the cursor can't be read.
+    """
+    attempts = ExerciseAttempt.objects.filter(user=user)
+    if language_slug:
+        attempts = attempts.filter(language_slug=language_slug)
+    if exercise_id:
+        attempts = attempts.filter(exercise_id=exercise_id)
+    if not include_code:
+        attempts = attempts.defer("user_code")
+
+    if cursor:
+        created_at, pk = _attempts_cursor_decode(cursor)
+        # (created_at, id) < (cursor): the first condition bounds the index range scan
+        attempts = attempts.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lt=pk)
+        )
+
+    # One extra row tells whether there is a next page
+    page = list(attempts.order_by("-created_at", "-id")[:limit + 1])
+    if len(page) > limit:
+        page = page[:limit]
+        return page, _attempts_cursor_encode(page[-1])
+    return page, None
+
+
+# ---- Selector 8: analytics of the exercises (from the ExerciseStats aggregates) ------
+def exercise_stats_list(*, language_slug: Optional[str] = None) -> list[dict]:
+    """
+    Reads the counters maintained by the events consumer, one row per exercise, so the
+    cost doesn't depend on the number of attempts.
+
+    Args:
+        language_slug (str): Only the exercises of this language.
+
+    Returns:
+        list[dict]: language_slug, exercise_id, attempts, passed_attempts, pass_rate (%),
+        unique_users, users_passed and median_attempts_to_pass, per exercise.
+    """
+    stats = ExerciseStats.objects.all()
+    if language_slug:
+        stats = stats.filter(language_slug=language_slug)
+
+    return [
+        {
+            "language_slug": row.language_slug,
+            "exercise_id": row.exercise_id,
+            "attempts": row.attempts,
+            "passed_attempts": row.passed_attempts,
+            "pass_rate": round(100 * row.passed_attempts / row.attempts, 2) if row.attempts else None,
+            "unique_users": row.unique_users,
+            "users_passed": row.users_passed,
+            "median_attempts_to_pass": _histogram_median(row.attempts_to_pass),
+            "updated_at": row.updated_at,
+        }
+        for row in stats
+    ]
+
+
+# ---- Selector 9: the languages whose progress percentages are stale ------
+def learning_progress_stale_languages(*, language_slugs: Optional[list[str]] = None, force: bool = False) -> list[dict]:
+    """
+    Compares the exercises of every language (ids and ordinals, in the Language/Exercise
+    tables) with the ones its progress rows were last recomputed with.
+
+    Args:
+        language_slugs (list[str]): Only check these languages.
+        force (bool): Return every language, changed or not.
+
+    Returns:
+        list[dict]: language_slug, exercise_ids, ordinals and progress_hash (the hash of
+        the current exercises) of the languages to recompute.
+    """
+    languages = Language.objects.order_by("position")
+    exercises = Exercise.objects.order_by("language", "ordinal")
+    if language_slugs:
+        languages = languages.filter(slug__in=language_slugs)
+        exercises = exercises.filter(language__in=language_slugs)
+
+    exercises_by_language = {}
+    for language_slug, exercise_id, ordinal in exercises.values_list("language", "exercise_id", "ordinal"):
+        exercises_by_language.setdefault(language_slug, []).append((exercise_id, ordinal))
+
+    stale = []
+    for slug, stored_hash in languages.values_list("slug", "progress_hash"):
+        language_exercises = exercises_by_language.get(slug, [])
+        progress_hash = hashlib.sha256(json.dumps(language_exercises).encode("utf-8")).hexdigest()
+        if force or progress_hash != stored_hash:
+            stale.append({
+                "language_slug": slug,
+                "exercise_ids": [exercise_id for exercise_id, _ in language_exercises],
+                "ordinals": [ordinal for _, ordinal in language_exercises],
+                "progress_hash": progress_hash,
+            })
+    return stale
@@ -1,6 +1,8 @@
 # ------------- IMPORTS --------------
 from rest_framework import serializers
 
+from apps.learning.search import MAX_PAGE_SIZE
+
 # ------ Serializer 1: List the languages ---------
 class LanguageOutSerializer(serializers.Serializer):
     """
@@ -24,6 +26,7 @@ class ExerciseListOutSerializer(serializers.Serializer):
     id = serializers.CharField()
     title = serializers.CharField()
     difficulty = serializers.CharField()
+    requires = serializers.ListField(child=serializers.CharField(), default=list)
     is_completed = serializers.BooleanField(default=False)
     is_locked = serializers.BooleanField(default=False)
 
@@ -82,3 +85,62 @@ class LearningProgressOutSerializer(serializers.Serializer):
     completed_exercise_ids = serializers.ListField(child=serializers.CharField())
     completion_percentage = serializers.DecimalField(max_digits=5, decimal_places=2)
     
+
+# ------ Serializer 7: Search and pagination of the exercises list -----------
+class ExerciseListQueryInSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the exercises list.
+
+    Args:
+        q (str): Words searched in the titles and prompts (each one as a word prefix).
+        difficulty (str): Only the exercises of this difficulty.
+        cursor (str): The `next_cursor` of the previous page.
+        limit (int): Exercises per page.
+    """
+    q = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    difficulty = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    cursor = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=MAX_PAGE_SIZE)
+
+# ------ Serializer 8: Exercise attempts history (without the submitted code) -----------
+class ExerciseAttemptListOutSerializer(serializers.Serializer):
+    """
+    An attempt in the history list, the submitted code is only returned on request.
+    """
+    id = serializers.IntegerField()
+    language_slug = serializers.CharField()
+    exercise_id = serializers.CharField()
+    status = serializers.CharField()
+    response_message = serializers.CharField(allow_blank=True)
+    score = serializers.DecimalField(max_digits=5, decimal_places=2, allow_null=True)
+    created_at = serializers.DateTimeField()
+
+# ------ Serializer 9: Filters and pagination of the attempts history -----------
+class ExerciseAttemptListQueryInSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the attempts history.
+
+    Args:
+        language (str): Only the attempts in this language.
+        exercise (str): Only the attempts of this exercise.
+        cursor (str): The `next_cursor` of the previous page.
+        limit (int): Attempts per page.
+        include_code (bool): Return the submitted code of every attempt.
+    """
+    language = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    exercise = serializers.CharField(required=False, allow_blank=True, max_length=50)
+    cursor = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=MAX_PAGE_SIZE)
+    include_code = serializers.BooleanField(required=False, default=False)
+
+# ------ Serializer 10: Analytics of an exercise -----------
+class ExerciseStatsOutSerializer(serializers.Serializer):
+    language_slug = serializers.CharField()
+    exercise_id = serializers.CharField()
+    attempts = serializers.IntegerField()
+    passed_attempts = serializers.IntegerField()
+    pass_rate = serializers.FloatField(allow_null=True)
+    unique_users = serializers.IntegerField()
+    users_passed = serializers.IntegerField()
+    median_attempts_to_pass = serializers.FloatField(allow_null=True)
+    updated_at = serializers.DateTimeField()
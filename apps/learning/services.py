@@ -1,21 +1,183 @@
 # --------------- IMPORTS --------------
 from __future__ import annotations
 
+import json
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import timedelta
 from decimal import Decimal
 
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
 from django.utils import timezone
 
+from apps.learning.content import CONTENT_VERSION_KEY
+from core.idempotency import idempotency_cutoff
+from apps.learning.curriculum import Curriculum
+from apps.learning.bitset import bits_from_ordinals, bits_union
+from apps.learning.events import ATTEMPT_SUBMITTED, handlers_for
+from apps.learning.grading import EXECUTABLE_LANGUAGES, grade_sql_submission, grade_submission
+from apps.ai_models.models import AiModel
+from apps.ai_models.services import generate_exercise_feedback
+from apps.learning.memo import code_hash, exercise_content_version, grading_memo
 from apps.learning.models import (
     LearningProgress, 
-    ExerciseAttempt
+    ExerciseAttempt,
+    ExerciseFeedback,
+    LearningEvent,
+    Language,
+    Exercise,
 )
 
 from apps.learning.selectors import (
-    load_learning_content,
-    get_language,
+    load_learning_manifest,
+    load_language,
     get_exercise,
-    learning_progress_get,
+    exercise_attempt_get_by_idempotency_key,
+    exercise_feedback_get,
+    exercise_wrong_answer_clusters,
+    exercise_ordinals,
+    _progress_summary_version_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# The stored bitset, grown with zero bytes so it has a bit for the exercise's ordinal
+_PROGRESS_BITS_PADDED = (
+    "(lp.completed_bits || decode(repeat('00', GREATEST(%(ordinal)s / 8 + 1 - length(lp.completed_bits), 0)), 'hex'))"
+)
+
+# Creates the progress row or updates it in place: the bit of the exercise is set in the
+# bitset (bytea) and the percentage is recomputed from its popcount, in one statement
+_PROGRESS_UPSERT_SQL = f"""
+    INSERT INTO learning_progress AS lp (
+        user_id, language_slug, started_at, last_activity_at, current_exercise_id,
+        completed_exercise_ids, completed_bits, completion_percentage, created_at, updated_at
+    )
+    VALUES (
+        %(user_id)s, %(language_slug)s, %(now)s, %(now)s, %(exercise_id)s, '[]'::jsonb,
+        CASE
+            WHEN %(passed)s THEN set_bit(decode(repeat('00', %(ordinal)s / 8 + 1), 'hex'), %(ordinal)s, 1)
+            ELSE ''::bytea
+        END,
+        CASE WHEN %(passed)s THEN LEAST(ROUND(100.0 / %(total)s, 2), 100) ELSE 0 END,
+        %(now)s, %(now)s
+    )
+    ON CONFLICT (user_id, language_slug) DO UPDATE SET
+        last_activity_at = EXCLUDED.last_activity_at,
+        current_exercise_id = EXCLUDED.current_exercise_id,
+        completed_bits = CASE
+            WHEN %(passed)s THEN set_bit({_PROGRESS_BITS_PADDED}, %(ordinal)s, 1)
+            ELSE lp.completed_bits
+        END,
+        completion_percentage = LEAST(ROUND(100.0 * bit_count(CASE
+            WHEN %(passed)s THEN set_bit({_PROGRESS_BITS_PADDED}, %(ordinal)s, 1)
+            ELSE lp.completed_bits
+        END) / %(total)s, 2), 100),
+        updated_at = EXCLUDED.updated_at
+    RETURNING id, completed_bits, completion_percentage
+"""
+
+# The stored bitset ANDed byte by byte with the bits of the exercises that still exist
+_PROGRESS_BITS_MASKED = """COALESCE((
+        SELECT string_agg(
+            set_byte('\\x00'::bytea, 0, get_byte(lp.completed_bits, i) & get_byte(%(mask)s::bytea, i)),
+            ''::bytea ORDER BY i
+        )
+        FROM generate_series(0, LEAST(length(lp.completed_bits), length(%(mask)s::bytea)) - 1) AS i
+    ), ''::bytea)"""
+
+# The legacy ids list, keeping the ids that still exist (in order)
+_PROGRESS_IDS_KEPT = """COALESCE((
+        SELECT jsonb_agg(completed.exercise_id ORDER BY completed.n)
+        FROM jsonb_array_elements_text(lp.completed_exercise_ids) WITH ORDINALITY AS completed(exercise_id, n)
+        WHERE completed.exercise_id = ANY(%(exercise_ids)s)
+    ), '[]'::jsonb)"""
+
+# Recomputes a batch of the progress rows of a language (keyset on id): the bitset and the ids
+# list are pruned and the percentage is recomputed from the bitset's popcount. Everything is
+# computed from lp in SET/WHERE, so when a submission updates a row meanwhile the UPDATE
+# re-reads the committed row and keeps its new bit. Only the rows that change are written.
+# Returns the rows of the batch, its last id and the users whose progress changed.
+_PROGRESS_RECOMPUTE_SQL = f"""
+    WITH batch AS (
+        SELECT id FROM learning_progress
+        WHERE language_slug = %(language_slug)s AND id > %(last_id)s
+        ORDER BY id
+        LIMIT %(batch_size)s
+    ),
+    updated AS (
+        UPDATE learning_progress AS lp SET
+            completed_bits = {_PROGRESS_BITS_MASKED},
+            completed_exercise_ids = {_PROGRESS_IDS_KEPT},
+            completion_percentage = LEAST(ROUND(100.0 * bit_count({_PROGRESS_BITS_MASKED}) / %(total)s, 2), 100),
+            updated_at = %(now)s
+        FROM batch
+        WHERE lp.id = batch.id AND (
+            lp.completed_bits <> {_PROGRESS_BITS_MASKED}
+            OR lp.completed_exercise_ids <> {_PROGRESS_IDS_KEPT}
+            OR lp.completion_percentage <> LEAST(ROUND(100.0 * bit_count({_PROGRESS_BITS_MASKED}) / %(total)s, 2), 100)
+        )
+        RETURNING lp.user_id
+    )
+    SELECT (SELECT COUNT(*) FROM batch), (SELECT MAX(id) FROM batch), ARRAY(SELECT user_id FROM updated)
+"""
+
+# Rebuilds the exercise analytics from the attempts: every attempt is marked counted (their
+# pending events are then skipped by the consumer), then the per user counters (the number of
+# the first passed attempt from a window over each user's attempts), the per exercise totals
+# and the histogram of attempts to pass. Both tables are locked against the events consumer.
+_EXERCISE_STATS_REBUILD_SQL = (
+    "LOCK TABLE exercise_user_stats, exercise_stats IN EXCLUSIVE MODE",
+    "UPDATE exercise_attempt SET stats_counted = TRUE WHERE NOT stats_counted",
+    "DELETE FROM exercise_user_stats",
+    """
+    INSERT INTO exercise_user_stats (
+        user_id, language_slug, exercise_id, attempts, passed_attempts, attempts_to_pass,
+        first_passed_attempt_id, last_attempt_id
+    )
+    SELECT
+        user_id, language_slug, exercise_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status = 'passed'),
+        MIN(attempt_number) FILTER (WHERE status = 'passed'),
+        MIN(id) FILTER (WHERE status = 'passed'),
+        MAX(id)
+    FROM (
+        SELECT
+            id, user_id, language_slug, exercise_id, status,
+            ROW_NUMBER() OVER (PARTITION BY user_id, language_slug, exercise_id ORDER BY id) AS attempt_number
+        FROM exercise_attempt
+        -- Attempts committed after the UPDATE above are counted by their events
+        WHERE stats_counted
+    ) AS numbered
+    GROUP BY user_id, language_slug, exercise_id
+    """,
+    "DELETE FROM exercise_stats",
+    """
+    INSERT INTO exercise_stats (
+        language_slug, exercise_id, attempts, passed_attempts, unique_users, users_passed, attempts_to_pass, updated_at
+    )
+    SELECT
+        s.language_slug, s.exercise_id,
+        SUM(s.attempts), SUM(s.passed_attempts), COUNT(*), COUNT(s.attempts_to_pass),
+        COALESCE(h.histogram, '{}'::jsonb),
+        NOW()
+    FROM exercise_user_stats AS s
+    LEFT JOIN (
+        SELECT language_slug, exercise_id, jsonb_object_agg(attempts_to_pass::text, users) AS histogram
+        FROM (
+            SELECT language_slug, exercise_id, attempts_to_pass, COUNT(*) AS users
+            FROM exercise_user_stats
+            WHERE attempts_to_pass IS NOT NULL
+            GROUP BY language_slug, exercise_id, attempts_to_pass
+        ) AS buckets
+        GROUP BY language_slug, exercise_id
+    ) AS h ON h.language_slug = s.language_slug AND h.exercise_id = s.exercise_id
+    GROUP BY s.language_slug, s.exercise_id, h.histogram
+    """,
 )
 
 # ------------------- HELPERS (Private functions) -------------------
@@ -54,6 +216,83 @@ def _normalize_sql(user_code: str) -> str:
     text = " ".join(text.split())  # collapse whitespace
     return text.upper()
 
+# --------- Helper 3: Grade a submission
+def _grade_exercise(*, language_slug: str, language: dict, exercise: dict, user_code: str) -> dict:
+    """
+    Grades the code: Python/JavaScript exercises with test cases are run in the sandbox pool,
+    SQL exercises with a fixture are run against a copy of the fixture database, the others
+    are compared to the expected solution.
+
+    Returns:
+        dict: {"passed": bool, "score": Decimal, "message": str, "cacheable": bool}
+    """
+    grade = None
+    if language_slug in EXECUTABLE_LANGUAGES and exercise.get("tests"):
+        # Run the code in the sandbox and compare its output with the exercise's test cases
+        grade = grade_submission(language_slug=language_slug, exercise=exercise, user_code=user_code)
+    elif language_slug == "sql" and exercise.get("fixture"):
+        # Run the query on a copy of the exercise's fixture database and compare the rows
+        grade = grade_sql_submission(language=language, exercise=exercise, user_code=user_code)
+
+    if grade:
+        score = Decimal(grade["tests_passed"]) / Decimal(grade["tests_total"]) * Decimal("100.00")
+        return {
+            "passed": grade["passed"],
+            "score": score.quantize(Decimal("0.01")),
+            "message": grade["message"],
+            "cacheable": grade["cacheable"],
+        }
+
+    # Normalize and compare user input against the expected solution
+    expected_code = exercise.get("expected_code", "")
+    if language_slug == "sql":
+        expected = _normalize_sql(expected_code)
+        actual = _normalize_sql(user_code)
+    else:
+        expected = _normalize_code(expected_code)
+        actual = _normalize_code(user_code)
+
+    # If both outputs match calculate results: score and feedback message
+    passed = actual == expected
+    return {
+        "passed": passed,
+        "score": Decimal("100.00") if passed else Decimal("0.00"),
+        "message": "Correct ✅" if passed else "Incorrect ❌",
+        "cacheable": True,
+    }
+
+# --------- Helper 4: Hash the attempts stored before ExerciseAttempt.code_hash existed
+def _attempt_code_hashes_backfill(batch_size: int = 1000) -> None:
+    while True:
+        attempts = list(ExerciseAttempt.objects.filter(code_hash="").only("id", "language_slug", "user_code")[:batch_size])
+        if not attempts:
+            return
+        for attempt in attempts:
+            attempt.code_hash = code_hash(_graded_code(attempt.language_slug, attempt.user_code))
+        ExerciseAttempt.objects.bulk_update(attempts, ["code_hash"])
+
+# --------- Helper 5: Run the handlers of an event type (in a savepoint, so a failure can be retried)
+def _events_handle(event_type: str, events: list) -> None:
+    with transaction.atomic():
+        for handler in handlers_for(event_type):
+            handler(events)
+
+# --------- Helper 6: Hash of a content row (its data and position), to skip the unchanged rows on sync
+def _content_hash(position: int, data: dict) -> str:
+    payload = json.dumps({"position": position, "data": data}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# --------- Helper 7: The code a grade depends on (hashed for the grading memo and the feedback)
+def _graded_code(language_slug: str, user_code: str) -> str:
+    """
+    Executed submissions (sandbox or SQLite) are keyed on the exact code: a leading indent or
+    trailing spaces inside a string literal change their result. The text-compared ones are
+    normalized, the same way they are graded.
+    """
+    if language_slug in EXECUTABLE_LANGUAGES or language_slug == "sql":
+        return user_code
+    return _normalize_code(user_code)
+
 # ---------------------- SERVICES ----------------------
 
 # ------- Service 1: Initialize a new learning progress record
@@ -73,7 +312,7 @@ def learning_progress_start(*, user, language_slug: str) -> LearningProgress:
         LearningProgress: The newly created progress instance.
     """
     now = timezone.now()
-    return LearningProgress.objects.create(
+    progress = LearningProgress.objects.create(
         user=user,
         language_slug=language_slug,
         started_at=now,
@@ -82,31 +321,43 @@ def learning_progress_start(*, user, language_slug: str) -> LearningProgress:
         completed_exercise_ids=[],
         completion_percentage=Decimal("0.00"),
     )
+    learning_progress_summary_invalidate(user_id=user.id)
+    return progress
 
 
 # ----- Service 2: Process an exercise submission and update progress
-@transaction.atomic
 def exercise_submit_attempt(
     *,
     user,
     language_slug: str,
     exercise_id: str,
     user_code: str,
+    idempotency_key: str | None = None,
+    request_hash: str = "",
 ) -> ExerciseAttempt:
     """
     Handles the end-to-end logic for submitting an exercise attempt.
 
     This service performs four key actions:
-    1. Validates the submission against the expected solution (JSON-based).
-    2. Calculates the score and status (passed/failed).
-    3. Updates or creates the user's LearningProgress, recalculating completion percentage.
-    4. Persists the ExerciseAttempt record for history tracking.
+    1. Grades the submission (see _grade_exercise), answers already seen for the same
+       exercise content are taken from the grading memo.
+    2. Calculates the score and status (passed/failed), a frequent wrong answer gets
+       the feedback that was generated for it offline.
+    3. Updates or creates the user's LearningProgress in one upsert (completion bitset and percentage).
+    4. Persists the ExerciseAttempt record for history tracking, with an outbox event
+       (in the same transaction) for the side work done by the events consumer.
+
+    Grading runs before the transaction is opened: a slow submission (up to the sandbox
+    time limit per test) never holds a database transaction or its row locks.
 
     Args:
         user (User): The user submitting the code.
         language_slug (str): The slug of the language for the exercise.
         exercise_id (str): The unique ID of the exercise being attempted.
         user_code (str): The code provided by the user.
+        idempotency_key (str | None): The Idempotency-Key header. A retry with the same
+            key returns the stored attempt instead of grading and inserting again.
+        request_hash (str): Hash of the request body, stored with the key.
 
     Raises:
         ValueError: If the language, exercise, or expected solution is missing.
@@ -114,10 +365,14 @@ def exercise_submit_attempt(
     Returns:
         ExerciseAttempt: The record of the attempt with calculated status and feedback.
     """
-    
-    # Fetch the data (expected_code field specifically) from JSON file
-    content = load_learning_content()
-    language = get_language(content, language_slug)
+    # ---- Retried submission: return the stored attempt ----
+    if idempotency_key:
+        existing = exercise_attempt_get_by_idempotency_key(user=user, idempotency_key=idempotency_key)
+        if existing:
+            return existing
+
+    # Fetch the data (expected_code field specifically) from the language's content shard
+    language = load_language(language_slug)
     if not language:
         raise ValueError("Language not found")
 
@@ -125,62 +380,552 @@ def exercise_submit_attempt(
     if not exercise:
         raise ValueError("Exercise not found")
 
-    expected_code = exercise.get("expected_code", "")
-    if not expected_code:
+    if not exercise.get("expected_code") and not exercise.get("tests"):
         raise ValueError("Exercise has no expected_code")
 
-    # Normalize and compare user input against the expected solution
-    if language_slug == "sql":
-        expected = _normalize_sql(expected_code)
-        actual = _normalize_sql(user_code)
-    else:
-        expected = _normalize_code(expected_code)
-        actual = _normalize_code(user_code)
-
-    # If both outputs match calculate results: status, score, and feedback message
-    passed = actual == expected
+    # ---- Grade (answers seen before come from the memo) ----
+    content_version = exercise_content_version(language, exercise)
+    submission_hash = code_hash(_graded_code(language_slug, user_code))
+    memo_key = grading_memo.key(
+        language_slug=language_slug,
+        exercise_id=exercise_id,
+        content_version=content_version,
+        code_hash=submission_hash,
+    )
+    grade = grading_memo.get(memo_key)
+    if grade is None:
+        grade = _grade_exercise(language_slug=language_slug, language=language, exercise=exercise, user_code=user_code)
+        if grade.pop("cacheable"):
+            grading_memo.put(memo_key, grade)
+
+    passed = grade["passed"]
+    score_value = grade["score"]
+    message_value = grade["message"]
     status_value = "passed" if passed else "failed"
-    score_value = Decimal("100.00") if passed else Decimal("0.00")
-    message_value = "Correct ✅" if passed else "Incorrect ❌"
 
-    # ---- Read progress via selector ----
-    progress = learning_progress_get(user=user, language_slug=language_slug)
-    if not progress: # If not found, create a new one
-        progress = learning_progress_start(user=user, language_slug=language_slug)
+    # ---- A frequent wrong answer may have feedback generated offline ----
+    if not passed:
+        feedback = exercise_feedback_get(
+            language_slug=language_slug,
+            exercise_id=exercise_id,
+            content_version=content_version,
+            code_hash=submission_hash,
+        )
+        if feedback:
+            message_value = f"{message_value}\n\n💡 {feedback}"
+
+    # ---- Write the result: progress, attempt and outbox event in one short transaction ----
+    with transaction.atomic():
+        if idempotency_key:
+            # The key may still be stored on an expired attempt, free it so it can be reused
+            ExerciseAttempt.objects.filter(
+                user=user, idempotency_key=idempotency_key, created_at__lt=idempotency_cutoff()
+            ).update(idempotency_key=None)
+
+        # ---- Update progress state (In LearningProgress Model) in one statement ----
+        learning_progress_record_attempt(
+            user=user,
+            language_slug=language_slug,
+            exercise_id=exercise_id,
+            ordinal=exercise["ordinal"],
+            passed=passed,
+            total_exercises=len(language.get("exercises", [])) or 1,
+        )
+
+        # ---- Create attempt record (ExerciseAttempt Model) ----
+        try:
+            with transaction.atomic():
+                attempt = ExerciseAttempt.objects.create(
+                    user=user,
+                    language_slug=language_slug,
+                    exercise_id=exercise_id,
+                    user_code=user_code,
+                    code_hash=submission_hash,
+                    status=status_value,
+                    response_message=message_value,
+                    score=score_value,
+                    idempotency_key=idempotency_key,
+                    request_hash=request_hash,
+                )
+        except IntegrityError:
+            # A concurrent retry with the same key inserted it first (the progress update above is idempotent)
+            return ExerciseAttempt.objects.get(user=user, idempotency_key=idempotency_key)
+
+        # ---- Side work (analytics, streaks...) happens later in the events consumer ----
+        learning_event_publish(
+            event_type=ATTEMPT_SUBMITTED,
+            user=user,
+            payload={
+                "attempt_id": attempt.id,
+                "language_slug": language_slug,
+                "exercise_id": exercise_id,
+                "status": status_value,
+                "score": str(score_value),
+            },
+        )
 
-    now = timezone.now()
+    return attempt
 
-    # ---- Update progress state (In LearningProgress Model)  ----
-    progress.last_activity_at = now
-    progress.current_exercise_id = exercise_id
-
-    if passed:
-        completed = list(progress.completed_exercise_ids or [])
-        if exercise_id not in completed:
-            completed.append(exercise_id)
-        progress.completed_exercise_ids = completed
-
-    total_exercises = len(language.get("exercises", [])) or 1
-    completed_count = len(progress.completed_exercise_ids or [])
-
-    progress.completion_percentage = (Decimal(completed_count) / Decimal(total_exercises)) * Decimal("100.00")
-    progress.save(update_fields=[
-        "last_activity_at",
-        "current_exercise_id",
-        "completed_exercise_ids",
-        "completion_percentage",
-        "updated_at",
-    ])
-
-    # ---- Create attempt record (ExerciseAttempt Model) ----
-    attempt = ExerciseAttempt.objects.create(
-        user=user,
-        language_slug=language_slug,
-        exercise_id=exercise_id,
-        user_code=user_code,
-        status=status_value,
-        response_message=message_value,
-        score=score_value,
+
+# ----- Service 3: Record an attempt on the learning progress (atomic upsert)
+def learning_progress_record_attempt(
+    *,
+    user,
+    language_slug: str,
+    exercise_id: str,
+    ordinal: int,
+    passed: bool,
+    total_exercises: int,
+) -> dict:
+    """
+    Creates or updates the user's LearningProgress for the language in a single
+    INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement.
+
+    The bit of the completed exercise is set in SQL and the completion percentage is
+    recomputed there too (popcount of the bitset), so concurrent submissions of the
+    same user can't overwrite each other's completions.
+
+    Args:
+        user (User): The user submitting the code.
+        language_slug (str): The slug of the language for the exercise.
+        exercise_id (str): The exercise that was attempted.
+        ordinal (int): The exercise's ordinal (its bit in completed_bits).
+        passed (bool): Whether the attempt passed.
+        total_exercises (int): Number of exercises in the language.
+
+    Returns:
+        dict: The updated row: id, completed_bits and completion_percentage.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(_PROGRESS_UPSERT_SQL, {
+            "user_id": user.id,
+            "language_slug": language_slug,
+            "exercise_id": exercise_id,
+            "ordinal": ordinal,
+            "passed": passed,
+            "total": total_exercises,
+            "now": timezone.now(),
+        })
+        progress_id, completed_bits, completion_percentage = cursor.fetchone()
+    learning_progress_summary_invalidate(user_id=user.id)
+
+    return {
+        "id": progress_id,
+        "completed_bits": bytes(completed_bits),
+        "completion_percentage": completion_percentage,
+    }
+
+
+# ----- Service 4: Generate feedback for the most frequent wrong answers (offline batch)
+def exercise_feedback_generate(
+    *,
+    ai_model: AiModel,
+    top_n: int = 5,
+    min_count: int = 2,
+    llm=None,
+) -> int:
+    """
+    Clusters the failed attempts by code hash and, for the `top_n` most
+    frequent wrong answers of each exercise, asks the model for feedback once and
+    stores it in exercise_feedback. Answers that already have feedback for the
+    current exercise content are skipped, so the job can run repeatedly.
+
+    Args:
+        ai_model (AiModel): The model that writes the feedback.
+        top_n (int): Max number of answers per exercise.
+        min_count (int): Only answers seen at least this many times get feedback.
+        llm: A LangChain chat model to use instead of Ollama (e.g. a fake model).
+
+    Returns:
+        int: The number of feedback entries created.
+    """
+    _attempt_code_hashes_backfill()
+
+    created = 0
+    for cluster in exercise_wrong_answer_clusters(top_n=top_n, min_count=min_count):
+        language = load_language(cluster["language_slug"])
+        exercise = get_exercise(language, cluster["exercise_id"]) if language else None
+        if not exercise:
+            continue # The exercise was removed
+
+        content_version = exercise_content_version(language, exercise)
+        lookup = {
+            "language_slug": cluster["language_slug"],
+            "exercise_id": cluster["exercise_id"],
+            "content_version": content_version,
+            "code_hash": cluster["code_hash"],
+        }
+        if ExerciseFeedback.objects.filter(**lookup).exists():
+            continue
+
+        sample = ExerciseAttempt.objects.only("user_code", "response_message").get(id=cluster["latest_id"])
+        feedback = generate_exercise_feedback(
+            ai_model.model_name,
+            exercise,
+            sample.user_code,
+            sample.response_message,
+            llm=llm,
+        )
+        if not feedback:
+            continue
+
+        _, was_created = ExerciseFeedback.objects.update_or_create(
+            **lookup,
+            defaults={"feedback": feedback, "attempt_count": cluster["attempts"], "ai_model": ai_model},
+        )
+        created += was_created
+    return created
+
+
+# ----- Service 5: Write an event to the learning outbox
+def learning_event_publish(*, event_type: str, user, payload: dict) -> LearningEvent:
+    """
+    Stores an event for the events consumer. Call it inside the transaction of the
+    change the event describes, so both are committed (or rolled back) together.
+
+    Args:
+        event_type (str): One of the event types of apps.learning.events.
+        user (User): The user the event is about.
+        payload (dict): JSON data the handlers need.
+
+    Returns:
+        LearningEvent: The stored event.
+    """
+    return LearningEvent.objects.create(event_type=event_type, user=user, payload=payload)
+
+
+# ----- Service 6: Consume a batch of pending events
+def learning_events_consume(*, batch_size: int | None = None) -> int:
+    """
+    Locks a batch of pending events (SKIP LOCKED, so several consumers can run),
+    runs the handlers of each event type on them and marks them processed, all in
+    one transaction. If a handler fails the events of that type are retried one by
+    one so only the failing ones are held back. An event that keeps failing is given
+    up after LEARNING_EVENTS_MAX_FAILURES (it stays in the table with its last error).
+
+    Args:
+        batch_size (int | None): Max events per batch (default LEARNING_EVENTS_BATCH_SIZE).
+
+    Returns:
+        int: The number of events taken from the queue.
+    """
+    batch_size = batch_size or settings.LEARNING_EVENTS_BATCH_SIZE
+
+    with transaction.atomic():
+        events = list(
+            LearningEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .order_by("id")[:batch_size]
+        )
+        if not events:
+            return 0
+
+        by_type = defaultdict(list)
+        for event in events:
+            by_type[event.event_type].append(event)
+
+        done, failed = [], []
+        for event_type, group in by_type.items():
+            try:
+                _events_handle(event_type, group)
+                done += group
+            except Exception as e:
+                logger.warning(f"Learning Events Error ({event_type}), retrying one by one: {e}")
+                for event in group:
+                    try:
+                        _events_handle(event_type, [event])
+                        done.append(event)
+                    except Exception as event_error:
+                        event.failures += 1
+                        event.last_error = str(event_error)[:2000]
+                        failed.append(event)
+
+        now = timezone.now()
+        LearningEvent.objects.filter(id__in=[event.id for event in done]).update(processed_at=now)
+        for event in failed:
+            if event.failures >= settings.LEARNING_EVENTS_MAX_FAILURES:
+                logger.error(f"Learning Event {event.id} given up: {event.last_error}")
+                event.processed_at = now
+        if failed:
+            LearningEvent.objects.bulk_update(failed, ["failures", "last_error", "processed_at"])
+
+    return len(events)
+
+
+# ----- Service 7: Delete the processed events past the retention period
+def learning_events_prune() -> int:
+    """
+    Deletes events processed more than LEARNING_EVENTS_RETENTION_DAYS ago.
+    Events that were given up are kept for inspection.
+
+    Returns:
+        int: The number of deleted events.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.LEARNING_EVENTS_RETENTION_DAYS)
+    deleted, _ = (
+        LearningEvent.objects
+        .filter(processed_at__lt=cutoff, failures__lt=settings.LEARNING_EVENTS_MAX_FAILURES)
+        .delete()
     )
+    return deleted
 
-    return attempt
+
+# ----- Service 8: Invalidate the cached progress summary of a user
+def learning_progress_summary_invalidate(*, user_id: int) -> None:
+    """
+    Bumps the version of the user's cached progress summary (see the
+    learning_progress_summary selector) once the current transaction commits,
+    so the next read rebuilds it from the committed rows.
+
+    Args:
+        user_id (int): The user whose progress changed.
+    """
+    if settings.LEARNING_PROGRESS_CACHE_SECONDS <= 0:
+        # The summaries aren't cached (no shared cache backend)
+        return
+
+    def bump():
+        key = _progress_summary_version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No version yet (or evicted): the selector starts a new one on the next read
+            pass
+
+    transaction.on_commit(bump)
+
+
+# ----- Service 9: Move the legacy completed ids lists to the completion bitsets
+def learning_progress_bits_backfill(*, batch_size: int = 1000) -> int:
+    """
+    Sets completed_bits from the legacy completed_exercise_ids list of the rows stored
+    before the bitset existed (ids that are no longer in the content are dropped).
+    Each batch is locked, so submissions running meanwhile are not lost.
+
+    Args:
+        batch_size (int): Rows per batch (and per transaction).
+
+    Returns:
+        int: The number of updated rows.
+    """
+    languages = {language.get("slug"): language for language in load_learning_manifest().get("languages", [])}
+    ordinals = {slug: exercise_ordinals(language) for slug, language in languages.items()}
+
+    updated = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                LearningProgress.objects
+                .select_for_update()
+                .filter(id__gt=last_id)
+                .exclude(completed_exercise_ids=[])
+                .order_by("id")
+                .only("id", "user_id", "language_slug", "completed_exercise_ids", "completed_bits")[:batch_size]
+            )
+            if not rows:
+                return updated
+            last_id = rows[-1].id
+
+            changed = []
+            for row in rows:
+                language_ordinals = ordinals.get(row.language_slug, {})
+                legacy_bits = bits_from_ordinals(
+                    language_ordinals[ex_id] for ex_id in row.completed_exercise_ids if ex_id in language_ordinals
+                )
+                current_bits = bytes(row.completed_bits)
+                merged_bits = bits_union(current_bits, legacy_bits)
+                if merged_bits != current_bits:
+                    row.completed_bits = merged_bits
+                    changed.append(row)
+                    learning_progress_summary_invalidate(user_id=row.user_id)
+
+            LearningProgress.objects.bulk_update(changed, ["completed_bits"])
+            updated += len(changed)
+
+
+# ----- Service 10: Sync the Language/Exercise tables with the learning content
+def learning_content_sync(*, content: dict, dry_run: bool = False) -> dict:
+    """
+    Upserts the languages and exercises of `content` (the learning_content.json format)
+    in bulk and deletes the ones that are gone. Rows are compared by content hash, so
+    the unchanged ones are not written. The prerequisite graph of every language is
+    validated first (CurriculumError, a ValueError, when it is not valid).
+
+    Args:
+        content (dict): {"languages": [{..., "exercises": [...]}]}
+        dry_run (bool): Only compute what would change.
+
+    Returns:
+        dict: Counts per table: {"languages": {"created", "updated", "deleted", "unchanged"}, "exercises": {...}}
+    """
+    languages = content.get("languages", [])
+    for language in languages:
+        Curriculum(language)
+
+    language_hashes = dict(Language.objects.values_list("slug", "content_hash"))
+    exercise_rows = {
+        (language_slug, exercise_id): (pk, content_hash)
+        for pk, language_slug, exercise_id, content_hash in Exercise.objects.values_list(
+            "id", "language", "exercise_id", "content_hash"
+        )
+    }
+
+    new_languages, changed_languages = [], []
+    new_exercises, changed_exercises = [], []
+    for position, language in enumerate(languages):
+        slug = language["slug"]
+        data = {key: value for key, value in language.items() if key != "exercises"}
+        row = Language(
+            slug=slug,
+            name=language.get("name", slug),
+            position=position,
+            data=data,
+            content_hash=_content_hash(position, data),
+        )
+        if slug not in language_hashes:
+            new_languages.append(row)
+        elif language_hashes[slug] != row.content_hash:
+            changed_languages.append(row)
+
+        for ex_position, ex in enumerate(language.get("exercises", [])):
+            ex_row = Exercise(
+                language_id=slug,
+                exercise_id=ex["id"],
+                ordinal=ex["ordinal"],
+                position=ex_position,
+                title=ex.get("title", ""),
+                difficulty=ex.get("difficulty", ""),
+                data=ex,
+                content_hash=_content_hash(ex_position, ex),
+            )
+            existing = exercise_rows.pop((slug, ex["id"]), None)
+            if existing is None:
+                new_exercises.append(ex_row)
+            elif existing[1] != ex_row.content_hash:
+                ex_row.id = existing[0]
+                changed_exercises.append(ex_row)
+
+    content_slugs = {language["slug"] for language in languages}
+    removed_languages = [slug for slug in language_hashes if slug not in content_slugs]
+    # The exercises left in exercise_rows are not in the content anymore
+    removed_exercises = [pk for (slug, _), (pk, _) in exercise_rows.items() if slug in content_slugs]
+
+    result = {
+        "languages": {
+            "created": len(new_languages),
+            "updated": len(changed_languages),
+            "deleted": len(removed_languages),
+            "unchanged": len(languages) - len(new_languages) - len(changed_languages),
+        },
+        "exercises": {
+            "created": len(new_exercises),
+            "updated": len(changed_exercises),
+            "deleted": len(removed_exercises),
+            "unchanged": (
+                sum(len(language.get("exercises", [])) for language in languages)
+                - len(new_exercises) - len(changed_exercises)
+            ),
+        },
+    }
+    changed = new_languages or changed_languages or removed_languages or new_exercises or changed_exercises or removed_exercises
+    if dry_run or not changed:
+        return result
+
+    with transaction.atomic():
+        Language.objects.filter(slug__in=removed_languages).delete()
+        Exercise.objects.filter(id__in=removed_exercises).delete()
+        Language.objects.bulk_create(new_languages, batch_size=500)
+        Language.objects.bulk_update(changed_languages, ["name", "position", "data", "content_hash"], batch_size=500)
+        Exercise.objects.bulk_create(new_exercises, batch_size=500)
+        Exercise.objects.bulk_update(
+            changed_exercises,
+            ["ordinal", "position", "title", "difficulty", "data", "content_hash"],
+            batch_size=500,
+        )
+
+        # New content version: every process reloads the content (at once with a shared cache)
+        synced_at = timezone.now()
+        Language.objects.update(synced_at=synced_at)
+        transaction.on_commit(lambda: cache.set(
+            CONTENT_VERSION_KEY, synced_at.isoformat(), timeout=settings.LEARNING_CONTENT_CACHE_SECONDS
+        ))
+
+    return result
+
+
+# ----- Service 11: Rebuild the exercise analytics from the attempts (nightly reconciliation)
+@transaction.atomic
+def exercise_stats_rebuild() -> dict:
+    """
+    Recomputes ExerciseUserStats and ExerciseStats from exercise_attempt in a few set-based
+    statements, fixing any drift of the counters maintained by the events consumer. The
+    consumer waits for the rebuild, and skips the events of the attempts already counted
+    (ExerciseAttempt.stats_counted).
+
+    Returns:
+        dict: {"user_rows": int, "exercise_rows": int}
+    """
+    rowcounts = []
+    with connection.cursor() as cursor:
+        for statement in _EXERCISE_STATS_REBUILD_SQL:
+            cursor.execute(statement)
+            rowcounts.append(cursor.rowcount)
+
+    return {"user_rows": rowcounts[3], "exercise_rows": rowcounts[5]}
+
+
+# ----- Service 12: Recompute the progress of a language after its exercises changed
+def learning_progress_recompute(
+    *,
+    language_slug: str,
+    exercise_ids: list[str],
+    ordinals: list[int],
+    progress_hash: str,
+    batch_size: int = 1000,
+) -> dict:
+    """
+    Drops the completed exercises that no longer exist from every progress row of the
+    language and recomputes completion_percentage for its current number of exercises.
+    One set-based statement per batch, each in its own transaction, so rows are only
+    locked for the time of their batch and submissions keep going meanwhile. The
+    language's progress_hash is stored at the end (a run that stops is just run again).
+
+    Args:
+        language_slug (str): The language to recompute.
+        exercise_ids (list[str]): Its current exercise ids.
+        ordinals (list[int]): Their ordinals (the bits kept in completed_bits).
+        progress_hash (str): Hash of the exercises (see learning_progress_stale_languages).
+        batch_size (int): Rows per batch.
+
+    Returns:
+        dict: {"rows": rows read, "updated": rows that changed}
+    """
+    params = {
+        "language_slug": language_slug,
+        "mask": bits_from_ordinals(ordinals),
+        "exercise_ids": list(exercise_ids),
+        "total": len(exercise_ids) or 1,
+        "batch_size": batch_size,
+    }
+
+    rows = 0
+    updated = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(_PROGRESS_RECOMPUTE_SQL, {**params, "last_id": last_id, "now": timezone.now()})
+                batch_rows, batch_last_id, user_ids = cursor.fetchone()
+            for user_id in user_ids:
+                learning_progress_summary_invalidate(user_id=user_id)
+
+        if not batch_rows:
+            break
+        rows += batch_rows
+        updated += len(user_ids)
+        last_id = batch_last_id
+
+    Language.objects.filter(slug=language_slug).update(progress_hash=progress_hash)
+    return {"rows": rows, "updated": updated}
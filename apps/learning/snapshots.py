@@ -0,0 +1,264 @@
+"""
+   Precompressed snapshots of the public learning catalog.
+
+   The responses that only depend on the content (the exercise details, and the language
+   and exercise lists of anonymous users) are rendered once per content hash by
+   `manage.py build_learning_snapshots` (also run by sync_learning_content) into
+
+     <LEARNING_SNAPSHOT_DIR>/<key>/languages/python/exercises/py-01.json (+ .json.gz, .json.br)
+
+   and then served as bytes: a strong ETag (304 on If-None-Match) and the encoding the
+   client accepts, no serializer involved. The tree can be served as-is by a reverse
+   proxy (gzip_static/brotli_static) or a CDN under /api/learning/snapshots/<key>/, where
+   the responses are immutable (the key changes with the content).
+   Brotli files are only written when the `brotli` package is installed.
+"""
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+
+from apps.learning.content import content_store
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip snapshots are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Part of the snapshot key: bump it when the rendered responses change shape
+SNAPSHOT_FORMAT = "2"
+
+# Where the versioned (immutable) snapshots are served
+SNAPSHOT_URL_PREFIX = "/api/learning/snapshots/"
+
+# (suffix, Content-Encoding) in the order they are preferred
+ENCODINGS = ((".br", "br"), (".gz", "gzip"), ("", None))
+
+# How long a missing snapshot set is remembered before the disk is checked again
+_MISSING_RETRY_SECONDS = 30
+# Snapshot indexes kept in memory (the current set and a few previous ones)
+_MAX_INDEXES = 16
+
+
+# ----- Helper 1: Key of the snapshots of the current content
+def snapshot_key():
+    payload = f"{SNAPSHOT_FORMAT}:{content_store.content_hash()}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+# ----- Helper 2: Paths (relative to /api/learning/) of every snapshotted response
+def snapshot_paths():
+    manifest = content_store.manifest()
+    yield "languages/"
+    for language in manifest.get("languages", []):
+        yield f"languages/{language['slug']}/exercises/"
+        for ex in language.get("exercises", []):
+            yield f"languages/{language['slug']}/exercises/{ex['id']}/"
+
+
+# ----- Helper 3: File of a response path
+def _file_name(path):
+    return path.strip("/") + ".json"
+
+
+# ----- Helper 4: Encodings accepted by the client (Accept-Encoding, q=0 means refused)
+def _accepted_encodings(header):
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+# ----- Helper 5: Render a response path through its view (what an anonymous GET would return)
+def render_response(path):
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    url = f"/api/learning/{path}"
+    match = resolve(url)
+    with snapshot_store.bypassed():
+        response = match.func(RequestFactory().get(url, HTTP_ACCEPT="application/json"), *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response.render()
+    return response.status_code, response.content
+
+
+# ----- Build the snapshots of the current content
+def build_snapshots(*, render=render_response, directory=None, force=False, keep=3):
+    """
+    Renders every snapshot path with `render(path) -> (status_code, body bytes)` and writes
+    the identity, gzip and (if available) brotli files of the 200 responses, plus an
+    index.json of their ETags. The set is written in a temporary directory and moved in
+    place at the end, so it is never served half built. Only the `keep` newest sets are kept.
+
+    Returns {"key", "responses", "bytes", "gzip_bytes", "brotli_bytes", "skipped"}.
+    """
+    directory = Path(directory or settings.LEARNING_SNAPSHOT_DIR)
+    key = snapshot_key()
+    target = directory / key
+    if (target / "index.json").exists() and not force:
+        return {"key": key, "responses": 0, "bytes": 0, "gzip_bytes": 0, "brotli_bytes": 0, "skipped": True}
+
+    directory.mkdir(parents=True, exist_ok=True)
+    building = directory / f".{key}.{os.getpid()}.tmp"
+    shutil.rmtree(building, ignore_errors=True)
+
+    index = {}
+    totals = {"bytes": 0, "gzip_bytes": 0, "brotli_bytes": 0}
+    for path in snapshot_paths():
+        status_code, body = render(path)
+        if status_code != 200:
+            logger.warning(f"Learning Snapshot Skipped ({path}): status {status_code}")
+            continue
+
+        file_path = building / _file_name(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(body)
+        # mtime=0: the same body always gives the same gzip bytes
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        file_path.with_name(file_path.name + ".gz").write_bytes(gzipped)
+        totals["bytes"] += len(body)
+        totals["gzip_bytes"] += len(gzipped)
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=11)
+            file_path.with_name(file_path.name + ".br").write_bytes(compressed)
+            totals["brotli_bytes"] += len(compressed)
+
+        index[path] = hashlib.sha256(body).hexdigest()[:32]
+
+    (building / "index.json").write_text(json.dumps({"key": key, "etags": index, "brotli": brotli is not None}))
+    if target.exists():
+        shutil.rmtree(target)
+    os.replace(building, target)
+
+    # Keep the newest sets only (clients and caches may still ask for the previous ones)
+    sets = sorted(
+        (path for path in directory.iterdir() if path.is_dir() and not path.name.startswith(".")),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    for old in sets[max(keep, 1):]:
+        shutil.rmtree(old, ignore_errors=True)
+
+    snapshot_store.clear()
+    return {"key": key, "responses": len(index), **totals, "skipped": False}
+
+
+class SnapshotStore:
+    """
+    Reads the snapshot indexes (once per key) and answers requests from the files.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        # key -> index dict, or the time it was found missing
+        self._indexes = {}
+        self._local = threading.local()
+
+    @property
+    def directory(self):
+        return Path(self._directory or settings.LEARNING_SNAPSHOT_DIR)
+
+    def respond(self, request, path, key=None, immutable=False):
+        """
+        The snapshot response of `path` (relative to /api/learning/), None when there is
+        no snapshot (not built yet for this content, or not a snapshotted path).
+        """
+        if getattr(self._local, "bypassed", False):
+            return None
+
+        key = key or snapshot_key()
+        index = self._index(key)
+        etag_value = index["etags"].get(path) if index else None
+        if etag_value is None:
+            return None
+
+        accepted = _accepted_encodings(request.headers.get("Accept-Encoding"))
+        file_path = self.directory / key / _file_name(path)
+        for suffix, encoding in ENCODINGS:
+            if encoding is None or (encoding in accepted and (encoding != "br" or index.get("brotli"))):
+                break
+
+        # One strong ETag per representation (the bytes differ per encoding)
+        etag = f'"{etag_value}{suffix.replace(".", "-")}"'
+        if_none_match = request.headers.get("If-None-Match", "")
+        matches = if_none_match.strip() == "*" or any(
+            tag.strip().removeprefix("W/").strip('"').split("-")[0] == etag_value
+            for tag in if_none_match.split(",") if tag.strip()
+        )
+        if matches:
+            response = HttpResponseNotModified()
+        else:
+            try:
+                body = file_path.with_name(file_path.name + suffix).read_bytes()
+            except OSError:
+                return None
+            response = HttpResponse(body, content_type="application/json")
+            if encoding:
+                response["Content-Encoding"] = encoding
+
+        response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        if immutable:
+            response["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            # Revalidated on every use (a 304 while the content doesn't change)
+            response["Cache-Control"] = "public, no-cache"
+            response["Content-Location"] = f"{SNAPSHOT_URL_PREFIX}{key}/{path}"
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    @contextmanager
+    def bypassed(self):
+        """
+        Requests of this thread are rendered by the views (used to build the snapshots).
+        """
+        self._local.bypassed = True
+        try:
+            yield
+        finally:
+            self._local.bypassed = False
+
+    def _index(self, key):
+        with self._lock:
+            index = self._indexes.get(key)
+        if isinstance(index, dict):
+            return index
+        if index is not None and time.monotonic() - index < _MISSING_RETRY_SECONDS:
+            return None
+
+        try:
+            index = json.loads((self.directory / key / "index.json").read_text())
+        except (OSError, ValueError):
+            index = None
+        with self._lock:
+            if len(self._indexes) >= _MAX_INDEXES:
+                self._indexes.clear()
+            self._indexes[key] = index if index is not None else time.monotonic()
+        return index
+
+
+snapshot_store = SnapshotStore()
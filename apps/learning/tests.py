@@ -0,0 +1,759 @@
+import threading
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.ai_models.models import AiModel, AiProvider
+from apps.learning import curriculum, events, selectors, services
+from apps.learning.bitset import (
+    bits_count,
+    bits_from_ordinals,
+    bits_ordinals,
+    bits_set,
+    bits_test,
+    bits_union,
+)
+from apps.learning.grading import SandboxPool, SandboxWorker, grade_sql_submission, grade_submission
+from apps.learning.memo import exercise_content_version, grading_memo
+from apps.learning.models import (
+    ExerciseAttempt,
+    ExerciseFeedback,
+    ExerciseStats,
+    ExerciseUserStats,
+    LearningEvent,
+    LearningProgress,
+)
+from apps.learning.search import ExerciseIndex, SearchError
+from core.idempotency import IDEMPOTENCY_REPLAYED_HEADER
+
+
+# ------ Sandbox: submissions can't read project files, start processes or load native code
+class PythonSandboxEscapeTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.worker = SandboxWorker("python")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.kill()
+        super().tearDownClass()
+
+    def run_code(self, code, stdin=""):
+        job = {
+            "code": code,
+            "tests": [{"stdin": stdin}],
+            "time_limit": 2,
+            "memory_mb": settings.GRADER_MEMORY_LIMIT_MB,
+            "output_limit": 4096,
+            "sandbox_uid": settings.GRADER_SANDBOX_UID,
+        }
+        return self.worker.run(job, timeout=10)["results"][0]
+
+    def assertBlocked(self, code, leaked=None, reason=None):
+        result = self.run_code(code)
+        self.assertEqual(result["status"], "error", result)
+        if reason:
+            self.assertIn(reason, result["error"])
+        if leaked:
+            self.assertNotIn(leaked, result["stdout"] + result["error"])
+        return result
+
+    def test_regular_code_runs(self):
+        result = self.run_code(
+            "import collections, dataclasses, enum, math\n"
+            "Point = collections.namedtuple('Point', 'x y')\n"
+            "Color = enum.Enum('Color', 'RED GREEN')\n"
+            "@dataclasses.dataclass\n"
+            "class Box:\n"
+            "    size: int\n"
+            "print(Point(1, 2).y + Box(3).size, Color.RED.name, math.isqrt(int(input())))",
+            stdin="16",
+        )
+        self.assertEqual(result["status"], "ok", result)
+        self.assertEqual(result["stdout"], "5 RED 4\n")
+
+    def test_project_files_cannot_be_read(self):
+        settings_path = str(settings.BASE_DIR / "core" / "settings.py")
+        self.assertBlocked(f"print(open({settings_path!r}).read())", leaked="SECRET_KEY")
+        self.assertBlocked("print(open('../../../../../../etc/passwd').read())", leaked="root:")
+
+    def test_posixsubprocess_cannot_start_a_shell(self):
+        self.assertBlocked(
+            "import _posixsubprocess\n"
+            "_posixsubprocess.fork_exec([b'/bin/sh'], [b'/bin/sh'], True, (), None, None,"
+            " -1, -1, -1, -1, -1, -1, -1, -1, False, False, None, None, None, -1, None, False)",
+            reason="import _posixsubprocess is not allowed",
+        )
+
+    def test_processes_cannot_be_started(self):
+        os_globals = (
+            "g = [c for c in ().__class__.__base__.__subclasses__() if c.__name__ == '_wrap_close'][0].__init__.__globals__\n"
+        )
+        self.assertBlocked("import os\nos.system('id')")
+        self.assertBlocked(os_globals + "print(g['fork']())")
+        self.assertBlocked(os_globals + "g['posix_spawn']('/bin/sh', ['sh', '-c', 'id'], {})")
+        self.assertBlocked(os_globals + "g['execv']('/bin/sh', ['sh'])")
+        self.assertBlocked("import subprocess")
+
+    def test_native_code_and_network_are_blocked(self):
+        self.assertBlocked("import ctypes")
+        self.assertBlocked("import _ctypes")
+        self.assertBlocked("import socket")
+
+    def test_files_cannot_be_written_or_listed(self):
+        self.assertBlocked("open('out.txt', 'w').write('x')")
+        self.assertBlocked(
+            "g = [c for c in ().__class__.__base__.__subclasses__() if c.__name__ == '_wrap_close'][0].__init__.__globals__\n"
+            "print(g['listdir']('/'))"
+        )
+
+    def test_frames_of_the_worker_are_not_reachable(self):
+        self.assertBlocked("try:\n    1 / 0\nexcept ZeroDivisionError as e:\n    print(e.__traceback__.tb_frame.f_back.f_globals)")
+        self.assertBlocked("import sys\nprint(sys._getframe(1).f_locals)")
+
+    def test_forged_results_are_rejected(self):
+        result = self.assertBlocked(
+            "g = [c for c in ().__class__.__base__.__subclasses__() if c.__name__ == '_wrap_close'][0].__init__.__globals__\n"
+            "for fd in range(3, 16):\n"
+            "    try:\n"
+            "        g['write'](fd, b'{\"status\": \"ok\", \"stdout\": \"forged\", \"error\": \"\"}')\n"
+            "    except OSError:\n"
+            "        pass\n"
+            "g['_exit'](0)"
+        )
+        self.assertEqual(result["stdout"], "")
+
+    def test_grading_does_not_echo_file_contents(self):
+        exercise = {"tests": [{"stdin": "", "stdout": "hello"}]}
+        pool = mock.Mock()
+        pool.execute.side_effect = lambda **kwargs: [self.run_code(kwargs["code"])]
+        code = f"print(open({str(settings.BASE_DIR / 'core' / 'settings.py')!r}).read())"
+
+        grade = grade_submission(language_slug="python", exercise=exercise, user_code=code, pool=pool)
+
+        self.assertFalse(grade["passed"])
+        self.assertNotIn("SECRET_KEY", grade["message"])
+
+
+# ------ JavaScript sandbox: the time limit covers promise callbacks too
+class JavaScriptSandboxTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.worker = SandboxWorker("javascript")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.kill()
+        super().tearDownClass()
+
+    def run_code(self, code):
+        job = {"code": code, "tests": [{"stdin": "x"}], "time_limit": 1, "output_limit": 4096}
+        return self.worker.run(job, timeout=5)["results"][0]
+
+    def test_async_infinite_loop_times_out_and_the_worker_keeps_answering(self):
+        result = self.run_code("Promise.resolve().then(() => { for (;;) {} }); console.log(1)")
+        self.assertEqual(result["status"], "timeout", result)
+
+        self.assertEqual(self.run_code("console.log(input)")["stdout"], "x\n")
+
+    def test_output_of_promise_callbacks_is_kept(self):
+        result = self.run_code("(async () => { await null; console.log('after') })(); console.log('before')")
+
+        self.assertEqual(result, {"status": "ok", "stdout": "before\nafter\n", "error": ""})
+
+
+# ------ Sandbox pool: workers start on first use, a missing interpreter only fails its own language
+class SandboxPoolStartTests(SimpleTestCase):
+    exercise = {"tests": [{"stdin": "", "stdout": "Hello\n"}]}
+
+    @override_settings(GRADER_NODE_BINARY="/nonexistent/node")
+    def test_missing_node_does_not_break_python_grading(self):
+        pool = SandboxPool(size=1)
+        self.addCleanup(pool.close)
+
+        javascript = grade_submission(language_slug="javascript", exercise=self.exercise, user_code="console.log('Hello')", pool=pool)
+        python = grade_submission(language_slug="python", exercise=self.exercise, user_code="print('Hello')", pool=pool)
+
+        self.assertFalse(javascript["passed"])
+        self.assertIn("unavailable", javascript["message"])
+        self.assertFalse(javascript["cacheable"])
+        self.assertTrue(python["passed"])
+
+    def test_workers_are_not_started_before_they_are_needed(self):
+        with mock.patch("apps.learning.grading.SandboxWorker") as worker:
+            SandboxPool(size=2)
+
+        worker.assert_not_called()
+
+
+# ------ Sandbox pool: a submission that hits a limit isn't memoized and doesn't break the next one
+@override_settings(GRADER_TIME_LIMIT_SECONDS=0.5)
+class SandboxPoolLimitTests(SimpleTestCase):
+    exercise = {"tests": [{"stdin": "", "stdout": "Hello\n"}, {"stdin": "", "stdout": "Hello\n"}]}
+
+    def setUp(self):
+        self.pool = SandboxPool(size=1, languages=("python",))
+        self.addCleanup(self.pool.close)
+
+    def grade(self, code):
+        return grade_submission(language_slug="python", exercise=self.exercise, user_code=code, pool=self.pool)
+
+    def test_timeout_is_reported_per_test_and_not_cacheable(self):
+        result = self.grade("while True: pass")
+
+        self.assertEqual((result["passed"], result["tests_passed"], result["tests_total"]), (False, 0, 2))
+        self.assertIn("Test 1: time limit exceeded", result["message"])
+        self.assertFalse(result["cacheable"])
+        self.assertTrue(self.grade("print('Hello')")["passed"])
+
+    def test_wrong_output_is_cacheable(self):
+        result = self.grade("print('Bye')")
+
+        self.assertIn("expected output 'Hello', got 'Bye'", result["message"])
+        self.assertTrue(result["cacheable"])
+
+
+# ------ SQL exercises: result sets compared against the expected query, read-only and bounded
+class SqlGradingTests(SimpleTestCase):
+    language = {
+        "slug": "sql-tests",
+        "fixtures": {
+            "scores": {
+                "schema": ["CREATE TABLE scores (name TEXT NOT NULL, points INTEGER NOT NULL)"],
+                "seed": ["INSERT INTO scores VALUES ('Sara', 7), ('Ali', 9), ('Mona', 5)"],
+            },
+        },
+    }
+
+    def grade(self, user_code, expected_code="SELECT name FROM scores WHERE points > 6;", ordered=False):
+        exercise = {"fixture": "scores", "expected_code": expected_code, "ordered": ordered}
+        return grade_sql_submission(language=self.language, exercise=exercise, user_code=user_code)
+
+    def test_rows_in_any_order_pass_unordered_exercises(self):
+        result = self.grade("SELECT name FROM scores WHERE points >= 7 ORDER BY name DESC")
+
+        self.assertTrue(result["passed"])
+
+    def test_ordered_exercises_report_the_wrong_order(self):
+        result = self.grade("SELECT name FROM scores ORDER BY points", "SELECT name FROM scores ORDER BY points DESC", ordered=True)
+
+        self.assertFalse(result["passed"])
+        self.assertIn("not in the expected order", result["message"])
+
+    def test_row_count_mismatch_is_reported(self):
+        self.assertIn("expected 2 row(s), got 1", self.grade("SELECT name FROM scores WHERE points > 8")["message"])
+        self.assertIn("expected 2 row(s), got more", self.grade("SELECT name FROM scores")["message"])
+
+    def test_unknown_fixture_is_rejected(self):
+        with self.assertRaises(ValueError):
+            grade_sql_submission(language=self.language, exercise={"fixture": "missing"}, user_code="SELECT 1")
+
+    def test_only_select_queries_are_allowed(self):
+        for query in ("DELETE FROM scores", "INSERT INTO scores VALUES ('x', 1)", "PRAGMA table_info(scores)"):
+            with self.subTest(query=query):
+                result = self.grade(query)
+                self.assertIn("only SELECT queries are allowed", result["message"])
+                self.assertTrue(result["cacheable"])
+
+        # The fixture itself is untouched
+        self.assertTrue(self.grade("SELECT name FROM scores WHERE points > 6")["passed"])
+
+    @override_settings(GRADER_TIME_LIMIT_SECONDS=0.2)
+    def test_long_queries_are_interrupted_and_not_cached(self):
+        started = time.monotonic()
+        result = self.grade("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n")
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIn("the query took too long", result["message"])
+        self.assertFalse(result["cacheable"])
+
+    @override_settings(GRADER_SQL_MAX_VALUE_BYTES=10000)
+    def test_huge_values_are_refused_before_they_are_allocated(self):
+        result = self.grade("SELECT length(randomblob(900000000))")
+
+        self.assertIn("too large", result["message"])
+
+    @override_settings(GRADER_SQL_MAX_QUERY_BYTES=100)
+    def test_long_query_text_is_refused(self):
+        result = self.grade("SELECT name FROM scores WHERE name = '" + "x" * 200 + "'")
+
+        self.assertIn("too large", result["message"])
+
+
+# ------ Submissions are graded before the write transaction is opened
+class SubmitAttemptTransactionTests(TransactionTestCase):
+    def test_grading_runs_outside_a_transaction(self):
+        user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        in_transaction = []
+
+        def grade(**kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return {"passed": True, "score": Decimal("100.00"), "message": "Correct ✅", "cacheable": False}
+
+        with mock.patch.object(services, "_grade_exercise", side_effect=grade):
+            attempt = services.exercise_submit_attempt(
+                user=user, language_slug="python", exercise_id="py-01", user_code="print('Hello, Python')"
+            )
+
+        self.assertEqual(in_transaction, [False])
+        self.assertEqual(ExerciseAttempt.objects.get().pk, attempt.pk)
+
+
+# ------ Idempotent submissions: a retry is replayed, a reused key with another body is rejected
+class SubmitIdempotencyTests(TestCase):
+    url = "/api/learning/exercise/submit/"
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        grade = {"passed": True, "score": Decimal("100.00"), "message": "Correct ✅", "cacheable": False}
+        patcher = mock.patch.object(services, "_grade_exercise", side_effect=lambda **kwargs: dict(grade))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, user_code, exercise_id="py-01", key="key-1"):
+        body = {"language_slug": "python", "exercise_id": exercise_id, "user_code": user_code}
+        return self.client.post(self.url, body, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_same_key_and_body_is_replayed(self):
+        self.post("print('Hello, Python')")
+
+        retry = self.post("print('Hello, Python')")
+
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry[IDEMPOTENCY_REPLAYED_HEADER], "true")
+        self.assertEqual(ExerciseAttempt.objects.count(), 1)
+
+    def test_same_key_with_another_body_is_rejected(self):
+        self.post("print('Hello, Python')")
+
+        for code, exercise_id in (("print('bye')", "py-01"), ("print('Hello, Python')", "py-02")):
+            with self.subTest(exercise_id=exercise_id):
+                retry = self.post(code, exercise_id=exercise_id)
+                self.assertEqual(retry.status_code, 422)
+                self.assertEqual(retry.data["error_code"], "idempotency_key_mismatch")
+
+        self.assertEqual(ExerciseAttempt.objects.count(), 1)
+
+
+# ------ Completion bitsets: the Python helpers and PostgreSQL's set_bit/bit_count share one layout
+class BitsetTests(SimpleTestCase):
+    def test_set_and_test(self):
+        bits = bits_set(bits_set(b"", 0), 10)
+
+        self.assertEqual(bits, b"\x01\x04")
+        self.assertEqual([ordinal for ordinal in range(16) if bits_test(bits, ordinal)], [0, 10])
+        self.assertFalse(bits_test(bits, 100))
+        self.assertEqual(bits_set(bits, 10), bits)
+
+    def test_ordinals_round_trip(self):
+        ordinals = [0, 7, 8, 63, 64, 200]
+        bits = bits_from_ordinals(ordinals)
+
+        self.assertEqual(bits_ordinals(bits), ordinals)
+        self.assertEqual(bits_count(bits), len(ordinals))
+        self.assertEqual(bits_from_ordinals([]), b"")
+
+    def test_union_of_bitsets_of_different_lengths(self):
+        self.assertEqual(bits_union(bits_from_ordinals([1]), bits_from_ordinals([1, 30])), bits_from_ordinals([1, 30]))
+        self.assertEqual(bits_union(b"", b""), b"")
+
+
+class BitsetSqlTests(TestCase):
+    def test_set_bit_and_bit_count_match_the_python_helpers(self):
+        ordinals = [0, 5, 9, 23]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_bit(set_bit(set_bit(set_bit(decode(repeat('00', 3), 'hex'), 0, 1), 5, 1), 9, 1), 23, 1)"
+            )
+            bits = bytes(cursor.fetchone()[0])
+            cursor.execute("SELECT bit_count(%s::bytea), get_bit(%s::bytea, 9), get_bit(%s::bytea, 10)", [bits] * 3)
+            count, bit_9, bit_10 = cursor.fetchone()
+
+        self.assertEqual(bits, bits_from_ordinals(ordinals))
+        self.assertEqual(count, bits_count(bits))
+        self.assertEqual((bit_9, bit_10), (int(bits_test(bits, 9)), int(bits_test(bits, 10))))
+
+
+# ------ Progress upsert: one statement sets the exercise's bit and recomputes the percentage
+class ProgressRecordAttemptTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+
+    def record(self, ordinal, passed, total=4):
+        return services.learning_progress_record_attempt(
+            user=self.user,
+            language_slug="python",
+            exercise_id=f"py-{ordinal:02d}",
+            ordinal=ordinal,
+            passed=passed,
+            total_exercises=total,
+        )
+
+    def test_a_failed_first_attempt_creates_an_empty_progress(self):
+        row = self.record(1, passed=False)
+
+        self.assertEqual((row["completed_bits"], row["completion_percentage"]), (b"", Decimal("0.00")))
+        self.assertEqual(LearningProgress.objects.get().current_exercise_id, "py-01")
+
+    def test_passes_set_their_bit_once_and_failures_keep_it(self):
+        self.record(0, passed=True)
+        self.record(0, passed=True)
+        self.record(0, passed=False)
+        row = self.record(2, passed=True)
+
+        self.assertEqual(row["completed_bits"], bits_from_ordinals([0, 2]))
+        self.assertEqual(row["completion_percentage"], Decimal("50.00"))
+        self.assertEqual(LearningProgress.objects.count(), 1)
+
+    def test_the_bitset_grows_for_a_high_ordinal(self):
+        self.record(1, passed=True, total=20)
+        row = self.record(17, passed=True, total=20)
+
+        self.assertEqual(row["completed_bits"], bits_from_ordinals([1, 17]))
+        self.assertEqual(row["completion_percentage"], Decimal("10.00"))
+
+
+class ProgressRecordAttemptConcurrencyTests(TransactionTestCase):
+    def test_concurrent_passes_keep_both_bits(self):
+        user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        LearningProgress.objects.create(user=user, language_slug="python")
+        barrier = threading.Barrier(2)
+
+        def submit(ordinal):
+            try:
+                with transaction.atomic():
+                    barrier.wait(5)
+                    services.learning_progress_record_attempt(
+                        user=user, language_slug="python", exercise_id=f"py-{ordinal:02d}",
+                        ordinal=ordinal, passed=True, total_exercises=4,
+                    )
+                    # Holds the row lock, the other submission waits and then updates the committed row
+                    time.sleep(0.2)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(ordinal,)) for ordinal in (0, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        progress = LearningProgress.objects.get()
+        self.assertEqual(bytes(progress.completed_bits), bits_from_ordinals([0, 3]))
+        self.assertEqual(progress.completion_percentage, Decimal("50.00"))
+
+
+# ------ Recomputing the progress keeps the bits set by concurrent submissions
+class ProgressRecomputeConcurrencyTests(TransactionTestCase):
+    def test_bit_set_while_the_batch_waits_is_kept(self):
+        user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        progress = LearningProgress.objects.create(
+            user=user, language_slug="python", completed_bits=bits_from_ordinals([0, 1])
+        )
+        locked = threading.Event()
+
+        def submit():
+            # A submission passing exercise 2, committed while the recompute waits for the row
+            try:
+                with transaction.atomic():
+                    row = LearningProgress.objects.select_for_update().get(pk=progress.pk)
+                    row.completed_bits = bits_from_ordinals([0, 1, 2])
+                    row.save(update_fields=["completed_bits"])
+                    locked.set()
+                    time.sleep(0.5)
+            finally:
+                connection.close()
+
+        submitter = threading.Thread(target=submit)
+        submitter.start()
+        locked.wait(5)
+        # Exercise 1 was removed
+        services.learning_progress_recompute(
+            language_slug="python", exercise_ids=["py-01", "py-03"], ordinals=[0, 2], progress_hash="h"
+        )
+        submitter.join()
+
+        progress.refresh_from_db()
+        self.assertEqual(bytes(progress.completed_bits), bits_from_ordinals([0, 2]))
+        self.assertEqual(progress.completion_percentage, Decimal("100.00"))
+
+
+# ------ Progress summary cache: only with a shared backend, bumped after every change
+class ProgressSummaryCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        self.progress = LearningProgress.objects.create(user=self.user, language_slug="python")
+
+    def complete(self, percentage):
+        LearningProgress.objects.filter(pk=self.progress.pk).update(completion_percentage=percentage)
+
+    @override_settings(LEARNING_PROGRESS_CACHE_SECONDS=0)
+    def test_not_cached_without_a_shared_backend(self):
+        selectors.learning_progress_summary(user=self.user)
+        self.complete(Decimal("50.00"))
+
+        summary = selectors.learning_progress_summary(user=self.user)
+
+        self.assertEqual(summary["python"]["completion_percentage"], Decimal("50.00"))
+
+    @override_settings(LEARNING_PROGRESS_CACHE_SECONDS=60)
+    def test_cached_summary_is_rebuilt_after_a_change(self):
+        selectors.learning_progress_summary(user=self.user)
+        self.complete(Decimal("50.00"))
+        with self.assertNumQueries(0):
+            cached = selectors.learning_progress_summary(user=self.user)
+        self.assertEqual(cached["python"]["completion_percentage"], Decimal("0.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.learning_progress_summary_invalidate(user_id=self.user.id)
+
+        summary = selectors.learning_progress_summary(user=self.user)
+        self.assertEqual(summary["python"]["completion_percentage"], Decimal("50.00"))
+
+
+# ------ Exercise analytics: every attempt counted once, numbered in attempt order
+class ExerciseStatsUpdateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+
+    def attempt(self, status):
+        return ExerciseAttempt.objects.create(
+            user=self.user, language_slug="python", exercise_id="py-01", user_code="print(1)", status=status
+        )
+
+    def consume(self, *attempts):
+        events.exercise_stats_update([
+            LearningEvent(
+                event_type=events.ATTEMPT_SUBMITTED,
+                user=self.user,
+                payload={"attempt_id": a.id, "language_slug": a.language_slug, "exercise_id": a.exercise_id, "status": a.status},
+            )
+            for a in attempts
+        ])
+
+    def assertStats(self, attempts, attempts_to_pass):
+        user_stats = ExerciseUserStats.objects.get()
+        stats = ExerciseStats.objects.get()
+        self.assertEqual((user_stats.attempts, user_stats.attempts_to_pass), (attempts, attempts_to_pass))
+        self.assertEqual((stats.attempts, stats.unique_users), (attempts, 1))
+        self.assertEqual(stats.attempts_to_pass, {str(attempts_to_pass): 1})
+
+    def test_late_attempt_before_the_first_pass_is_counted(self):
+        failed, passed, after = self.attempt("failed"), self.attempt("passed"), self.attempt("failed")
+
+        self.consume(after, passed)
+        self.consume(failed)
+
+        self.assertStats(attempts=3, attempts_to_pass=2)
+
+    def test_late_pass_becomes_the_first_pass(self):
+        first, second = self.attempt("passed"), self.attempt("passed")
+
+        self.consume(second)
+        self.consume(first)
+
+        self.assertStats(attempts=2, attempts_to_pass=1)
+        self.assertEqual(ExerciseStats.objects.get().users_passed, 1)
+
+    def test_replayed_events_are_skipped(self):
+        failed, passed = self.attempt("failed"), self.attempt("passed")
+
+        self.consume(failed, passed)
+        self.consume(passed, failed)
+
+        self.assertStats(attempts=2, attempts_to_pass=2)
+
+    def test_rebuild_matches_and_pending_events_are_skipped(self):
+        failed, passed = self.attempt("failed"), self.attempt("passed")
+        self.consume(passed)
+
+        services.exercise_stats_rebuild()
+        self.consume(failed)
+
+        self.assertStats(attempts=2, attempts_to_pass=2)
+
+
+# ------ Grading memo: keyed on the exact executed code, invalidated by content changes
+class GradingMemoTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        grading_memo.clear()
+        self.addCleanup(grading_memo.clear)
+
+    def submit(self, code):
+        return services.exercise_submit_attempt(user=self.user, language_slug="python", exercise_id="py-01", user_code=code)
+
+    def test_indented_answer_does_not_reuse_the_grade_of_the_correct_one(self):
+        self.assertEqual(self.submit("print('Hello, Python')").status, "passed")
+
+        # An IndentationError once it runs, even though it normalizes to the correct answer
+        self.assertEqual(self.submit(" print('Hello, Python')").status, "failed")
+
+    def test_the_same_code_is_graded_once(self):
+        with mock.patch.object(services, "_grade_exercise", wraps=services._grade_exercise) as grade:
+            first = self.submit("print('Hello, Python')")
+            second = self.submit("print('Hello, Python')")
+
+        self.assertEqual(grade.call_count, 1)
+        self.assertEqual((first.status, second.status), ("passed", "passed"))
+        self.assertEqual(first.code_hash, second.code_hash)
+
+    def test_grades_that_hit_a_limit_are_graded_again(self):
+        grade = {"passed": False, "score": Decimal("0.00"), "message": "time limit exceeded", "cacheable": False}
+        with mock.patch.object(services, "_grade_exercise", side_effect=lambda **kwargs: dict(grade)) as grader:
+            self.submit("while True: pass")
+            self.submit("while True: pass")
+
+        self.assertEqual(grader.call_count, 2)
+
+    def test_editing_the_exercise_or_its_fixture_changes_the_content_version(self):
+        language = {"fixtures": {"users": {"schema": ["CREATE TABLE users (id INTEGER)"], "seed": []}}}
+        exercise = {"id": "sql-01", "expected_code": "SELECT * FROM users;", "fixture": "users"}
+        version = exercise_content_version(language, exercise)
+
+        self.assertEqual(exercise_content_version(language, dict(exercise)), version)
+        self.assertNotEqual(exercise_content_version(language, {**exercise, "ordered": True}), version)
+        language["fixtures"]["users"]["seed"] = ["INSERT INTO users VALUES (1)"]
+        self.assertNotEqual(exercise_content_version(language, exercise), version)
+
+
+# ------ Exercise search: word prefixes ANDed over an inverted index, cursors bound to the content version
+class ExerciseIndexTests(SimpleTestCase):
+    exercises = {
+        "ex-1": {"title": "For Loop", "prompt": "Print numbers with a loop.", "difficulty": "easy"},
+        "ex-2": {"title": "While Loops", "prompt": "Count down with while.", "difficulty": "medium"},
+        "ex-3": {"title": "Lists", "prompt": "Loop over a list.", "difficulty": "easy"},
+        "ex-4": {"title": "Functions", "prompt": "Define a function.", "difficulty": "Easy"},
+    }
+
+    def index(self, key="v1"):
+        return ExerciseIndex({"exercise_index": self.exercises}, list(self.exercises), key)
+
+    def ids(self, index, **kwargs):
+        exercise_ids, _ = index.page(index.search(**kwargs), limit=10)
+        return exercise_ids
+
+    def test_terms_match_word_prefixes_and_are_anded(self):
+        index = self.index()
+
+        self.assertEqual(self.ids(index, q="LOO"), ["ex-1", "ex-2", "ex-3"])
+        self.assertEqual(self.ids(index, q="loo whi"), ["ex-2"])
+        self.assertEqual(self.ids(index, q="loop", difficulty="EASY"), ["ex-1", "ex-3"])
+        self.assertEqual(self.ids(index, q="recursion"), [])
+        self.assertEqual(self.ids(index, difficulty="easy"), ["ex-1", "ex-3", "ex-4"])
+
+    def test_pages_follow_the_cursor_to_the_end(self):
+        index = self.index()
+        mask = index.search()
+
+        first, cursor = index.page(mask, limit=3)
+        second, last_cursor = index.page(mask, cursor=cursor, limit=3)
+
+        self.assertEqual((first, second, last_cursor), (["ex-1", "ex-2", "ex-3"], ["ex-4"], None))
+
+    def test_cursor_of_another_content_version_has_expired(self):
+        _, cursor = self.index("v1").page(self.index("v1").search(), limit=1)
+
+        with self.assertRaisesMessage(SearchError, "expired"):
+            self.index("v2").page(self.index("v2").search(), cursor=cursor, limit=1)
+        with self.assertRaisesMessage(SearchError, "Invalid cursor"):
+            self.index().page(self.index().search(), cursor="not-a-cursor", limit=1)
+
+
+# ------ Curriculum cache: keyed by the content version and the slug, not by the graph
+class CurriculumCacheTests(SimpleTestCase):
+    language = {"slug": "test-lang", "exercises": [{"id": "t-01", "ordinal": 0}, {"id": "t-02", "ordinal": 1}]}
+
+    def test_a_hit_does_not_walk_the_exercises(self):
+        with mock.patch.object(curriculum.content_store, "version", return_value="v1"):
+            compiled = curriculum.get_curriculum(self.language)
+            exercises = mock.MagicMock()
+            self.assertIs(curriculum.get_curriculum({"slug": "test-lang", "exercises": exercises}), compiled)
+
+        exercises.__iter__.assert_not_called()
+        self.assertEqual(compiled.order, ["t-01", "t-02"])
+
+    def test_a_new_content_version_compiles_again(self):
+        with mock.patch.object(curriculum.content_store, "version", return_value="v1"):
+            first = curriculum.get_curriculum(self.language)
+        with mock.patch.object(curriculum.content_store, "version", return_value="v2"):
+            self.assertIsNot(curriculum.get_curriculum(self.language), first)
+
+
+class _FakeTutor:
+    """
+    A chat model that answers every prompt with the same hint and records the prompts.
+    """
+    def __init__(self, hint):
+        self.hint = hint
+        self.prompts = []
+
+    def invoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        return SimpleNamespace(content=f"  {self.hint}\n")
+
+
+# ------ Offline feedback: frequent wrong answers get one hint, shown on the next submission
+class ExerciseFeedbackTests(TestCase):
+    wrong_code = "print('hello python')"
+
+    def setUp(self):
+        self.user = User.objects.create_user(email="learner@example.com", username="learner", password="password123")
+        self.ai_model = AiModel.objects.create(provider=AiProvider.OLLAMA, model_name="tutor")
+        grade = {"passed": False, "score": Decimal("0.00"), "message": "Wrong output ❌", "cacheable": False}
+        patcher = mock.patch.object(services, "_grade_exercise", side_effect=lambda **kwargs: dict(grade))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def submit(self, code):
+        return services.exercise_submit_attempt(user=self.user, language_slug="python", exercise_id="py-01", user_code=code)
+
+    def test_frequent_wrong_answers_are_clustered(self):
+        for code in (self.wrong_code, self.wrong_code, self.wrong_code, "print('bye')"):
+            self.submit(code)
+
+        clusters = selectors.exercise_wrong_answer_clusters(top_n=5, min_count=2)
+
+        self.assertEqual(len(clusters), 1)
+        self.assertEqual(
+            (clusters[0]["exercise_id"], clusters[0]["attempts"], clusters[0]["latest_id"]),
+            ("py-01", 3, ExerciseAttempt.objects.filter(user_code=self.wrong_code).latest("id").id),
+        )
+
+    def test_feedback_is_generated_once_and_shown_on_the_next_submission(self):
+        self.submit(self.wrong_code)
+        self.submit(self.wrong_code)
+        tutor = _FakeTutor("Print exactly the expected text.")
+
+        self.assertEqual(services.exercise_feedback_generate(ai_model=self.ai_model, llm=tutor), 1)
+        self.assertEqual(services.exercise_feedback_generate(ai_model=self.ai_model, llm=tutor), 0)
+
+        self.assertEqual(len(tutor.prompts), 1)
+        self.assertIn(self.wrong_code, tutor.prompts[0])
+        feedback = ExerciseFeedback.objects.get()
+        self.assertEqual((feedback.feedback, feedback.attempt_count, feedback.ai_model), ("Print exactly the expected text.", 2, self.ai_model))
+
+        with self.assertNumQueries(1):
+            hint = selectors.exercise_feedback_get(
+                language_slug="python",
+                exercise_id="py-01",
+                content_version=feedback.content_version,
+                code_hash=feedback.code_hash,
+            )
+        self.assertEqual(hint, feedback.feedback)
+
+        attempt = self.submit(self.wrong_code)
+        self.assertEqual(attempt.response_message, "Wrong output ❌\n\n💡 Print exactly the expected text.")
+        self.assertNotIn("💡", self.submit("print('bye')").response_message)
+
@@ -7,7 +7,12 @@ from .views import (
     LanguageExercisesListApi, 
     ExerciseDetailApi,
     SubmitExerciseApi,
-    LearningProgressListApi
+    LearningProgressListApi,
+    GradingMemoStatsApi,
+    LearningEventsLagApi,
+    LearningSnapshotApi,
+    ExerciseAttemptsListApi,
+    ExerciseStatsListApi,
 )
 
 app_name = "learning"
@@ -35,9 +40,39 @@ urlpatterns = [
          name="exercise-submit"
     ),
     
+    # GET: History of the user's attempts (filters: language, exercise; keyset cursor)
+    path("attempts/",
+         ExerciseAttemptsListApi.as_view(),
+         name="exercise-attempts-list"
+    ),
+
     # GET: Retrieve the learning progress for logged in user
     path("progress/",
          LearningProgressListApi.as_view(),
          name="learning-progress-list"
     ),
+
+    # GET: Hit rate of the grading memo (staff only)
+    path("grading/memo/",
+         GradingMemoStatsApi.as_view(),
+         name="grading-memo-stats"
+    ),
+
+    # GET: Backlog of the learning events consumer (staff only)
+    path("events/lag/",
+         LearningEventsLagApi.as_view(),
+         name="learning-events-lag"
+    ),
+
+    # GET: Analytics per exercise, from the incrementally maintained aggregates (staff only)
+    path("stats/exercises/",
+         ExerciseStatsListApi.as_view(),
+         name="exercise-stats-list"
+    ),
+
+    # GET: Precompressed snapshot of a public catalog response, for a content version (immutable)
+    path("snapshots/<slug:key>/<path:path>",
+         LearningSnapshotApi.as_view(),
+         name="learning-snapshot"
+    ),
 ]
@@ -4,10 +4,11 @@ from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication # This will help django chekc the token sengt form react
 
 from core.responses import success_response, error_response
+from core.idempotency import IDEMPOTENCY_HEADER, IDEMPOTENCY_REPLAYED_HEADER, get_idempotency_key, request_fingerprint
 
 # ------- MODELS ----------
 from .models import (
@@ -16,25 +17,51 @@ from .models import (
 
 # --------- HELPERS & SELECTORS -------
 from .selectors import (
-    load_learning_content,
+    load_learning_manifest,
+    load_language,
     get_language,
     get_exercise,
+    exercise_attempt_get_by_idempotency_key,
+    exercise_attempt_list,
+    learning_events_lag,
+    exercise_stats_list,
+    learning_progress_summary,
 )
 
 # ------ SERIALIZERS --------
 from .serializers import (
     LanguageOutSerializer,
     ExerciseListOutSerializer,
+    ExerciseListQueryInSerializer,
     ExerciseDetailOutSerializer,
     ExerciseAttemptOutSerializer,
+    ExerciseAttemptListOutSerializer,
+    ExerciseAttemptListQueryInSerializer,
+    ExerciseStatsOutSerializer,
     SubmitAttemptInSerializer,
     LearningProgressOutSerializer,
 )
 
+from apps.learning.bitset import bits_test
+from apps.learning.curriculum import get_curriculum
+from apps.learning.memo import grading_memo
+from apps.learning.search import SearchError, get_exercise_index
+from apps.learning.snapshots import snapshot_store
 from apps.learning.services import (
-    exercise_submit_attempt
+    exercise_submit_attempt,
+    learning_progress_summary_invalidate,
 )
 
+# ------------- HELPERS --------------
+
+# --- Helper 1: A reused Idempotency-Key with a different request body ---
+def _idempotency_mismatch_response():
+    return error_response(
+        message=f"This {IDEMPOTENCY_HEADER} was already used with a different request.",
+        error_code="idempotency_key_mismatch",
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
 # ------------- VIEWS --------------
 
 # --- View 1: Get the list of languages ---
@@ -52,34 +79,28 @@ class LanguagesListApi(APIView):
     
     # Override the get method
     def get(self, request):
-        content = load_learning_content()  # Load the content
+        # Anonymous users all get the same list: served from the precompressed snapshot when built
+        if not request.user.is_authenticated:
+            snapshot = snapshot_store.respond(request, "languages/")
+            if snapshot:
+                return snapshot
+
+        content = load_learning_manifest()  # Load the catalog (without the exercise details)
         languages = content.get("languages", []) # Get the languages object
         
-        # Get the list of slugs the user has actually started from the DB
-        #  use .values_list for performance to get just the slugs
-        started_slugs = []
-        if request.user.is_authenticated:
-            started_slugs = LearningProgress.objects.filter(
-                user=request.user
-            ).values_list("language_slug", flat=True)
-
-        # ---------- Logic for started langauges ----------
-        # add the 'is_started' key to each dictionary before serializing
-        for lang in languages:
-            lang["is_started"] = lang["slug"] in started_slugs
-        
-        # ---------- Logic for percentage_completion ----------
-        # Create a dictionary of {slug: percentage} for the user
-        user_progress_map = {}
-        if request.user.is_authenticated:
-            progress_records = LearningProgress.objects.filter(user=request.user)
-            user_progress_map = {p.language_slug: p.completion_percentage for p in progress_records}
-
-        for lang in languages:
-            slug = lang["slug"]
-            lang["is_started"] = slug in user_progress_map
-            # Default to 0 if not started
-            lang["completion_percentage"] = user_progress_map.get(slug, 0)
+        # The user's progress per language (cached, no query when it is up to date)
+        progress_summary = learning_progress_summary(user=request.user)
+
+        # New dictionaries: the content is shared by all the requests
+        languages = [
+            {
+                **lang,
+                "is_started": lang["slug"] in progress_summary,
+                # Default to 0 if not started
+                "completion_percentage": progress_summary.get(lang["slug"], {}).get("completion_percentage", 0),
+            }
+            for lang in languages
+        ]
             
         # Pass the data to the serializer 
         # `many=True` means I am giving you a list of dictionaries. 
@@ -96,13 +117,29 @@ class LanguageExercisesListApi(APIView):
     """
     Endpoint: GET /learn/languages/{language_slug}/exercises
     
-    Retrieve all exercises for a specific language slug.
+    Retrieve the exercises for a specific language slug, a page at a time.
+
+    Query params:
+        q: Words searched in the titles and prompts (prefixes match, "loo" finds "loops").
+        difficulty: Only the exercises of this difficulty.
+        cursor / limit: The `meta.next_cursor` of the previous page, and the page size.
     """
     
     authentication_classes = [JWTAuthentication]
         
     def get(self, request, language_slug: str):
-        content = load_learning_content() # Load the content
+        # The first page of the full list is the same for every anonymous user: served from the snapshot
+        if not request.user.is_authenticated and not request.query_params:
+            snapshot = snapshot_store.respond(request, f"languages/{language_slug}/exercises/")
+            if snapshot:
+                return snapshot
+
+        # Search (?q=, ?difficulty=) and pagination (?cursor=, ?limit=) parameters
+        query_serializer = ExerciseListQueryInSerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        query = query_serializer.validated_data
+
+        content = load_learning_manifest() # Load the catalog (the list only needs the exercise summaries)
         language = get_language(content, language_slug) # Get teh specified language object
 
         # In case no language was found
@@ -112,39 +149,49 @@ class LanguageExercisesListApi(APIView):
                 status_code=status.HTTP_404_NOT_FOUND
             )
 
-        # Get the list of excerises dedicated for the specified language
-        exercises = language.get("exercises", [])
+        # Matching excerises from the search index (in prerequisite order), only the page is built
+        curriculum = get_curriculum(language)
+        index = get_exercise_index(language)
+        matches = index.search(q=query.get("q", ""), difficulty=query.get("difficulty"))
+        try:
+            exercise_ids, next_cursor = index.page(
+                matches,
+                cursor=query.get("cursor"),
+                limit=query.get("limit", settings.LEARNING_EXERCISES_PAGE_SIZE),
+            )
+        except SearchError as exc:
+            return error_response(
+                message=str(exc),
+                error_code="invalid_cursor",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+        exercises = [get_exercise(language, ex_id) for ex_id in exercise_ids]
         
-        # Logic to check the progress
-        completed_ids = []
-        if request.user.is_authenticated:
-            progress = LearningProgress.objects.filter(
-                user=request.user, 
-                language_slug=language_slug
-            ).first()
-            if progress:
-                completed_ids = progress.completed_exercise_ids
-
-        # Apply sequential locking logic (For FE view)
-        for index, ex in enumerate(exercises):
-            ex_id = str(ex.get("id"))
-            ex["is_completed"] = ex_id in completed_ids
-            
-            if index == 0:
-                # First exercise is always unlocked
-                ex["is_locked"] = False
-            else:
-                # Locked if the PREVIOUS exercise wasn't completed
-                prev_ex_id = str(exercises[index-1].get("id"))
-                ex["is_locked"] = prev_ex_id not in completed_ids
+        # Logic to check the progress (the completion bitset, from the cached summary)
+        progress = learning_progress_summary(user=request.user).get(language_slug)
+        completed_bits = progress["completed_bits"] if progress else b""
+        completed = int.from_bytes(completed_bits, "little")
+
+        # Apply the prerequisite locking logic (For FE view): locked until all its prerequisites are completed
+        # (new dictionaries, the content is shared by all the requests)
+        exercises = [
+            {
+                **ex,
+                "requires": curriculum.requires[ex.get("id")],
+                "is_completed": bits_test(completed_bits, ex["ordinal"]),
+                "is_locked": curriculum.is_locked(ex.get("id"), completed),
+            }
+            for ex in exercises
+        ]
                 
         # Return list-only shape (id/title/difficulty)
         data = ExerciseListOutSerializer(exercises, many=True).data # Call the serializer
         
-        # Return the list of language's excerises
+        # Return the page of the language's excerises (`next_cursor` is None on the last page)
         return success_response(
             data=data, 
-            message=f"Successfully retrieved all exercises for {language_slug.capitalize()}."
+            message=f"Successfully retrieved all exercises for {language_slug.capitalize()}.",
+            meta={"count": matches.bit_count(), "next_cursor": next_cursor},
         )
         
 # --- View 3: Get details for single exercise ---
@@ -157,8 +204,12 @@ class ExerciseDetailApi(APIView):
     authentication_classes = []
     
     def get(self, request, language_slug: str, exercise_id: str):
-        content = load_learning_content() # Load the content
-        language = get_language(content, language_slug) 
+        # The same for everyone: served from the precompressed snapshot when built
+        snapshot = snapshot_store.respond(request, f"languages/{language_slug}/exercises/{exercise_id}/")
+        if snapshot:
+            return snapshot
+
+        language = load_language(language_slug) # Load the language with its exercise details
 
         # If no language was found
         if not language:
@@ -212,6 +263,32 @@ class SubmitExerciseApi(APIView):
         # Extract user (Currently uses AnonymousUser until Auth is implemented)
         user = request.user
 
+        try:
+            idempotency_key = get_idempotency_key(request)
+        except ValueError as exc:
+            return error_response(message=str(exc), status_code=status.HTTP_400_BAD_REQUEST)
+
+        # A reused key must come with the same submission, otherwise the replay would grade another answer
+        request_hash = request_fingerprint({
+            "language_slug": data["language_slug"],
+            "exercise_id": data["exercise_id"],
+            "user_code": data["user_code"],
+        })
+
+        # A retry of a submission we already graded: return the stored attempt
+        if idempotency_key:
+            existing = exercise_attempt_get_by_idempotency_key(user=user, idempotency_key=idempotency_key)
+            if existing:
+                if existing.request_hash != request_hash:
+                    return _idempotency_mismatch_response()
+                out_data = ExerciseAttemptOutSerializer(existing).data
+                response = success_response(
+                    data=out_data,
+                    message=f"Attempt processed: {out_data['status'].upper()}"
+                )
+                response[IDEMPOTENCY_REPLAYED_HEADER] = "true"
+                return response
+
         try:
             # Call the service with passed parameters
             attempt = exercise_submit_attempt(
@@ -219,6 +296,8 @@ class SubmitExerciseApi(APIView):
                 language_slug=data["language_slug"],
                 exercise_id=data["exercise_id"],
                 user_code=data["user_code"],
+                idempotency_key=idempotency_key,
+                request_hash=request_hash,
             )
             
         except ValueError as exc:
@@ -236,6 +315,10 @@ class SubmitExerciseApi(APIView):
                 status_code=status.HTTP_400_BAD_REQUEST
             )
 
+        if attempt.request_hash != request_hash:
+            # A concurrent request with another submission used the key first
+            return _idempotency_mismatch_response()
+
         #Transform the resulting Model instance back into JSON via the Output Serializer
         out_data = ExerciseAttemptOutSerializer(attempt).data
         return success_response(
@@ -257,15 +340,12 @@ class LearningProgressListApi(APIView):
             # Extract user (Currently uses AnonymousUser until Auth is implemented)
             user = request.user  
 
-            # Query the database for all progress records belonging to the user
-            qs = (
-                LearningProgress.objects
-                .filter(user=user)
-                .order_by("language_slug")
-            )
+            # All progress records belonging to the user (cached summary)
+            progress_summary = learning_progress_summary(user=user)
+            records = [progress_summary[slug] for slug in sorted(progress_summary)]
 
-            # Serialize the QuerySet into a list of dictionaries
-            data = LearningProgressOutSerializer(qs, many=True).data
+            # Serialize the records into a list of dictionaries
+            data = LearningProgressOutSerializer(records, many=True).data
 
             return success_response(
                 data=data,
@@ -304,7 +384,117 @@ class LearningProgressListApi(APIView):
             }
         )
 
+        if created:
+            learning_progress_summary_invalidate(user_id=user.id)
+
         message = "Path started successfully." if created else "Path already in progress."
-        data = LearningProgressOutSerializer(progress).data
+        data = LearningProgressOutSerializer(
+            learning_progress_summary(user=user).get(language_slug, progress)
+        ).data
         
-        return success_response(data=data, message=message) 
\ No newline at end of file
+        return success_response(data=data, message=message) 
+
+# ----- View 6: Hit rate of the grading memo (staff only)
+class GradingMemoStatsApi(APIView):
+    """
+    Endpoint: GET /learn/grading/memo/
+    Returns the counters of the grading memo of this process (entries, hits, misses, hit rate).
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return success_response(
+            data=grading_memo.stats(),
+            message="Grading memo stats retrieved successfully."
+        )
+
+
+# ----- View 7: Backlog of the learning events consumer (staff only)
+class LearningEventsLagApi(APIView):
+    """
+    Endpoint: GET /learn/events/lag/
+    Returns how many outbox events are waiting and how old the oldest one is.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return success_response(
+            data=learning_events_lag(),
+            message="Learning events lag retrieved successfully."
+        )
+
+
+# ----- View 8: Versioned snapshot of a public catalog response (immutable, CDN friendly)
+class LearningSnapshotApi(APIView):
+    """
+    Endpoint: GET /learn/snapshots/{key}/{path}
+    The snapshot of /learn/{path} built for the content `key` (the Content-Location of
+    the catalog responses). It never changes, so it can be cached forever.
+    """
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, key: str, path: str):
+        snapshot = snapshot_store.respond(request, path, key=key, immutable=True)
+        if snapshot:
+            return snapshot
+        return error_response(message="Snapshot not found.", status_code=status.HTTP_404_NOT_FOUND)
+
+
+# ----- View 9: History of the user's exercise attempts (keyset paginated)
+class ExerciseAttemptsListApi(APIView):
+    """
+    Endpoint: GET /learn/attempts/?language=&exercise=&cursor=&limit=&include_code=
+    The user's attempts, newest first, a page at a time (`meta.next_cursor` gives the next one).
+    The submitted code is only returned with include_code=true.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = ExerciseAttemptListQueryInSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        query = serializer.validated_data
+
+        try:
+            attempts, next_cursor = exercise_attempt_list(
+                user=request.user,
+                limit=query.get("limit", settings.LEARNING_ATTEMPTS_PAGE_SIZE),
+                language_slug=query.get("language"),
+                exercise_id=query.get("exercise"),
+                cursor=query.get("cursor"),
+                include_code=query["include_code"],
+            )
+        except ValueError as exc:
+            return error_response(
+                message=str(exc),
+                error_code="invalid_cursor",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+
+        out_serializer = ExerciseAttemptOutSerializer if query["include_code"] else ExerciseAttemptListOutSerializer
+        return success_response(
+            data=out_serializer(attempts, many=True).data,
+            message="Successfully retrieved the exercise attempts.",
+            meta={"next_cursor": next_cursor},
+        )
+
+
+# ----- View 10: Analytics per exercise (staff only)
+class ExerciseStatsListApi(APIView):
+    """
+    Endpoint: GET /learn/stats/exercises/?language=
+    Attempts, pass rate, unique users and median attempts to pass of every exercise,
+    read from the aggregates kept by the events consumer.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        stats = exercise_stats_list(language_slug=request.query_params.get("language"))
+        return success_response(
+            data=ExerciseStatsOutSerializer(stats, many=True).data,
+            message="Exercise stats retrieved successfully."
+        )
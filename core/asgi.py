@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up (it uses the models)
+from apps.developer.consumers import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    HTTP goes to Django, WebSocket connections go to the developer session socket.
+    """
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
+
+# Preload the Ollama models once the apps are ready (no-op unless OLLAMA_WARMUP_ENABLED)
+from apps.ai_models.warmup import start_warmup_scheduler  # noqa: E402
+
+start_warmup_scheduler()
@@ -0,0 +1,40 @@
+"""
+This file has helpers for the Idempotency-Key header, so clients can safely retry POST requests
+"""
+
+import json
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+# Header clients send to make a POST safe to retry
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# Header set on responses that replay a previous result
+IDEMPOTENCY_REPLAYED_HEADER = "Idempotent-Replayed"
+IDEMPOTENCY_KEY_MAX_LENGTH = 100
+
+def get_idempotency_key(request):
+    """
+    Returns the Idempotency-Key header of the request (None if missing).
+    Raises ValueError if the key is longer than the stored column.
+    """
+    key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip()
+    if not key:
+        return None
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f"{IDEMPOTENCY_HEADER} must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters.")
+    return key
+
+def idempotency_cutoff():
+    """
+    Keys stored before this datetime have expired (IDEMPOTENCY_KEY_TTL_SECONDS).
+    """
+    return timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+
+def request_fingerprint(payload):
+    """
+    Hash of the request body, stored with the key so a key reused with another body is rejected.
+    """
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
@@ -90,6 +90,26 @@ DATABASES = {
     }
 }
 
+# Cache (shared by all the processes when Redis is configured, per process otherwise)
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -146,4 +166,88 @@ STATIC_URL = "static/"
 
 # CORS configuration
 CORS_ALLOW_CREDENTIALS = True
-CORS_ALLOWED_ORIGINS = ["http://localhost:5173"]
\ No newline at end of file
+CORS_ALLOWED_ORIGINS = ["http://localhost:5173"]
+
+# Developer mode (Ollama orchestration) configuration
+# Send the explainer a diff against the previous coder output when it is much smaller
+EXPLAINER_DIFF_PROMPTS = os.getenv("EXPLAINER_DIFF_PROMPTS", "False") == "True"
+# The diff is only used if it is at most this fraction of the full output (in tokens)
+EXPLAINER_DIFF_MAX_RATIO = float(os.getenv("EXPLAINER_DIFF_MAX_RATIO", "0.5"))
+
+# Rolling session summary (older runs are summarized instead of being dropped)
+# Model used to write the summaries, empty means the model configured for the role
+DEV_SUMMARY_MODEL = os.getenv("DEV_SUMMARY_MODEL", "")
+DEV_SUMMARY_MAX_WORDS = int(os.getenv("DEV_SUMMARY_MAX_WORDS", "200"))
+DEV_SUMMARY_TURN_MAX_CHARS = int(os.getenv("DEV_SUMMARY_TURN_MAX_CHARS", "2000"))
+
+# Relevant history retrieval (embeddings of previous runs)
+# Local Ollama embedding model, empty means the built-in hashing vectorizer
+DEV_EMBEDDING_MODEL = os.getenv("DEV_EMBEDDING_MODEL", "")
+DEV_EMBEDDING_DIMENSIONS = int(os.getenv("DEV_EMBEDDING_DIMENSIONS", "512"))
+# How many relevant older runs are added to the history (0 disables the retrieval)
+DEV_HISTORY_RELEVANT_K = int(os.getenv("DEV_HISTORY_RELEVANT_K", "2"))
+DEV_HISTORY_MIN_SIMILARITY = float(os.getenv("DEV_HISTORY_MIN_SIMILARITY", "0.2"))
+
+# Ollama model warm-up (keeps the models that are likely to be used loaded)
+OLLAMA_WARMUP_ENABLED = os.getenv("OLLAMA_WARMUP_ENABLED", "False") == "True"
+OLLAMA_WARMUP_INTERVAL_SECONDS = int(os.getenv("OLLAMA_WARMUP_INTERVAL_SECONDS", "60"))
+# How long Ollama keeps a model loaded after the last request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "15m")
+# Memory the warm models may use, 0 means no limit (nothing is unloaded)
+OLLAMA_WARM_MEMORY_BUDGET_MB = int(os.getenv("OLLAMA_WARM_MEMORY_BUDGET_MB", "0"))
+OLLAMA_WARMUP_USAGE_WINDOW_MINUTES = int(os.getenv("OLLAMA_WARMUP_USAGE_WINDOW_MINUTES", "60"))
+
+# Deadlines (seconds) for the Ollama calls, a missed deadline marks the run as "timeout"
+OLLAMA_CONNECT_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_CONNECT_TIMEOUT_SECONDS", "3"))
+OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS", "60"))
+OLLAMA_INTER_TOKEN_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_INTER_TOKEN_TIMEOUT_SECONDS", "20"))
+OLLAMA_TOTAL_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_TOTAL_TIMEOUT_SECONDS", "300"))
+# Circuit breaker per model: open after N failures in a row, probe again after the reset time
+OLLAMA_BREAKER_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_FAILURE_THRESHOLD", "3"))
+OLLAMA_BREAKER_RESET_SECONDS = float(os.getenv("OLLAMA_BREAKER_RESET_SECONDS", "30"))
+
+# Idempotency-Key header (run and exercise submit endpoints): how long a key is remembered
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_TTL_SECONDS", "86400"))
+
+# Developer mode daily quotas per user (tokens in + out, and model GPU time), 0 means unlimited
+DEV_DAILY_TOKEN_QUOTA = int(os.getenv("DEV_DAILY_TOKEN_QUOTA", "0"))
+DEV_DAILY_GPU_SECONDS_QUOTA = int(os.getenv("DEV_DAILY_GPU_SECONDS_QUOTA", "0"))
+
+# Exercise grading sandbox (Python and JavaScript submissions are executed)
+GRADER_WORKERS_PER_LANGUAGE = int(os.getenv("GRADER_WORKERS_PER_LANGUAGE", "2"))
+GRADER_TIME_LIMIT_SECONDS = float(os.getenv("GRADER_TIME_LIMIT_SECONDS", "2"))
+GRADER_MEMORY_LIMIT_MB = int(os.getenv("GRADER_MEMORY_LIMIT_MB", "256"))
+GRADER_OUTPUT_LIMIT_BYTES = int(os.getenv("GRADER_OUTPUT_LIMIT_BYTES", "65536"))
+GRADER_NODE_BINARY = os.getenv("GRADER_NODE_BINARY", "node")
+# Unprivileged uid/gid the Python submissions run as (the worker needs root to chroot and switch to it)
+GRADER_SANDBOX_UID = int(os.getenv("GRADER_SANDBOX_UID", "65534"))
+# SQL submissions run in the web process: the largest string/blob a query can build, and the longest query
+GRADER_SQL_MAX_VALUE_BYTES = int(os.getenv("GRADER_SQL_MAX_VALUE_BYTES", "1000000"))
+GRADER_SQL_MAX_QUERY_BYTES = int(os.getenv("GRADER_SQL_MAX_QUERY_BYTES", "20000"))
+
+# Grading memo: grades of already seen submissions (LRU in memory, optionally persisted in a table)
+GRADING_MEMO_SIZE = int(os.getenv("GRADING_MEMO_SIZE", "10000"))
+GRADING_MEMO_PERSIST = os.getenv("GRADING_MEMO_PERSIST", "False") == "True"
+
+# Learning events outbox (consumed by `manage.py consume_learning_events`)
+LEARNING_EVENTS_BATCH_SIZE = int(os.getenv("LEARNING_EVENTS_BATCH_SIZE", "200"))
+LEARNING_EVENTS_MAX_FAILURES = int(os.getenv("LEARNING_EVENTS_MAX_FAILURES", "5"))
+LEARNING_EVENTS_RETENTION_DAYS = int(os.getenv("LEARNING_EVENTS_RETENTION_DAYS", "7"))
+
+# Per-user progress summary (languages/exercises lists): how long it stays cached without changes.
+# Only cached with a shared cache (CACHE_REDIS_URL): the version bumped after a progress change
+# must reach every process, with the in-process cache the other workers would keep serving the old one
+LEARNING_PROGRESS_CACHE_SECONDS = int(os.getenv("LEARNING_PROGRESS_CACHE_SECONDS", "3600")) if CACHE_REDIS_URL else 0
+
+# Learning content (Language/Exercise tables): how often a process re-checks the content version
+# when the cache isn't shared (with CACHE_REDIS_URL a sync is seen at once)
+LEARNING_CONTENT_CACHE_SECONDS = int(os.getenv("LEARNING_CONTENT_CACHE_SECONDS", "60"))
+# Languages kept in memory with their exercise details (LRU), the catalog manifest is always kept
+LEARNING_CONTENT_MAX_SHARDS = int(os.getenv("LEARNING_CONTENT_MAX_SHARDS", "8"))
+# Exercises per page of the exercises list when the client doesn't ask for a `limit` (at most 100)
+LEARNING_EXERCISES_PAGE_SIZE = int(os.getenv("LEARNING_EXERCISES_PAGE_SIZE", "50"))
+# Attempts per page of the attempts history when the client doesn't ask for a `limit` (at most 100)
+LEARNING_ATTEMPTS_PAGE_SIZE = int(os.getenv("LEARNING_ATTEMPTS_PAGE_SIZE", "20"))
+
+# Precompressed snapshots of the public catalog responses (`manage.py build_learning_snapshots`)
+LEARNING_SNAPSHOT_DIR = os.getenv("LEARNING_SNAPSHOT_DIR") or str(BASE_DIR / "learning_snapshots")
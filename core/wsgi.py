@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 application = get_wsgi_application()
+
+# Preload the Ollama models once the apps are ready (no-op unless OLLAMA_WARMUP_ENABLED)
+from apps.ai_models.warmup import start_warmup_scheduler  # noqa: E402
+
+start_warmup_scheduler()